@@ -0,0 +1,84 @@
+"""
+Benchmark : latence d'ingestion sans règles puis avec toutes les règles d'alerte actives
+L'évaluation se faisant en arrière-plan, les deux latences doivent rester proches
+Usage : python -m benchmarks.bench_alerts --readings 50000 --batch-size 500
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.bench_batch_ingest import make_readings
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from database.mongo import db
+from services.alerts import alert_engine
+from utils.capteur_cache import capteur_cache
+
+async def ingest(client, user, readings, args):
+    lots = [readings[i:i + args.batch_size] for i in range(0, len(readings), args.batch_size)]
+
+    def batch(lot):
+        async def task():
+            response = await client.post("/data/batch", json=lot, headers=user["headers"])
+            response.raise_for_status()
+        return task
+
+    return await run_concurrent([batch(lot) for lot in lots], args.concurrency)
+
+async def drain():
+    """Attendre que le moteur ait évalué toute la file"""
+    while alert_engine.pending:
+        await asyncio.sleep(0.01)
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+
+            sans_regles = await ingest(client, user, make_readings(capteurs, args.readings, 0), args)
+            await drain()
+
+            # Toutes les règles sur tous les capteurs (valeurs 0..99 : dépassements fréquents)
+            await db["seuils"].insert_many([
+                {
+                    "capteurId": capteur,
+                    "owner_id": user["id"],
+                    "seuil_max": 90,
+                    "seuil_min": 10,
+                    "variation_max": 1000,
+                    "hysteresis": 5,
+                    "consecutifs": 2,
+                    "cooldown_seconds": 60
+                }
+                for capteur in capteurs
+            ])
+            capteur_cache.clear()
+            avant = alert_engine.stats()
+            start = time.perf_counter()
+            avec_regles = await ingest(client, user, make_readings(capteurs, args.readings, args.readings), args)
+            await drain()
+            duree = time.perf_counter() - start
+            apres = alert_engine.stats()
+
+        for nom, latences in (("sans règles", sans_regles), ("avec règles", avec_regles)):
+            print(
+                f"POST /data/batch {nom:<12}: p50 {percentile(latences, 50) * 1000:7.2f}ms"
+                f"  p99 {percentile(latences, 99) * 1000:7.2f}ms"
+            )
+        evaluees = apres["evaluees"] - avant["evaluees"]
+        print(f"Évaluation : {evaluees / duree:,.0f} données/s, retard max {apres['retard_ms_max']}ms")
+        print(
+            f"Alertes : {apres['alertes_creees'] - avant['alertes_creees']} créées, "
+            f"{apres['dedupliquees'] - avant['dedupliquees']} dédupliquées, "
+            f"{apres['cooldown'] - avant['cooldown']} en cooldown"
+        )
+    finally:
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=50000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--capteurs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
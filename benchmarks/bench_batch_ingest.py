@@ -0,0 +1,69 @@
+"""
+Benchmark : ingestion unitaire (POST /data/) contre ingestion par lot (POST /data/batch)
+Usage : python -m benchmarks.bench_batch_ingest --readings 20000 --batch-size 500
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import bench_client, cleanup, run_concurrent, run_prefix, seed_objets, seed_user
+
+def make_readings(capteurs, count, offset):
+    """Générer des lectures avec des timestamps distincts"""
+    origine = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "capteurId": capteurs[i % len(capteurs)],
+            "valeur": float(i % 100),
+            "timestamp": (origine + timedelta(milliseconds=offset + i)).isoformat()
+        }
+        for i in range(count)
+    ]
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+
+            # Chemin unitaire : une requête HTTP par lecture
+            readings = make_readings(capteurs, args.readings, 0)
+
+            def single(reading):
+                async def task():
+                    response = await client.post("/data/", json=reading, headers=user["headers"])
+                    response.raise_for_status()
+                return task
+
+            start = time.perf_counter()
+            await run_concurrent([single(r) for r in readings], args.concurrency)
+            unitaire = args.readings / (time.perf_counter() - start)
+
+            # Chemin par lot : une requête HTTP par lot
+            readings = make_readings(capteurs, args.readings, args.readings)
+            lots = [readings[i:i + args.batch_size] for i in range(0, len(readings), args.batch_size)]
+
+            def batch(lot):
+                async def task():
+                    response = await client.post("/data/batch", json=lot, headers=user["headers"])
+                    response.raise_for_status()
+                return task
+
+            start = time.perf_counter()
+            await run_concurrent([batch(lot) for lot in lots], args.concurrency)
+            par_lot = args.readings / (time.perf_counter() - start)
+
+        print(f"Unitaire : {unitaire:,.0f} lectures/s")
+        print(f"Par lot  : {par_lot:,.0f} lectures/s (lots de {args.batch_size})")
+        print(f"Gain     : x{par_lot / unitaire:.1f}")
+    finally:
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--capteurs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,57 @@
+"""
+Benchmark : latence par lecture de POST /data/ avec et sans cache des capteurs
+Usage : python -m benchmarks.bench_capteur_cache --readings 5000 --concurrency 16
+"""
+import argparse
+import asyncio
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from utils.capteur_cache import capteur_cache
+
+async def measure(client, user, capteurs, count, offset, concurrency):
+    origine = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def post(i):
+        async def task():
+            response = await client.post("/data/", json={
+                "capteurId": capteurs[i % len(capteurs)],
+                "valeur": float(i % 100),
+                "timestamp": (origine + timedelta(milliseconds=offset + i)).isoformat()
+            }, headers=user["headers"])
+            response.raise_for_status()
+        return task
+
+    return await run_concurrent([post(i) for i in range(count)], concurrency)
+
+async def main(args):
+    prefix = run_prefix()
+    maxsize = capteur_cache.maxsize
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+
+            # Sans cache : taille maximale nulle, chaque lecture interroge objets et seuils
+            capteur_cache.maxsize = 0
+            capteur_cache.clear()
+            sans_cache = await measure(client, user, capteurs, args.readings, 0, args.concurrency)
+
+            capteur_cache.maxsize = maxsize
+            avec_cache = await measure(client, user, capteurs, args.readings, args.readings, args.concurrency)
+
+        for nom, latences in (("Sans cache", sans_cache), ("Avec cache", avec_cache)):
+            print(
+                f"{nom} : p50 {percentile(latences, 50) * 1000:.2f} ms, "
+                f"p99 {percentile(latences, 99) * 1000:.2f} ms"
+            )
+        print(capteur_cache.stats())
+    finally:
+        capteur_cache.maxsize = maxsize
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--capteurs", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,82 @@
+"""
+Benchmark : coût de l'authentification par requête, jeton utilisateur contre jeton d'appareil
+Mesure la vérification seule puis la latence de POST /data/ et POST /data/device
+Usage : python -m benchmarks.bench_device_auth --iterations 20000 --readings 5000
+"""
+import argparse
+import asyncio
+import time
+import uuid
+from benchmarks.bench_batch_ingest import make_readings
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from utils.device_tokens import create_device_token, decode_device_token, revoked_tokens
+from utils.security import get_user_from_token, user_cache
+
+async def time_calls(fn, iterations):
+    durees = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        await fn()
+        durees.append(time.perf_counter() - start)
+    return durees
+
+def report(nom, durees, unite=1e6, suffixe="µs"):
+    print(
+        f"{nom:<36}: p50 {percentile(durees, 50) * unite:8.2f}{suffixe}"
+        f"  p99 {percentile(durees, 99) * unite:8.2f}{suffixe}"
+    )
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteur = (await seed_objets(prefix, user["id"], 1))[0]
+            user_token = user["headers"]["Authorization"].split()[1]
+            device = await create_device_token(capteur, user["id"], "bench")
+            device_headers = {"Authorization": f"Bearer {device['token']}"}
+
+            # Ensemble de révocation réaliste : la recherche reste O(1)
+            for _ in range(args.revoked):
+                revoked_tokens.add(uuid.uuid4().hex)
+
+            async def user_auth():
+                await get_user_from_token(user_token)
+
+            async def user_auth_froid():
+                user_cache.clear()
+                await get_user_from_token(user_token)
+
+            async def device_auth():
+                decode_device_token(device["token"])
+
+            report("utilisateur (cache chaud)", await time_calls(user_auth, args.iterations))
+            report("utilisateur (cache vide, MongoDB)", await time_calls(user_auth_froid, args.iterations // 10))
+            report("appareil (signature + révocation)", await time_calls(device_auth, args.iterations))
+
+            readings = make_readings([capteur], args.readings * 2, 0)
+
+            def post(path, reading, headers):
+                async def task():
+                    response = await client.post(path, json=reading, headers=headers)
+                    response.raise_for_status()
+                return task
+
+            utilisateur = await run_concurrent(
+                [post("/data/", r, user["headers"]) for r in readings[:args.readings]], args.concurrency
+            )
+            appareil = await run_concurrent(
+                [post("/data/device", r, device_headers) for r in readings[args.readings:]], args.concurrency
+            )
+            report("POST /data/ (jeton utilisateur)", utilisateur, 1000, "ms")
+            report("POST /data/device (jeton appareil)", appareil, 1000, "ms")
+    finally:
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--readings", type=int, default=5000)
+    parser.add_argument("--revoked", type=int, default=100000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    asyncio.run(main(parser.parse_args()))
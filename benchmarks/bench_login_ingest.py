@@ -0,0 +1,70 @@
+"""
+Benchmark : latence p99 de l'ingestion (POST /data/) seule puis pendant une rafale de connexions
+Usage : python -m benchmarks.bench_login_ingest --readings 2000 --logins 200
+"""
+import argparse
+import asyncio
+from benchmarks.bench_batch_ingest import make_readings
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from utils.security import password_hasher
+
+async def ingest(client, user, readings, concurrency):
+    def single(reading):
+        async def task():
+            response = await client.post("/data/", json=reading, headers=user["headers"])
+            response.raise_for_status()
+        return task
+
+    return await run_concurrent([single(r) for r in readings], concurrency)
+
+async def logins(client, user, count, concurrency):
+    def login():
+        async def task():
+            response = await client.post(
+                "/auth/login",
+                json={"email": user["email"], "password": "bench-password"}
+            )
+            # 503 : file du pool bcrypt pleine, refus attendu sous forte charge
+            if response.status_code not in (200, 503):
+                response.raise_for_status()
+        return task
+
+    return await run_concurrent([login() for _ in range(count)], concurrency)
+
+def report(nom, latences):
+    print(
+        f"{nom:<28}: p50 {percentile(latences, 50) * 1000:8.2f}ms"
+        f"  p99 {percentile(latences, 99) * 1000:8.2f}ms"
+        f"  max {max(latences) * 1000:8.2f}ms"
+    )
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+
+            seule = await ingest(client, user, make_readings(capteurs, args.readings, 0), args.concurrency)
+
+            readings = make_readings(capteurs, args.readings, args.readings)
+            pendant, connexions = await asyncio.gather(
+                ingest(client, user, readings, args.concurrency),
+                logins(client, user, args.logins, args.login_concurrency)
+            )
+
+        report("ingestion seule", seule)
+        report("ingestion pendant connexions", pendant)
+        report("connexions", connexions)
+        print(password_hasher.stats())
+    finally:
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=2000)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--capteurs", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--login-concurrency", type=int, default=64)
+    asyncio.run(main(parser.parse_args()))
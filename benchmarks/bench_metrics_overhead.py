@@ -0,0 +1,80 @@
+"""
+Benchmark : surcoût de l'instrumentation Prometheus sous charge d'ingestion
+Lance la même charge dans deux processus, METRICS_ENABLED=0 puis 1, et compare
+Usage : python -m benchmarks.bench_metrics_overhead --readings 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.bench_batch_ingest import make_readings
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+
+async def run(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+            readings = make_readings(capteurs, args.readings, 0)
+
+            def post(reading):
+                async def task():
+                    response = await client.post("/data/", json=reading, headers=user["headers"])
+                    response.raise_for_status()
+                return task
+
+            def latest(capteur):
+                async def task():
+                    response = await client.get(f"/data/{capteur}/latest", headers=user["headers"])
+                    response.raise_for_status()
+                return task
+
+            start = time.perf_counter()
+            ecritures = await run_concurrent([post(r) for r in readings], args.concurrency)
+            lectures = await run_concurrent(
+                [latest(capteurs[i % len(capteurs)]) for i in range(args.readings)], args.concurrency
+            )
+            duree = time.perf_counter() - start
+        print(json.dumps({
+            "debit": 2 * args.readings / duree,
+            "post_p50_ms": percentile(ecritures, 50) * 1000,
+            "post_p99_ms": percentile(ecritures, 99) * 1000,
+            "latest_p50_ms": percentile(lectures, 50) * 1000,
+            "latest_p99_ms": percentile(lectures, 99) * 1000
+        }))
+    finally:
+        await cleanup(prefix)
+
+def main(args):
+    resultats = {}
+    for enabled in ("0", "1"):
+        sortie = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_metrics_overhead", "--run",
+             "--readings", str(args.readings), "--capteurs", str(args.capteurs),
+             "--concurrency", str(args.concurrency)],
+            env={**os.environ, "METRICS_ENABLED": enabled, "MQTT_ENABLED": "0"},
+            capture_output=True, text=True, check=True
+        )
+        resultats[enabled] = json.loads(sortie.stdout.strip().splitlines()[-1])
+
+    sans, avec = resultats["0"], resultats["1"]
+    print(f"{'':<16}{'sans métriques':>16}{'avec métriques':>16}{'écart':>10}")
+    for cle in sans:
+        ecart = (avec[cle] - sans[cle]) / sans[cle] * 100 if sans[cle] else 0.0
+        print(f"{cle:<16}{sans[cle]:>16.2f}{avec[cle]:>16.2f}{ecart:>9.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--capteurs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        asyncio.run(run(args))
+    else:
+        main(args)
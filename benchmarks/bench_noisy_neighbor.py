@@ -0,0 +1,124 @@
+"""
+Benchmark : voisin bruyant sur POST /data/
+Des appareils « polis » postent à cadence fixe (sous la limite) pendant qu'un
+appareil d'un autre utilisateur boucle sans pause sur son capteur. Trois processus :
+- seul : les appareils polis sans voisin (latence de référence)
+- sans limite : avec le voisin, RATE_LIMIT_ENABLED=0
+- limite : avec le voisin, RATE_LIMIT_ENABLED=1
+Vérifie qu'avec la limite les appareils polis ne reçoivent aucun refus et gardent
+un p99 dans --tolerance fois la référence ; code de sortie 1 sinon
+Usage : python -m benchmarks.bench_noisy_neighbor --duration 10 --polis 20 --noisy-concurrency 64
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import bench_client, cleanup, percentile, run_prefix, seed_objets, seed_user
+from utils.rate_limit import rate_limiter
+
+MODES = {
+    "seul": ({"RATE_LIMIT_ENABLED": "0"}, False),
+    "sans limite": ({"RATE_LIMIT_ENABLED": "0"}, True),
+    "limite": ({"RATE_LIMIT_ENABLED": "1"}, True),
+}
+
+async def run(args):
+    prefix = run_prefix()
+    origine = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    # Timestamps tous distincts (index unique capteurId + timestamp)
+    sequence = itertools.count()
+    try:
+        async with bench_client() as client:
+            poli = await seed_user(f"{prefix}-poli")
+            capteurs = await seed_objets(f"{prefix}-poli", poli["id"], args.polis)
+            bruyant = await seed_user(f"{prefix}-bruyant")
+            capteur_bruyant = (await seed_objets(f"{prefix}-bruyant", bruyant["id"], 1))[0]
+            fin = time.perf_counter() + args.duration
+            latences, statuts_polis, statuts_bruyant = [], Counter(), Counter()
+
+            async def post(user, capteur):
+                ts = origine + timedelta(milliseconds=next(sequence))
+                return await client.post(
+                    "/data/",
+                    json={"capteurId": capteur, "valeur": 21.5, "timestamp": ts.isoformat()},
+                    headers=user["headers"]
+                )
+
+            async def appareil_poli(capteur):
+                while time.perf_counter() < fin:
+                    start = time.perf_counter()
+                    response = await post(poli, capteur)
+                    latences.append(time.perf_counter() - start)
+                    statuts_polis[response.status_code] += 1
+                    await asyncio.sleep(max(0.0, 1 / args.rate - (time.perf_counter() - start)))
+
+            async def appareil_bruyant():
+                while time.perf_counter() < fin:
+                    response = await post(bruyant, capteur_bruyant)
+                    statuts_bruyant[response.status_code] += 1
+
+            taches = [appareil_poli(c) for c in capteurs]
+            if args.noisy:
+                taches += [appareil_bruyant() for _ in range(args.noisy_concurrency)]
+            await asyncio.gather(*taches)
+        print(json.dumps({
+            "p50_ms": percentile(latences, 50) * 1000,
+            "p99_ms": percentile(latences, 99) * 1000,
+            "polis_refus": sum(n for code, n in statuts_polis.items() if code >= 400),
+            "bruyant_acceptees": statuts_bruyant[200],
+            "bruyant_429": statuts_bruyant[429],
+            "refus_limiteur": rate_limiter.stats()["refus"]
+        }))
+    finally:
+        await cleanup(prefix)
+
+def main(args) -> int:
+    print(f"{'mode':<14}{'p50 (ms)':>10}{'p99 (ms)':>10}{'refus polis':>13}{'bruyant 200':>13}{'bruyant 429':>13}")
+    resultats = {}
+    for nom, (env, noisy) in MODES.items():
+        sortie = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_noisy_neighbor", "--run",
+             "--duration", str(args.duration), "--polis", str(args.polis), "--rate", str(args.rate),
+             "--noisy-concurrency", str(args.noisy_concurrency)] + (["--noisy"] if noisy else []),
+            env={**os.environ, **env, "MQTT_ENABLED": "0"},
+            capture_output=True, text=True, check=True
+        )
+        r = resultats[nom] = json.loads(sortie.stdout.strip().splitlines()[-1])
+        print(
+            f"{nom:<14}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['polis_refus']:>13}"
+            f"{r['bruyant_acceptees']:>13}{r['bruyant_429']:>13}"
+        )
+
+    reference, limite = resultats["seul"], resultats["limite"]
+    ok = (
+        limite["polis_refus"] == 0
+        and limite["bruyant_429"] > 0
+        and limite["p99_ms"] <= args.tolerance * max(reference["p99_ms"], 1.0)
+    )
+    print(
+        f"{'OK' if ok else 'ÉCHEC'} : p99 des appareils polis {limite['p99_ms']:.2f}ms avec limite "
+        f"(référence {reference['p99_ms']:.2f}ms, tolérance x{args.tolerance}), "
+        f"{limite['polis_refus']} refus, {limite['bruyant_429']} requêtes du voisin limitées"
+    )
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="Durée de chaque mode (s)")
+    parser.add_argument("--polis", type=int, default=20, help="Appareils polis (un capteur chacun)")
+    parser.add_argument("--rate", type=float, default=2.0, help="Requêtes par seconde de chaque appareil poli")
+    parser.add_argument("--noisy-concurrency", type=int, default=64, help="Requêtes simultanées du voisin")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="p99 toléré, en multiple de la référence")
+    parser.add_argument("--noisy", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        asyncio.run(run(args))
+    else:
+        sys.exit(main(args))
@@ -0,0 +1,66 @@
+"""
+Benchmark : latence des pages profondes, pagination par curseur contre skip/limit
+Usage : python -m benchmarks.bench_pagination --readings 200000 --page-size 100
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from database import storage
+from benchmarks.common import bench_client, cleanup, run_prefix, seed_objets, seed_user
+from utils.pagination import PAGE_SORT
+
+async def seed_donnees(capteur, owner_id, count, chunk=10000):
+    origine = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for start in range(0, count, chunk):
+        await storage.collection().insert_many(storage.to_storage([
+            {
+                "capteurId": capteur,
+                "valeur": float(i % 100),
+                "timestamp": (origine + timedelta(seconds=i)).isoformat(),
+                "ts": origine + timedelta(seconds=i),
+                "owner_id": owner_id
+            }
+            for i in range(start, min(start + chunk, count))
+        ]), ordered=False)
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteur = (await seed_objets(prefix, user["id"], 1))[0]
+            await seed_donnees(capteur, user["id"], args.readings)
+
+            pages = args.readings // args.page_size
+            checkpoints = {1, pages // 4, pages // 2, pages - 1}
+
+            # Parcours complet par curseur via l'API, latence mesurée à quelques profondeurs
+            print(f"{'page':>8} {'curseur (ms)':>14} {'skip (ms)':>12}")
+            after = None
+            for page in range(1, pages):
+                params = {"limit": args.page_size}
+                if after:
+                    params["after"] = after
+                start = time.perf_counter()
+                response = await client.get(f"/data/{capteur}", params=params, headers=user["headers"])
+                keyset_ms = (time.perf_counter() - start) * 1000
+                response.raise_for_status()
+                after = response.json()["next_cursor"]
+
+                if page in checkpoints:
+                    # Même page lue avec skip/limit directement sur MongoDB
+                    start = time.perf_counter()
+                    await storage.collection().find(
+                        storage.match(capteurId=capteur, owner_id=user["id"])
+                    ).sort(PAGE_SORT).skip(page * args.page_size).limit(args.page_size).to_list(None)
+                    skip_ms = (time.perf_counter() - start) * 1000
+                    print(f"{page:>8} {keyset_ms:>14.2f} {skip_ms:>12.2f}")
+    finally:
+        await cleanup(prefix)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=200000)
+    parser.add_argument("--page-size", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,68 @@
+"""
+Benchmark : diffusion temps réel avec des milliers d'abonnés (hub en mémoire, sans MongoDB)
+Usage : python -m benchmarks.bench_pubsub --idle 5000 --active 500 --events 20000
+"""
+import argparse
+import asyncio
+import time
+from benchmarks.common import percentile
+from services.pubsub import EVENT_DONNEE, PubSubHub, SubscriptionClosed
+
+async def consume(sub, latences):
+    try:
+        while True:
+            event = await sub.get()
+            latences.append(time.perf_counter() - event["data"]["envoye"])
+    except SubscriptionClosed:
+        pass
+
+async def main(args):
+    hub = PubSubHub()
+    owners = [f"owner-{i}" for i in range(args.owners)]
+
+    # Abonnés inactifs : ne lisent jamais leur file (coût mémoire et d'abandon)
+    for i in range(args.idle):
+        hub.subscribe(owners[i % args.owners])
+
+    latences = []
+    actifs = [hub.subscribe(owners[i % args.owners]) for i in range(args.active)]
+    consumers = [asyncio.create_task(consume(sub, latences)) for sub in actifs]
+
+    publish_costs = []
+    start = time.perf_counter()
+    for i in range(args.events):
+        owner = owners[i % args.owners]
+        event = {
+            "type": EVENT_DONNEE,
+            "capteurId": f"capteur-{i % 100}",
+            "owner_id": owner,
+            "data": {"valeur": float(i), "envoye": time.perf_counter()}
+        }
+        t = time.perf_counter()
+        hub.publish(event)
+        publish_costs.append(time.perf_counter() - t)
+        if i % args.yield_every == 0:
+            # Laisser tourner les consommateurs, comme entre deux requêtes d'ingestion
+            await asyncio.sleep(0)
+    await asyncio.sleep(0.1)
+    elapsed = time.perf_counter() - start
+
+    for sub in actifs:
+        hub.unsubscribe(sub)
+    await asyncio.gather(*consumers)
+
+    print(f"abonnés : {args.idle} inactifs + {args.active} actifs, {args.owners} propriétaires")
+    print(f"événements publiés : {args.events} en {elapsed:.2f}s ({args.events / elapsed:.0f}/s)")
+    print(f"coût publish : p50 {percentile(publish_costs, 50) * 1e6:.1f}µs, p99 {percentile(publish_costs, 99) * 1e6:.1f}µs")
+    if latences:
+        print(f"latence de livraison : p50 {percentile(latences, 50) * 1000:.2f}ms, p99 {percentile(latences, 99) * 1000:.2f}ms")
+    print(hub.stats())
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--idle", type=int, default=5000)
+    parser.add_argument("--active", type=int, default=500)
+    parser.add_argument("--owners", type=int, default=100)
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--yield-every", type=int, default=10)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,73 @@
+"""
+Benchmark : requête sur 30 jours, agrégation des données brutes contre rollups précalculés
+Usage : python -m benchmarks.bench_rollups --interval 10
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from database.mongo import db
+from database import storage
+from benchmarks.common import bench_client, cleanup, percentile, run_prefix, seed_objets, seed_user
+from services.rollups import GRANULARITES, backfill, check_consistency
+
+async def seed_donnees(capteur, owner_id, debut, jours, interval, chunk=10000):
+    """Une lecture toutes les `interval` secondes pendant `jours` jours"""
+    total = jours * 86400 // interval
+    for start in range(0, total, chunk):
+        docs = []
+        for i in range(start, min(start + chunk, total)):
+            ts = debut + timedelta(seconds=i * interval)
+            docs.append({
+                "capteurId": capteur,
+                "valeur": float(i % 100),
+                "timestamp": ts.isoformat(),
+                "ts": ts,
+                "owner_id": owner_id
+            })
+        await storage.collection().insert_many(storage.to_storage(docs), ordered=False)
+    return total
+
+async def timed(client, url, params, headers, runs):
+    latences = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        response = await client.get(url, params=params, headers=headers)
+        latences.append(time.perf_counter() - start)
+        response.raise_for_status()
+    return latences, response.json()["total_points"]
+
+async def main(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteur = (await seed_objets(prefix, user["id"], 1))[0]
+            fin = datetime(2024, 2, 1, tzinfo=timezone.utc)
+            debut = fin - timedelta(days=30)
+            total = await seed_donnees(capteur, user["id"], debut, 30, args.interval)
+            for granularite in GRANULARITES:
+                await backfill(granularite, capteur)
+            ecarts = await check_consistency("1h", capteur)
+
+            params = {"from": debut.isoformat(), "to": fin.isoformat()}
+            brut, n_brut = await timed(
+                client, f"/data/{capteur}/aggregate", {**params, "bucket": "1h"}, user["headers"], args.runs
+            )
+            rollup, n_rollup = await timed(
+                client, f"/data/{capteur}/rollups", {**params, "granularite": "1h"}, user["headers"], args.runs
+            )
+
+        print(f"{total:,} données brutes sur 30 jours, écarts de cohérence : {len(ecarts)}")
+        print(f"Brut ($group)  : p50 {percentile(brut, 50) * 1000:.1f} ms ({n_brut} points)")
+        print(f"Rollups 1h     : p50 {percentile(rollup, 50) * 1000:.1f} ms ({n_rollup} points)")
+    finally:
+        await cleanup(prefix)
+        for config in GRANULARITES.values():
+            await db[config["collection"]].delete_many({"capteurId": {"$regex": f"^{prefix}"}})
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--interval", type=int, default=10, help="secondes entre deux lectures")
+    parser.add_argument("--runs", type=int, default=20)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,77 @@
+"""
+Benchmark : sérialisation JSON d'une réponse d'historique de 10k / 100k documents
+Compare (sans MongoDB) l'ancien chemin (boucle str(_id) + jsonable_encoder + json),
+la validation par response_model puis orjson, et orjson sur les documents déjà
+projetés avec $toString (chemin actuel de GET /data/{capteur_id})
+Usage : python -m benchmarks.bench_serialization --sizes 10000 100000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from models.schemas import DonneesPage
+
+def documents_bruts(count):
+    """Documents tels que renvoyés par Motor sans projection (_id ObjectId)"""
+    origine = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "capteurId": "capteur-1",
+            "valeur": float(i % 100),
+            "timestamp": (origine + timedelta(seconds=i)).isoformat(),
+            "ts": origine + timedelta(seconds=i),
+            "owner_id": "owner"
+        }
+        for i in range(count)
+    ]
+
+def documents_projetes(bruts):
+    """Mêmes documents avec la projection json_projection (id déjà en chaîne)"""
+    return [{**{k: v for k, v in doc.items() if k != "_id"}, "id": str(doc["_id"])} for doc in bruts]
+
+def ancien_chemin(bruts):
+    docs = [dict(doc) for doc in bruts]
+    for doc in docs:
+        doc["id"] = str(doc.pop("_id"))
+    contenu = {"capteur_id": "capteur-1", "total_donnees": len(docs), "donnees": docs, "next_cursor": None}
+    return JSONResponse(jsonable_encoder(contenu)).body
+
+def response_model_orjson(projetes):
+    contenu = {"capteur_id": "capteur-1", "total_donnees": len(projetes), "donnees": projetes, "next_cursor": None}
+    return ORJSONResponse(DonneesPage.model_validate(contenu).model_dump(mode="json")).body
+
+def orjson_direct(projetes):
+    contenu = {"capteur_id": "capteur-1", "total_donnees": len(projetes), "donnees": projetes, "next_cursor": None}
+    return ORJSONResponse(contenu).body
+
+def mesurer(fn, data, repetitions):
+    meilleur, taille = float("inf"), 0
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        taille = len(fn(data))
+        meilleur = min(meilleur, time.perf_counter() - start)
+    return meilleur, taille
+
+def main(args):
+    print(f"{'documents':>10} {'chemin':<34} {'temps (ms)':>11} {'taille (Ko)':>12} {'gain':>7}")
+    for count in args.sizes:
+        bruts = documents_bruts(count)
+        projetes = documents_projetes(bruts)
+        reference = None
+        for nom, fn, data in (
+            ("str(_id) + jsonable_encoder + json", ancien_chemin, bruts),
+            ("response_model + orjson", response_model_orjson, projetes),
+            ("$toString + orjson direct", orjson_direct, projetes),
+        ):
+            duree, taille = mesurer(fn, data, args.repetitions)
+            reference = reference or duree
+            print(f"{count:>10} {nom:<34} {duree * 1000:>11.1f} {taille / 1024:>12.0f} {reference / duree:>6.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--repetitions", type=int, default=3)
+    main(parser.parse_args())
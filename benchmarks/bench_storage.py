@@ -0,0 +1,121 @@
+"""
+Benchmark : disposition documents (donnees) contre collection time-series (donnees_ts)
+Mesure le débit d'insertion, la taille sur disque (données + index) et la latence
+des lectures par plage (page d'historique sur 1 h, agrégation horaire sur 1 jour)
+Les deux collections sont créées pour le run puis supprimées
+Usage : python -m benchmarks.bench_storage --readings 1000000 --capteurs 100
+"""
+import argparse
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from pymongo import DESCENDING
+from database.mongo import db
+from database.indexes import INDEXES
+from database.storage import META_FIELD, TIMESERIES_INDEXES, TIMESERIES_OPTIONS
+from benchmarks.common import percentile, run_prefix
+
+ORIGINE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+def make_docs(capteurs, start, stop, interval, timeseries):
+    """Lectures entrelacées des capteurs, une toutes les `interval` secondes par capteur"""
+    docs = []
+    for i in range(start, stop):
+        capteur = capteurs[i % len(capteurs)]
+        ts = ORIGINE + timedelta(seconds=(i // len(capteurs)) * interval)
+        doc = {"valeur": round(20 + 5 * random.random(), 2), "timestamp": ts.isoformat(), "ts": ts}
+        cles = {"capteurId": capteur, "owner_id": "bench-owner"}
+        if timeseries:
+            doc[META_FIELD] = cles
+        else:
+            doc.update(cles)
+        docs.append(doc)
+    return docs
+
+async def create(name, timeseries):
+    if timeseries:
+        await db.create_collection(name, timeseries=TIMESERIES_OPTIONS)
+        await db[name].create_indexes(TIMESERIES_INDEXES)
+    else:
+        await db.create_collection(name)
+        await db[name].create_indexes(INDEXES["donnees"])
+
+async def insert(name, capteurs, args, timeseries):
+    """Insertion par lots non ordonnés, comme ingest_donnees ; retourne le débit (docs/s)"""
+    start = time.perf_counter()
+    for debut in range(0, args.readings, args.batch_size):
+        fin = min(debut + args.batch_size, args.readings)
+        await db[name].insert_many(make_docs(capteurs, debut, fin, args.interval, timeseries), ordered=False)
+    return args.readings / (time.perf_counter() - start)
+
+async def storage_size(name):
+    stats = await db.command("collStats", name)
+    return stats.get("storageSize", 0), stats.get("totalIndexSize", 0)
+
+async def range_queries(name, capteurs, args, timeseries):
+    """Latences (s) : page des 100 plus récentes sur 1 h, puis agrégation horaire sur 1 jour"""
+    prefixe = f"{META_FIELD}." if timeseries else ""
+    duree = timedelta(seconds=(args.readings // len(capteurs)) * args.interval)
+    pages, agregations = [], []
+    for _ in range(args.queries):
+        capteur = random.choice(capteurs)
+        fin = ORIGINE + duree * random.random()
+        filtre = {f"{prefixe}capteurId": capteur, f"{prefixe}owner_id": "bench-owner"}
+
+        start = time.perf_counter()
+        await db[name].find(
+            {**filtre, "ts": {"$gte": fin - timedelta(hours=1), "$lte": fin}},
+            {"_id": 1, "valeur": 1, "timestamp": 1, "ts": 1}
+        ).sort([("ts", DESCENDING), ("_id", DESCENDING)]).limit(100).to_list(length=100)
+        pages.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await db[name].aggregate([
+            {"$match": {**filtre, "ts": {"$gte": fin - timedelta(days=1), "$lte": fin}}},
+            {"$group": {
+                "_id": {"$dateTrunc": {"date": "$ts", "unit": "hour"}},
+                "count": {"$sum": 1},
+                "avg": {"$avg": "$valeur"}
+            }}
+        ]).to_list(length=None)
+        agregations.append(time.perf_counter() - start)
+    return pages, agregations
+
+async def main(args):
+    prefix = run_prefix().replace("-", "_")
+    capteurs = [f"{prefix}-capteur-{i}" for i in range(args.capteurs)]
+    resultats = {}
+    try:
+        for nom, timeseries in (("documents", False), ("timeseries", True)):
+            collection = f"{prefix}_{nom}"
+            await create(collection, timeseries)
+            debit = await insert(collection, capteurs, args, timeseries)
+            donnees, index = await storage_size(collection)
+            pages, agregations = await range_queries(collection, capteurs, args, timeseries)
+            resultats[nom] = (debit, donnees, index, pages, agregations)
+    finally:
+        for nom in ("documents", "timeseries"):
+            await db.drop_collection(f"{prefix}_{nom}")
+
+    print(f"{args.readings} données, {args.capteurs} capteurs, {args.queries} requêtes par mesure")
+    print(
+        f"{'disposition':<12}{'insert (docs/s)':>16}{'données (Mo)':>14}{'index (Mo)':>12}"
+        f"{'page p50/p99 (ms)':>20}{'agrég. p50/p99 (ms)':>22}"
+    )
+    for nom, (debit, donnees, index, pages, agregations) in resultats.items():
+        page = f"{percentile(pages, 50) * 1000:.2f}/{percentile(pages, 99) * 1000:.2f}"
+        agregation = f"{percentile(agregations, 50) * 1000:.2f}/{percentile(agregations, 99) * 1000:.2f}"
+        print(
+            f"{nom:<12}{debit:>16.0f}{donnees / 2**20:>14.1f}{index / 2**20:>12.1f}"
+            f"{page:>20}{agregation:>22}"
+        )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=1000000)
+    parser.add_argument("--capteurs", type=int, default=100)
+    parser.add_argument("--interval", type=int, default=10, help="Secondes entre deux lectures d'un capteur")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=200)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,74 @@
+"""
+Benchmark : POST /data/ unitaire, insert_one par requête contre écriture différée
+Lance la même charge dans trois processus : WRITE_BEHIND_ENABLED=0, puis 1 en
+durabilité commit et immediate, et compare débit et latences
+Usage : python -m benchmarks.bench_write_behind --readings 20000 --concurrency 64
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from benchmarks.bench_batch_ingest import make_readings
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from services.write_behind import write_behind
+
+MODES = {
+    "insert_one": {"WRITE_BEHIND_ENABLED": "0"},
+    "groupe commit": {"WRITE_BEHIND_ENABLED": "1", "WRITE_BEHIND_DURABILITY": "commit"},
+    "groupe immediate": {"WRITE_BEHIND_ENABLED": "1", "WRITE_BEHIND_DURABILITY": "immediate"},
+}
+
+async def run(args):
+    prefix = run_prefix()
+    try:
+        async with bench_client() as client:
+            user = await seed_user(prefix)
+            capteurs = await seed_objets(prefix, user["id"], args.capteurs)
+            readings = make_readings(capteurs, args.readings, 0)
+
+            def post(reading):
+                async def task():
+                    response = await client.post("/data/", json=reading, headers=user["headers"])
+                    response.raise_for_status()
+                return task
+
+            start = time.perf_counter()
+            latences = await run_concurrent([post(r) for r in readings], args.concurrency)
+            duree = time.perf_counter() - start
+            stats = write_behind.stats()
+        print(json.dumps({
+            "debit": args.readings / duree,
+            "p50_ms": percentile(latences, 50) * 1000,
+            "p99_ms": percentile(latences, 99) * 1000,
+            "groupe_moyen": stats["taille_moyenne_groupe"]
+        }))
+    finally:
+        await cleanup(prefix)
+
+def main(args):
+    print(f"{'mode':<18}{'débit (req/s)':>15}{'p50 (ms)':>10}{'p99 (ms)':>10}{'groupe moyen':>14}")
+    for nom, env in MODES.items():
+        sortie = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_write_behind", "--run",
+             "--readings", str(args.readings), "--capteurs", str(args.capteurs),
+             "--concurrency", str(args.concurrency)],
+            env={**os.environ, **env, "MQTT_ENABLED": "0"},
+            capture_output=True, text=True, check=True
+        )
+        r = json.loads(sortie.stdout.strip().splitlines()[-1])
+        print(f"{nom:<18}{r['debit']:>15.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['groupe_moyen']:>14.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--readings", type=int, default=20000)
+    parser.add_argument("--capteurs", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--run", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        asyncio.run(run(args))
+    else:
+        main(args)
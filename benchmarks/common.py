@@ -0,0 +1,92 @@
+"""
+Outils communs aux benchmarks
+Les benchmarks s'exécutent en processus contre main.app (transport ASGI httpx)
+et une instance MongoDB locale : python -m benchmarks.<nom_du_benchmark>
+"""
+import asyncio
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List
+import httpx
+from database.mongo import db
+from database import storage
+from main import app
+from utils.security import create_access_token, hash_password
+
+# 🚀 Client HTTP en processus avec le cycle de vie de l'application
+@asynccontextmanager
+async def bench_client():
+    """Démarrer le lifespan de l'app et ouvrir un client httpx sur le transport ASGI"""
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            yield client
+
+# 🌱 Préfixe unique pour isoler les données d'un run
+def run_prefix() -> str:
+    return f"bench-{uuid.uuid4().hex[:8]}"
+
+async def seed_user(prefix: str) -> dict:
+    """Créer un utilisateur de benchmark et retourner ses en-têtes d'authentification"""
+    # Domaine réservé à la documentation : .local est refusé par la validation EmailStr du login
+    email = f"{prefix}@bench.example.com"
+    result = await db["users"].insert_one({
+        "email": email,
+        "username": prefix,
+        "password": hash_password("bench-password")
+    })
+    user_id = str(result.inserted_id)
+    token = create_access_token(data={"sub": user_id})
+    return {"id": user_id, "email": email, "headers": {"Authorization": f"Bearer {token}"}}
+
+async def seed_objets(prefix: str, user_id: str, count: int) -> List[str]:
+    """Créer `count` capteurs pour l'utilisateur et retourner leurs capteurId"""
+    capteurs = [f"{prefix}-capteur-{i}" for i in range(count)]
+    await db["objets"].insert_many([
+        {
+            "nom": capteur,
+            "type": "temperature",
+            "emplacement": "bench",
+            "capteurId": capteur,
+            "utilisateur": user_id
+        }
+        for capteur in capteurs
+    ])
+    return capteurs
+
+async def cleanup(prefix: str):
+    """Supprimer toutes les données créées par un run"""
+    pattern = {"$regex": f"^{prefix}"}
+    await db["users"].delete_many({"username": pattern})
+    await db["objets"].delete_many({"capteurId": pattern})
+    await db["seuils"].delete_many({"capteurId": pattern})
+    await storage.collection().delete_many(storage.match(capteurId=pattern))
+    await db["alertes"].delete_many({"capteurId": pattern})
+    await db["device_tokens"].delete_many({"capteurId": pattern})
+    await db["latest"].delete_many({"_id": pattern})
+    for rollup in ("donnees_1m", "donnees_1h", "donnees_1d"):
+        await db[rollup].delete_many({"capteurId": pattern})
+
+# ⏱ Mesures
+async def run_concurrent(tasks: List[Callable[[], Awaitable]], concurrency: int) -> List[float]:
+    """Exécuter les tâches avec une concurrence bornée et retourner leurs latences (s)"""
+    semaphore = asyncio.Semaphore(concurrency)
+    latences = []
+
+    async def run(task):
+        async with semaphore:
+            start = time.perf_counter()
+            await task()
+            latences.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(run(task) for task in tasks))
+    return latences
+
+def percentile(values: List[float], p: float) -> float:
+    """Percentile p (0-100) par rang le plus proche"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
@@ -0,0 +1,236 @@
+"""
+Suite de benchmarks des routes principales, en processus contre main.app
+Jeu de données réaliste (utilisateurs, objets, historique de données et alertes)
+puis, pour chaque scénario et chaque niveau de concurrence : débit, p50, p99
+Scénarios : login, post_data, get_history, latest, alertes
+Les résultats sont écrits en JSON (commit git inclus) pour comparer les versions
+Reproductible : jeu de données et tirage des requêtes dépendent de --seed (enregistré
+dans le rapport), deux exécutions sur le même commit envoient les mêmes requêtes
+Mode profilage : le scénario post_data (chemin d'ingestion) est exécuté sous
+cProfile (fichier .prof, lisible avec snakeviz) ou py-spy (flamegraph speedscope)
+Usage :
+  python -m benchmarks.suite --donnees 2000000 --concurrency 1 16 64 --seed 42 --output resultats.json
+  python -m benchmarks.suite --donnees 100000 --profile cprofile --profile-output ingest.prof
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import platform
+import pstats
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from benchmarks.common import bench_client, cleanup, percentile, run_concurrent, run_prefix, seed_objets, seed_user
+from database import storage
+from database.mongo import db
+from database.settings import get_mongo_settings
+from services.write_behind import WRITE_BEHIND_DURABILITY, WRITE_BEHIND_ENABLED
+
+SCENARIOS = ("login", "post_data", "get_history", "latest", "alertes")
+# Historique seedé : une donnée toutes les SEED_INTERVAL secondes par capteur, jusqu'à ORIGINE
+ORIGINE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SEED_INTERVAL = 10
+
+# 🌱 Jeu de données
+async def seed_donnees(capteurs, owner_id, count, chunk=10000):
+    """`count` données réparties sur les capteurs, antérieures à ORIGINE"""
+    for start in range(0, count, chunk):
+        docs = []
+        for i in range(start, min(start + chunk, count)):
+            ts = ORIGINE - timedelta(seconds=(i // len(capteurs) + 1) * SEED_INTERVAL)
+            docs.append({
+                "capteurId": capteurs[i % len(capteurs)],
+                "valeur": round(20 + 10 * random.random(), 2),
+                "timestamp": ts.isoformat(),
+                "ts": ts,
+                "owner_id": owner_id
+            })
+        await storage.collection().insert_many(storage.to_storage(docs), ordered=False)
+
+async def seed_alertes(capteurs, owner_id, count):
+    alertes = []
+    for i in range(count):
+        ts = ORIGINE - timedelta(minutes=i)
+        alertes.append({
+            "capteurId": capteurs[i % len(capteurs)],
+            "valeur": 99.0,
+            "message": "⚠ Valeur 99.0 dépasse le seuil (50.0)",
+            "regle": "max",
+            "timestamp": ts.isoformat(),
+            "ts": ts,
+            "owner_id": owner_id
+        })
+    if alertes:
+        await db["alertes"].insert_many(alertes, ordered=False)
+
+async def seed(prefix, args):
+    """Créer les utilisateurs, leurs capteurs, l'historique et les alertes"""
+    users = []
+    for i in range(args.users):
+        user = await seed_user(f"{prefix}-u{i}")
+        user["capteurs"] = await seed_objets(f"{prefix}-u{i}", user["id"], args.capteurs)
+        users.append(user)
+    start = time.perf_counter()
+    par_user = args.donnees // len(users)
+    for user in users:
+        await seed_donnees(user["capteurs"], user["id"], par_user)
+        await seed_alertes(user["capteurs"], user["id"], args.alertes // len(users))
+    print(
+        f"seed : {len(users)} utilisateurs, {len(users) * args.capteurs} capteurs, "
+        f"{par_user * len(users)} données en {time.perf_counter() - start:.1f}s",
+        file=sys.stderr
+    )
+    return users
+
+# 🎯 Scénarios
+def build_tasks(scenario, client, users, count, statuts, sequence):
+    """Requêtes d'un scénario ; les codes de réponse sont comptés dans statuts"""
+
+    def request(method, url, **kwargs):
+        async def task():
+            response = await client.request(method, url, **kwargs)
+            statuts[response.status_code] += 1
+        return task
+
+    tasks = []
+    for _ in range(count):
+        user = random.choice(users)
+        capteur = random.choice(user["capteurs"])
+        if scenario == "login":
+            tasks.append(request(
+                "POST", "/auth/login",
+                json={"email": user["email"], "password": "bench-password"}
+            ))
+        elif scenario == "post_data":
+            # Timestamps postérieurs à l'historique, tous distincts (index unique capteurId + timestamp)
+            ts = ORIGINE + timedelta(milliseconds=next(sequence))
+            tasks.append(request(
+                "POST", "/data/",
+                json={"capteurId": capteur, "valeur": round(20 + 10 * random.random(), 2), "timestamp": ts.isoformat()},
+                headers=user["headers"]
+            ))
+        elif scenario == "get_history":
+            tasks.append(request("GET", f"/data/{capteur}", params={"limit": 100}, headers=user["headers"]))
+        elif scenario == "latest":
+            tasks.append(request("GET", f"/data/{capteur}/latest", headers=user["headers"]))
+        else:
+            tasks.append(request("GET", "/data/alertes/all", params={"limit": 100}, headers=user["headers"]))
+    return tasks
+
+async def run_scenario(scenario, client, users, args, concurrency, sequence) -> dict:
+    statuts = Counter()
+    tasks = build_tasks(scenario, client, users, args.requests, statuts, sequence)
+    start = time.perf_counter()
+    latences = await run_concurrent(tasks, concurrency)
+    duree = time.perf_counter() - start
+    return {
+        "scenario": scenario,
+        "concurrence": concurrency,
+        "requetes": len(latences),
+        "debit": round(len(latences) / duree, 1),
+        "p50_ms": round(percentile(latences, 50) * 1000, 3),
+        "p99_ms": round(percentile(latences, 99) * 1000, 3),
+        "max_ms": round(max(latences) * 1000, 3),
+        "erreurs": sum(n for code, n in statuts.items() if code >= 400),
+        "statuts": {str(code): n for code, n in sorted(statuts.items())}
+    }
+
+# 🔥 Profilage du chemin d'ingestion
+async def profile_ingest(client, users, args, sequence):
+    concurrency = max(args.concurrency)
+    tasks = build_tasks("post_data", client, users, args.requests, Counter(), sequence)
+    if args.profile == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        await run_concurrent(tasks, concurrency)
+        profiler.disable()
+        profiler.dump_stats(args.profile_output)
+        pstats.Stats(profiler, stream=sys.stderr).sort_stats("cumulative").print_stats(30)
+    else:
+        # py-spy échantillonne ce processus depuis l'extérieur pendant le scénario
+        spy = subprocess.Popen([
+            "py-spy", "record", "--pid", str(os.getpid()), "--format", "speedscope",
+            "--output", args.profile_output, "--rate", "250"
+        ])
+        await asyncio.sleep(1)
+        await run_concurrent(tasks, concurrency)
+        spy.send_signal(signal.SIGINT)
+        spy.wait()
+    print(f"profil écrit dans {args.profile_output}", file=sys.stderr)
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def main(args):
+    random.seed(args.seed)
+    prefix = run_prefix()
+    # Compteur partagé des timestamps postés (unicité capteurId + timestamp)
+    sequence = iter(range(10 ** 12))
+    resultats = []
+    try:
+        async with bench_client() as client:
+            users = await seed(prefix, args)
+            if args.profile:
+                await profile_ingest(client, users, args, sequence)
+                return
+            for scenario in args.scenarios:
+                for concurrency in args.concurrency:
+                    resultat = await run_scenario(scenario, client, users, args, concurrency, sequence)
+                    print(
+                        f"{scenario:<12} c={concurrency:<4} {resultat['debit']:>9.1f} req/s"
+                        f"  p50 {resultat['p50_ms']:>8.2f}ms  p99 {resultat['p99_ms']:>8.2f}ms"
+                        f"  erreurs {resultat['erreurs']}",
+                        file=sys.stderr
+                    )
+                    resultats.append(resultat)
+    finally:
+        await cleanup(prefix)
+
+    rapport = {
+        "commit": git_commit(),
+        "date": datetime.now(timezone.utc).isoformat(),
+        "environnement": {
+            "python": platform.python_version(),
+            "stockage": get_mongo_settings().donnees_storage,
+            "write_behind": WRITE_BEHIND_DURABILITY if WRITE_BEHIND_ENABLED else None
+        },
+        "parametres": {k: v for k, v in vars(args).items() if not k.startswith("profile")},
+        "resultats": resultats
+    }
+    sortie = json.dumps(rapport, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(sortie)
+    print(sortie)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--capteurs", type=int, default=20, help="Capteurs par utilisateur")
+    parser.add_argument("--donnees", type=int, default=1000000, help="Données seedées au total")
+    parser.add_argument("--alertes", type=int, default=10000, help="Alertes seedées au total")
+    parser.add_argument("--requests", type=int, default=2000, help="Requêtes par scénario et concurrence")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64])
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=0, help="Graine du jeu de données et des requêtes")
+    parser.add_argument("--output", help="Fichier JSON des résultats")
+    parser.add_argument("--profile", choices=["cprofile", "pyspy"], help="Profiler le chemin d'ingestion")
+    parser.add_argument("--profile-output", default="ingest.prof")
+    args = parser.parse_args()
+    if args.profile == "pyspy" and shutil.which("py-spy") is None:
+        parser.error("py-spy introuvable (pip install py-spy)")
+    asyncio.run(main(args))
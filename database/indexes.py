@@ -0,0 +1,239 @@
+"""
+Registre déclaratif des index MongoDB
+Appliqué au démarrage (lifespan) ; rapport d'utilisation : python -m database.indexes
+"""
+import asyncio
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+from database.mongo import db
+from database.storage import TIMESERIES_COLLECTION, TIMESERIES_INDEXES, ensure_timeseries_collection, is_timeseries
+
+logger = logging.getLogger(__name__)
+
+# Délai entre expire_at et la suppression par l'index TTL (services/retention.py) :
+# l'archivage supprime normalement avant, le TTL borne la base s'il prend du retard
+RETENTION_TTL_GRACE_SECONDS = int(float(os.getenv("RETENTION_TTL_GRACE_DAYS", "7")) * 86400)
+# Index TTL créés seulement quand l'archivage tourne (même variable que services/retention.py) :
+# sans archiveur, le TTL supprimerait des documents jamais archivés. Retirés sinon
+RETENTION_TTL_ENABLED = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+INDEX_NOT_FOUND = 27
+
+# 🗂 Index déclarés par collection
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        # Remplace la vérification find_one de register
+        IndexModel([("email", ASCENDING)], unique=True, name="users_email_unique"),
+    ],
+    "objets": [
+        # Remplace la vérification find_one de create_objet
+        IndexModel([("capteurId", ASCENDING)], unique=True, name="objets_capteur_unique"),
+        IndexModel([("utilisateur", ASCENDING)], name="objets_utilisateur"),
+    ],
+    "donnees": [
+        # Remplace la vérification find_one de save_data
+        IndexModel(
+            [("capteurId", ASCENDING), ("timestamp", ASCENDING)],
+            unique=True,
+            name="donnees_capteur_timestamp_unique"
+        ),
+        # Historique paginé par (ts, _id), plages de dates et agrégations
+        IndexModel(
+            [("capteurId", ASCENDING), ("owner_id", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+            name="donnees_capteur_owner_ts_id"
+        ),
+    ],
+    # Rollups (services/rollups.py) : clé de l'upsert et du $merge de reconstruction
+    **{
+        collection: [
+            IndexModel(
+                [("capteurId", ASCENDING), ("owner_id", ASCENDING), ("debut", ASCENDING)],
+                unique=True,
+                name=f"{collection}_capteur_owner_debut_unique"
+            ),
+        ]
+        for collection in ("donnees_1m", "donnees_1h", "donnees_1d")
+    },
+    "seuils": [
+        IndexModel(
+            [("capteurId", ASCENDING), ("owner_id", ASCENDING)],
+            unique=True,
+            name="seuils_capteur_owner_unique"
+        ),
+        IndexModel([("owner_id", ASCENDING)], name="seuils_owner"),
+    ],
+    # Jetons d'appareil (utils/device_tokens.py) : liste par capteur et rechargement des révocations
+    "device_tokens": [
+        IndexModel([("capteurId", ASCENDING), ("owner_id", ASCENDING)], name="device_tokens_capteur_owner"),
+        IndexModel(
+            [("revoked_at", ASCENDING), ("expires_at", ASCENDING)],
+            name="device_tokens_revoked_expires"
+        ),
+    ],
+    "alertes": [
+        IndexModel(
+            [("owner_id", ASCENDING), ("ts", DESCENDING), ("_id", DESCENDING)],
+            name="alertes_owner_ts_id"
+        ),
+    ],
+    # Politiques de rétention (services/retention.py) : capteurId null = défaut du propriétaire
+    "retention": [
+        IndexModel(
+            [("owner_id", ASCENDING), ("capteurId", ASCENDING)],
+            unique=True,
+            name="retention_owner_capteur_unique"
+        ),
+    ],
+    # Seaux partagés du limiteur (utils/rate_limit.py, backend mongo) : oubliés après 1 h d'inactivité
+    "rate_limits": [
+        IndexModel([("updated_at", ASCENDING)], expireAfterSeconds=3600, name="rate_limits_updated_at_ttl"),
+    ],
+}
+
+# Rétention : archivage des documents expirés puis suppression par TTL (RETENTION_TTL_ENABLED)
+RETENTION_TTL_INDEXES: Dict[str, List[IndexModel]] = {
+    collection: [
+        IndexModel(
+            [("expire_at", ASCENDING)],
+            expireAfterSeconds=RETENTION_TTL_GRACE_SECONDS,
+            name=f"{collection}_expire_at_ttl"
+        ),
+    ]
+    for collection in ("donnees", "alertes")
+}
+
+# 🔎 Requêtes représentatives des routes, vérifiées avec explain()
+HOT_QUERIES = [
+    {"nom": "login", "collection": "users", "filter": {"email": "x"}},
+    {"nom": "objets par utilisateur", "collection": "objets", "filter": {"utilisateur": "x"}},
+    {"nom": "objet par capteur", "collection": "objets", "filter": {"capteurId": "x"}},
+    {
+        "nom": "historique capteur",
+        "collection": "donnees",
+        "filter": {"capteurId": "x", "owner_id": "x"},
+        "sort": [("ts", DESCENDING), ("_id", DESCENDING)]
+    },
+    {
+        "nom": "historique capteur (timeseries)",
+        "collection": TIMESERIES_COLLECTION,
+        "filter": {"meta.capteurId": "x", "meta.owner_id": "x"},
+        "sort": [("ts", DESCENDING)]
+    },
+    {"nom": "seuils par utilisateur", "collection": "seuils", "filter": {"owner_id": "x"}},
+    {
+        "nom": "alertes par utilisateur",
+        "collection": "alertes",
+        "filter": {"owner_id": "x"},
+        "sort": [("ts", DESCENDING), ("_id", DESCENDING)]
+    },
+]
+
+# ⚙ Application idempotente du registre
+async def ensure_indexes() -> Dict[str, dict]:
+    """
+    Créer les index déclarés ; un index déjà présent avec la même définition est ignoré
+    Chaque index est créé séparément pour qu'un échec (doublons existants,
+    définition en conflit) n'empêche pas la création des autres
+    """
+    rapport = {}
+    if is_timeseries():
+        # Collection time-series et ses index (database/storage.py)
+        try:
+            await ensure_timeseries_collection()
+            rapport[TIMESERIES_COLLECTION] = {"index": [m.document["name"] for m in TIMESERIES_INDEXES], "erreurs": {}}
+        except OperationFailure as e:
+            logger.error("Collection %s non créée: %s", TIMESERIES_COLLECTION, e)
+            rapport[TIMESERIES_COLLECTION] = {"index": [], "erreurs": {TIMESERIES_COLLECTION: str(e)}}
+    for collection, models in INDEXES.items():
+        crees, erreurs = [], {}
+        ttl = RETENTION_TTL_INDEXES.get(collection, [])
+        if RETENTION_TTL_ENABLED:
+            models = models + ttl
+        else:
+            for model in ttl:
+                await _drop_index(collection, model.document["name"])
+        for model in models:
+            name = model.document["name"]
+            try:
+                await db[collection].create_indexes([model])
+                crees.append(name)
+            except OperationFailure as e:
+                logger.warning("Index %s.%s non créé: %s", collection, name, e)
+                erreurs[name] = str(e)
+        rapport[collection] = {"index": crees, "erreurs": erreurs}
+    return rapport
+
+async def _drop_index(collection: str, name: str):
+    """Retirer un index s'il existe (index TTL de rétention quand l'archivage est arrêté)"""
+    try:
+        await db[collection].drop_index(name)
+        logger.info("Index %s.%s retiré", collection, name)
+    except OperationFailure as e:
+        if e.code != INDEX_NOT_FOUND:
+            logger.warning("Index %s.%s non retiré: %s", collection, name, e)
+
+# 📊 Utilisation des index
+async def index_usage() -> Dict[str, List[dict]]:
+    """Nombre d'utilisations de chaque index depuis le démarrage de mongod ($indexStats)"""
+    usage = {}
+    for collection in INDEXES:
+        stats = []
+        async for doc in db[collection].aggregate([{"$indexStats": {}}]):
+            ops = doc["accesses"]["ops"]
+            stats.append({
+                "index": doc["name"],
+                "utilisations": ops,
+                "depuis": doc["accesses"]["since"].isoformat(),
+                "inutilise": ops == 0
+            })
+        usage[collection] = stats
+    return usage
+
+def _plan_stages(plan: dict) -> List[str]:
+    """Lister les étapes d'un plan d'exécution (formats classique et SBE)"""
+    stages = []
+    if "stage" in plan:
+        stages.append(plan["stage"])
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages.extend(_plan_stages(plan[key]))
+    for child in plan.get("inputStages", []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+async def explain_query(collection: str, filter: dict, sort: Optional[list] = None) -> dict:
+    """
+    Analyser le plan gagnant d'une requête
+    Signale un index manquant (COLLSCAN) ou un tri en mémoire (SORT)
+    """
+    cursor = db[collection].find(filter)
+    if sort:
+        cursor = cursor.sort(sort)
+    explain = await cursor.explain()
+    stages = _plan_stages(explain["queryPlanner"]["winningPlan"])
+    return {
+        "etapes": stages,
+        "index_manquant": "COLLSCAN" in stages,
+        "tri_en_memoire": "SORT" in stages
+    }
+
+async def check_hot_queries() -> List[dict]:
+    """Exécuter explain() sur les requêtes représentatives des routes"""
+    resultats = []
+    for query in HOT_QUERIES:
+        analyse = await explain_query(query["collection"], query["filter"], query.get("sort"))
+        resultats.append({"requete": query["nom"], "collection": query["collection"], **analyse})
+    return resultats
+
+async def _main():
+    await ensure_indexes()
+    print(json.dumps({
+        "utilisation": await index_usage(),
+        "requetes": await check_hot_queries()
+    }, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,52 @@
+"""
+Migrations de données
+Usage : python -m database.migrations [--batch-size 1000]
+"""
+import argparse
+import asyncio
+import logging
+from pymongo import UpdateOne
+from database.mongo import db
+from utils.timestamps import parse_timestamp
+
+logger = logging.getLogger(__name__)
+
+# 🕒 Ajout du champ date ts aux documents existants
+async def backfill_ts(collection: str, batch_size: int = 1000) -> dict:
+    """
+    Calculer ts à partir de la chaîne timestamp pour les documents qui n'en ont pas
+    Les timestamps invalides reçoivent ts = null pour ne pas être relus à chaque exécution
+    Idempotent : peut être relancé sans risque, y compris pendant l'ingestion
+    """
+    migres, invalides = 0, 0
+    while True:
+        docs = await db[collection].find(
+            {"ts": {"$exists": False}},
+            {"timestamp": 1}
+        ).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            try:
+                ts = parse_timestamp(doc.get("timestamp") or "")
+            except (TypeError, ValueError):
+                ts = None
+                invalides += 1
+            operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"ts": ts}}))
+        await db[collection].bulk_write(operations, ordered=False)
+        migres += len(operations)
+        logger.info("%s : %d documents migrés", collection, migres)
+
+    return {"collection": collection, "migres": migres, "timestamps_invalides": invalides}
+
+async def _main(args):
+    for collection in ("donnees", "alertes"):
+        print(await backfill_ts(collection, args.batch_size))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(_main(parser.parse_args()))
@@ -1,10 +1,152 @@
+import asyncio
+import time
+from collections import deque
+from typing import Optional
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import WriteConcern, monitoring
+from database.settings import get_mongo_settings
+from utils.metrics import METRICS_ENABLED, command_metrics
 
-# رابط الاتصال بقاعدة بيانات MongoDB
-MONGO_URL = "mongodb://localhost:27017"
+# Code d'erreur MongoDB d'une clé unique dupliquée (writeErrors des bulk_write)
+DUPLICATE_KEY_ERROR = 11000
 
-# إنشاء عميل MongoDB
-client = AsyncIOMotorClient(MONGO_URL)
+# 📊 Statistiques du pool de connexions (événements CMAP de pymongo)
+class PoolStats(monitoring.ConnectionPoolListener):
+    """Compteurs du pool et temps d'attente pour obtenir une connexion"""
 
-# اختيار قاعدة البيانات التي سنعمل عليها
-db = client["iot_BD"]
\ No newline at end of file
+    def __init__(self):
+        self.created = 0
+        self.closed = 0
+        self.checked_out = 0
+        self.checkout_failed = 0
+        self.cleared = 0
+        self.waiting = 0
+        self._checkout_ms = deque(maxlen=1000)
+        # Moyenne glissante de l'attente, pour le contrôle d'admission (utils/rate_limit.py)
+        self.wait_ewma_ms = 0.0
+        self._last_checkout = 0.0
+
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+
+    def pool_cleared(self, event):
+        self.cleared += 1
+
+    def connection_created(self, event):
+        self.created += 1
+
+    def connection_closed(self, event):
+        self.closed += 1
+
+    def connection_check_out_started(self, event):
+        self.waiting += 1
+
+    def connection_checked_out(self, event):
+        self.checked_out += 1
+        self.waiting -= 1
+        if event.duration is not None:
+            attente_ms = event.duration * 1000
+            self._checkout_ms.append(attente_ms)
+            self.wait_ewma_ms = 0.8 * self.wait_ewma_ms + 0.2 * attente_ms
+            self._last_checkout = time.monotonic()
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failed += 1
+        self.waiting -= 1
+
+    def recent_wait_ms(self, window: float = 1.0) -> float:
+        """Attente moyenne récente ; 0 si aucune connexion obtenue depuis `window` secondes"""
+        if time.monotonic() - self._last_checkout > window:
+            return 0.0
+        return self.wait_ewma_ms
+
+    def connection_checked_in(self, event):
+        self.checked_out -= 1
+
+    def stats(self) -> dict:
+        attentes = sorted(self._checkout_ms)
+        settings = get_mongo_settings()
+        return {
+            "taille_max": settings.max_pool_size,
+            "taille_min": settings.min_pool_size,
+            "ouvertes": self.created - self.closed,
+            "utilisees": self.checked_out,
+            "en_attente": self.waiting,
+            "creees": self.created,
+            "fermees": self.closed,
+            "echecs_attente": self.checkout_failed,
+            "pool_vide": self.cleared,
+            "attente_ms_p50": round(attentes[len(attentes) // 2], 3) if attentes else 0.0,
+            "attente_ms_p99": round(attentes[min(len(attentes) - 1, int(0.99 * len(attentes)))], 3) if attentes else 0.0,
+            "attente_ms_max": round(attentes[-1], 3) if attentes else 0.0
+        }
+
+pool_stats = PoolStats()
+
+class Database:
+    """
+    Accès à la base partagé par tous les modules (from database.mongo import db)
+    Le client est créé par connect_mongo() dans le lifespan et fermé par close_mongo() ;
+    les scripts (python -m ...) le créent au premier accès
+    """
+
+    def __init__(self):
+        self.client: Optional[AsyncIOMotorClient] = None
+        self._db = None
+        self._ingest = None
+
+    def connect(self):
+        settings = get_mongo_settings()
+        # إنشاء عميل MongoDB
+        listeners = [pool_stats, command_metrics] if METRICS_ENABLED else [pool_stats]
+        self.client = AsyncIOMotorClient(settings.url, event_listeners=listeners, **settings.client_options())
+        # اختيار قاعدة البيانات التي سنعمل عليها
+        self._db = self.client[settings.database]
+        # Collection d'ingestion : write concern propre (w=0 en mode fast)
+        if settings.ingest_write_mode == "fast":
+            self._ingest = self._db.get_collection(settings.donnees_collection, write_concern=WriteConcern(w=0))
+        else:
+            self._ingest = self._db[settings.donnees_collection]
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+        self.client = self._db = self._ingest = None
+
+    def _database(self):
+        if self._db is None:
+            self.connect()
+        return self._db
+
+    def __getitem__(self, name: str):
+        return self._database()[name]
+
+    def __getattr__(self, name: str):
+        return getattr(self._database(), name)
+
+    def ingest_collection(self):
+        """
+        Collection des données brutes (donnees ou donnees_ts) pour les écritures d'ingestion
+        En mode fast (MONGO_INGEST_WRITE_MODE=fast) les insertions ne sont pas
+        acquittées : doublons et erreurs d'écriture ne sont pas signalés
+        """
+        self._database()
+        return self._ingest
+
+db = Database()
+
+# 🚀 Cycle de vie (appelé par le lifespan de main.py)
+async def connect_mongo():
+    """Créer le client puis ouvrir les connexions du pool avant la première requête"""
+    settings = get_mongo_settings()
+    db.connect()
+    warmup = settings.warmup_connections if settings.warmup_connections is not None else settings.min_pool_size
+    start = time.perf_counter()
+    # Des ping simultanés occupent chacun une connexion : le pool en ouvre autant
+    await asyncio.gather(*(db.command("ping") for _ in range(max(1, warmup))))
+    return (time.perf_counter() - start) * 1000
+
+async def close_mongo():
+    db.close()
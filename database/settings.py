@@ -0,0 +1,74 @@
+"""
+Paramètres de connexion MongoDB, lus depuis l'environnement (préfixe MONGO_) ou un fichier .env
+Exemple : MONGO_URL=mongodb://db:27017 MONGO_MAX_POOL_SIZE=200 MONGO_WRITE_CONCERN=majority
+"""
+from functools import lru_cache
+from typing import Literal, Optional, Union
+from pydantic import Field
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+class MongoSettings(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix="MONGO_", env_file=".env", extra="ignore")
+
+    url: str = "mongodb://localhost:27017"
+    database: str = "iot_BD"
+    app_name: str = "iot-api"
+
+    # Pool de connexions
+    max_pool_size: int = Field(100, ge=1)
+    min_pool_size: int = Field(10, ge=0)
+    max_idle_time_ms: Optional[int] = None
+    wait_queue_timeout_ms: Optional[int] = 5000
+    # Connexions ouvertes au démarrage (min_pool_size si None)
+    warmup_connections: Optional[int] = None
+
+    # Délais
+    connect_timeout_ms: int = 5000
+    server_selection_timeout_ms: int = 5000
+    socket_timeout_ms: Optional[int] = None
+
+    # Lecture et écriture
+    read_preference: Literal[
+        "primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest"
+    ] = "primary"
+    write_concern: Union[int, Literal["majority"]] = 1
+    journal: Optional[bool] = None
+    wtimeout_ms: Optional[int] = None
+    # Collection donnees : "default" (write_concern ci-dessus) ou "fast" (w=0, sans accusé)
+    ingest_write_mode: Literal["default", "fast"] = "default"
+    # Disposition des données : "documents" (collection donnees) ou "timeseries"
+    # (collection time-series donnees_ts, voir database/storage.py)
+    # En timeseries, pas d'index unique (capteurId, timestamp) : les doublons sont
+    # acceptés sans erreur ; POST /data/ ne répond jamais 400 « déjà enregistrée »,
+    # les lots et l'écriture différée (même en durabilité commit) ne comptent aucun doublon
+    donnees_storage: Literal["documents", "timeseries"] = "documents"
+
+    @property
+    def donnees_collection(self) -> str:
+        """Nom de la collection des données brutes selon la disposition choisie"""
+        return "donnees_ts" if self.donnees_storage == "timeseries" else "donnees"
+
+    def client_options(self) -> dict:
+        """Options passées à AsyncIOMotorClient"""
+        options = {
+            "appname": self.app_name,
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+            "readPreference": self.read_preference,
+            "w": self.write_concern,
+        }
+        optionnelles = {
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "socketTimeoutMS": self.socket_timeout_ms,
+            "journal": self.journal,
+            "wTimeoutMS": self.wtimeout_ms,
+        }
+        options.update({k: v for k, v in optionnelles.items() if v is not None})
+        return options
+
+@lru_cache
+def get_mongo_settings() -> MongoSettings:
+    return MongoSettings()
@@ -0,0 +1,176 @@
+"""
+Disposition de stockage des données brutes de capteurs (MONGO_DONNEES_STORAGE)
+documents : un document par donnée dans donnees, index unique (capteurId, timestamp)
+timeseries : collection time-series donnees_ts ; capteurId et owner_id forment le
+champ meta, MongoDB regroupe les mesures d'un même capteur dans des buckets
+compressés (stockage et index bien plus petits, lectures par plage moins coûteuses)
+
+Limites du mode timeseries :
+- pas d'index unique : les doublons (capteurId, timestamp) ne sont pas rejetés ; les
+  statuts « doublon » (POST /data/, lots, écriture différée en mode commit) ne sont
+  jamais produits et un renvoi par l'appareil crée une seconde mesure
+- pas de change stream : PUBSUB_SOURCE=changestream ne voit pas les données
+
+Routes et services passent par ces fonctions : filtres, projections et documents
+lus ont la même forme dans les deux modes
+Usage : python -m database.storage create|migrate|verify [--batch-size 5000]
+"""
+import argparse
+import asyncio
+import json
+import logging
+from typing import Iterable, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid
+from database.mongo import db
+from database.settings import get_mongo_settings
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Collection time-series
+TIMESERIES_COLLECTION = "donnees_ts"
+META_FIELD = "meta"
+# Champs des données stockés dans meta en mode timeseries
+META_KEYS = ("capteurId", "owner_id")
+TIMESERIES_OPTIONS = {"timeField": "ts", "metaField": META_FIELD, "granularity": "seconds"}
+TIMESERIES_INDEXES = [
+    # Historique paginé par (ts, _id), plages de dates et agrégations
+    IndexModel(
+        [(f"{META_FIELD}.capteurId", ASCENDING), (f"{META_FIELD}.owner_id", ASCENDING), ("ts", DESCENDING)],
+        name="donnees_ts_capteur_owner_ts"
+    ),
+    # Documents expirés lus par l'archivage (services/retention.py) : pas d'index TTL ici
+    IndexModel([("expire_at", ASCENDING)], name="donnees_ts_expire_at"),
+]
+
+def is_timeseries() -> bool:
+    return get_mongo_settings().donnees_storage == "timeseries"
+
+def collection():
+    """Collection des données brutes pour les lectures"""
+    return db[get_mongo_settings().donnees_collection]
+
+# 🔎 Filtres et projections
+def field(name: str) -> str:
+    """Chemin stocké d'un champ de donnée (meta.capteurId en mode timeseries)"""
+    if name in META_KEYS and is_timeseries():
+        return f"{META_FIELD}.{name}"
+    return name
+
+def ref(name: str) -> str:
+    """Référence d'expression d'agrégation ($capteurId ou $meta.capteurId)"""
+    return f"${field(name)}"
+
+def match(**criteres) -> dict:
+    """Filtre find/$match : match(capteurId=..., owner_id=...)"""
+    return {field(name): valeur for name, valeur in criteres.items()}
+
+def projection(fields: Iterable[str], with_id: bool = True) -> dict:
+    """
+    Projection qui rend les documents à plat dans les deux modes
+    with_id : id converti en chaîne côté MongoDB, comme json_projection
+    """
+    projection = {"_id": 0, "id": {"$toString": "$_id"}} if with_id else {"_id": 0}
+    for name in fields:
+        projection[name] = ref(name) if field(name) != name else 1
+    return projection
+
+# 🔁 Conversion des documents
+def _to_timeseries(doc: dict) -> dict:
+    stocke = {k: v for k, v in doc.items() if k not in META_KEYS}
+    stocke[META_FIELD] = {key: doc[key] for key in META_KEYS}
+    return stocke
+
+def to_storage(docs: List[dict]) -> List[dict]:
+    """
+    Documents à insérer pour la disposition courante
+    Les documents reçus restent à plat et reçoivent leur _id : les traitements
+    après écriture (rollups, latest, alertes) ne dépendent pas du mode
+    """
+    if not is_timeseries():
+        return docs
+    for doc in docs:
+        doc.setdefault("_id", ObjectId())
+    return [_to_timeseries(doc) for doc in docs]
+
+def from_storage(doc: Optional[dict]) -> Optional[dict]:
+    """Document lu sans projection, remis à plat"""
+    if doc is None or META_FIELD not in doc:
+        return doc
+    doc = dict(doc)
+    doc.update(doc.pop(META_FIELD))
+    return doc
+
+# 🏗 Création de la collection time-series
+async def ensure_timeseries_collection() -> bool:
+    """Créer donnees_ts et ses index si nécessaire ; True si la collection a été créée"""
+    try:
+        await db.create_collection(TIMESERIES_COLLECTION, timeseries=TIMESERIES_OPTIONS)
+        cree = True
+    except CollectionInvalid:
+        cree = False
+    await db[TIMESERIES_COLLECTION].create_indexes(TIMESERIES_INDEXES)
+    return cree
+
+# 🚚 Migration donnees → donnees_ts
+async def migrate(batch_size: int = 5000, after: Optional[ObjectId] = None) -> dict:
+    """
+    Copier les documents de donnees vers donnees_ts par lots, dans l'ordre des _id
+    Les _id sont conservés (curseurs de pagination toujours valides). Reprise
+    possible après interruption avec after = dernier _id affiché
+    Les documents sans ts (voir database.migrations) ne sont pas copiés
+    """
+    await ensure_timeseries_collection()
+    copies, ignores = 0, 0
+    query = {"ts": {"$type": "date"}}
+    while True:
+        if after is not None:
+            query["_id"] = {"$gt": after}
+        docs = await db["donnees"].find(query).sort("_id", ASCENDING).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        stockes = [_to_timeseries(doc) for doc in docs if all(key in doc for key in META_KEYS)]
+        ignores += len(docs) - len(stockes)
+        if stockes:
+            await db[TIMESERIES_COLLECTION].insert_many(stockes, ordered=False)
+        copies += len(stockes)
+        after = docs[-1]["_id"]
+        logger.info("%d documents copiés (dernier _id %s)", copies, after)
+    return {"copies": copies, "ignores": ignores, "dernier_id": str(after) if after else None}
+
+async def verify() -> dict:
+    """Comparer le nombre de données par capteur dans les deux collections"""
+    sources = {}
+    for nom, capteur in (("donnees", "$capteurId"), (TIMESERIES_COLLECTION, f"${META_FIELD}.capteurId")):
+        pipeline = [{"$match": {"ts": {"$type": "date"}}}, {"$group": {"_id": capteur, "count": {"$sum": 1}}}]
+        sources[nom] = {doc["_id"]: doc["count"] async for doc in db[nom].aggregate(pipeline)}
+    documents, timeseries = sources["donnees"], sources[TIMESERIES_COLLECTION]
+    ecarts = [
+        {"capteurId": capteur, "donnees": documents.get(capteur, 0), "donnees_ts": timeseries.get(capteur, 0)}
+        for capteur in sorted(set(documents) | set(timeseries), key=str)
+        if documents.get(capteur, 0) != timeseries.get(capteur, 0)
+    ]
+    return {
+        "donnees": sum(documents.values()),
+        "donnees_ts": sum(timeseries.values()),
+        "ecarts": ecarts
+    }
+
+async def _main(args):
+    if args.commande == "create":
+        cree = await ensure_timeseries_collection()
+        rapport = {"collection": TIMESERIES_COLLECTION, "creee": cree}
+    elif args.commande == "migrate":
+        rapport = await migrate(args.batch_size, ObjectId(args.after) if args.after else None)
+    else:
+        rapport = await verify()
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Disposition time-series des données")
+    parser.add_argument("commande", choices=["create", "migrate", "verify"])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--after", help="Reprendre la migration après ce _id")
+    asyncio.run(_main(parser.parse_args()))
@@ -1,17 +1,86 @@
-from fastapi import FastAPI, Depends
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth_routes, data_routes, objets_routes
-from utils.security import get_current_user
-from database.mongo import db
+from routes import auth_routes, data_routes, objets_routes, stream_routes
+from utils.security import get_current_user, password_hasher, require_ops_access, user_cache
+from utils.capteur_cache import CAPTEUR_CACHE_CHANGE_STREAM, capteur_cache, watch_capteur_changes
+from database.mongo import close_mongo, connect_mongo, db, pool_stats
+from database.settings import get_mongo_settings
+from database.indexes import ensure_indexes
+from utils.device_tokens import load_revocations, refresh_revocations
+from services.mqtt_ingest import MQTT_ENABLED, mqtt_worker
+from services.latest import latest_cache, latest_misses
+from services.pubsub import PUBSUB_SOURCE, hub, watch_events
+from services.health import DrainMiddleware, health_monitor
+from services.alerts import alert_engine
+from services.write_behind import WRITE_BEHIND_ENABLED, write_behind
+from services.retention import ARCHIVE_ENABLED, archiver, load_policies, refresh_policies
+from utils.metrics import METRICS_ENABLED, MetricsMiddleware, monitor_event_loop_lag, render_metrics
+from utils.rate_limit import ADMISSION_ENABLED, AdmissionMiddleware, admission, rate_limiter
+
+# Cycle de vie de l'application (démarrage / arrêt)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await connect_mongo()
+    await ensure_indexes()
+    await load_revocations()
+    await load_policies()
+    health_monitor.draining = False
+    await health_monitor.check_mongo()
+    await alert_engine.start()
+    if WRITE_BEHIND_ENABLED:
+        await write_behind.start()
+    watchers = [
+        asyncio.create_task(refresh_revocations()),
+        asyncio.create_task(refresh_policies()),
+        asyncio.create_task(health_monitor.run())
+    ]
+    if ARCHIVE_ENABLED:
+        watchers.append(asyncio.create_task(archiver.run()))
+    if METRICS_ENABLED:
+        watchers.append(asyncio.create_task(monitor_event_loop_lag()))
+    if ADMISSION_ENABLED:
+        watchers.append(asyncio.create_task(admission.monitor_loop_lag()))
+    if CAPTEUR_CACHE_CHANGE_STREAM:
+        watchers.append(asyncio.create_task(watch_capteur_changes()))
+    if PUBSUB_SOURCE == "changestream":
+        watchers.append(asyncio.create_task(watch_events()))
+    if MQTT_ENABLED:
+        await mqtt_worker.start()
+    # Arrêt progressif dès le signal (refus 503, fin des flux temps réel, requêtes
+    # en cours) : le lifespan ne s'exécute qu'après la fermeture des connexions
+    health_monitor.install_signal_handlers(hub.close_all)
+    yield
+    # Vider les files avant de fermer MongoDB
+    if MQTT_ENABLED:
+        await mqtt_worker.stop()
+    # Groupe en cours d'abord : ses données alimentent encore le moteur d'alertes
+    await write_behind.stop()
+    await alert_engine.stop()
+    for watcher in watchers:
+        watcher.cancel()
+    await asyncio.gather(*watchers, return_exceptions=True)
+    health_monitor.restore_signal_handlers()
+    await close_mongo()
 
 # Configuration de l'application FastAPI
 app = FastAPI(
     title="🚀 API IoT Platform",
     description="API IoT complète avec authentification JWT, gestion d'objets et données",
     version="1.0.0",
-    swagger_ui_parameters={"persistAuthorization": True}
+    swagger_ui_parameters={"persistAuthorization": True},
+    # Sérialisation JSON par orjson pour toutes les routes
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Refus (503) en cas de surcharge : trop de requêtes, attente du pool ou boucle en retard
+# Ajouté avant CORS (donc à l'intérieur) : les refus portent les en-têtes CORS
+if ADMISSION_ENABLED:
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
 # Configuration CORS pour permettre les requêtes cross-origin
 app.add_middleware(
     CORSMiddleware,
@@ -21,10 +90,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Requêtes en cours et refus pendant l'arrêt
+app.add_middleware(DrainMiddleware, monitor=health_monitor)
+
+# Latence et requêtes en cours par route (ajouté en dernier : mesure aussi CORS)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
 # Inclusion des routers avec leurs préfixes
 app.include_router(auth_routes.router, prefix="/auth", tags=["🔐 Authentification"])
 app.include_router(objets_routes.router, prefix="/objets", tags=["📡 Objets IoT"])
 app.include_router(data_routes.router, prefix="/data", tags=["📊 Données & Alertes"])
+app.include_router(stream_routes.router, prefix="/stream", tags=["⚡ Temps réel"])
 
 # Route racine - Page d'accueil de l'API
 @app.get("/")
@@ -62,7 +139,7 @@ async def test_database():
         collections = await db.list_collection_names()
         return {
             "status": "✅ Connexion MongoDB OK",
-            "database": "iot_BD",
+            "database": get_mongo_settings().database,
             "collections": collections,
             "total_collections": len(collections)
         }
@@ -85,6 +162,107 @@ async def health_check():
         "version": "1.0.0"
     }
 
+# Sonde de vie (liveness) : le processus répond
+@app.get("/health/live")
+async def liveness():
+    """
+    Sonde de vie : aucune dépendance externe n'est vérifiée
+    """
+    return health_monitor.liveness()
+
+# Sonde de disponibilité (readiness) : 503 si MongoDB ne répond plus ou pendant l'arrêt
+@app.get("/health/ready")
+async def readiness():
+    """
+    Sonde de disponibilité : résultat du dernier ping MongoDB (rafraîchi en arrière-plan)
+    """
+    pret, detail = health_monitor.readiness()
+    return JSONResponse(status_code=200 if pret else 503, content=detail)
+
+# Route des métriques Prometheus
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_ops_access)])
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# Route de suivi de l'ingestion MQTT
+@app.get("/ingest/mqtt/stats", dependencies=[Depends(require_ops_access)])
+async def mqtt_stats():
+    """
+    Statistiques de l'abonné MQTT : file, retard d'ingestion et compteurs de pertes
+    """
+    return mqtt_worker.stats()
+
+# Route de suivi du moteur d'alertes
+@app.get("/alertes/engine/stats", dependencies=[Depends(require_ops_access)])
+async def alert_engine_stats():
+    """
+    Statistiques du moteur d'alertes : file, retard d'évaluation, alertes créées et supprimées
+    """
+    return alert_engine.stats()
+
+# Route de suivi de la rétention
+@app.get("/retention/stats", dependencies=[Depends(require_ops_access)])
+async def retention_stats():
+    """
+    Statistiques de l'archivage : passes, lots, documents archivés et attentes du pool
+    """
+    return archiver.stats()
+
+# Route de suivi de l'écriture différée
+@app.get("/ingest/write-behind/stats", dependencies=[Depends(require_ops_access)])
+async def write_behind_stats():
+    """
+    Statistiques de l'écriture différée : tampon, taille et durée des groupes, refus
+    """
+    return write_behind.stats()
+
+# Route de suivi de la limitation de débit
+@app.get("/admission/stats", dependencies=[Depends(require_ops_access)])
+async def admission_stats():
+    """
+    Seaux à jetons des routes d'ingestion et refus du limiteur global par raison
+    """
+    return {
+        "limitation": rate_limiter.stats(),
+        "surcharge": admission.stats()
+    }
+
+# Route de suivi du pool bcrypt
+@app.get("/auth/hash/stats", dependencies=[Depends(require_ops_access)])
+async def password_hash_stats():
+    """
+    Statistiques du pool de hachage : appels en cours, refus et temps d'attente en file
+    """
+    return password_hasher.stats()
+
+# Route de suivi du pool de connexions MongoDB
+@app.get("/db/pool/stats", dependencies=[Depends(require_ops_access)])
+async def mongo_pool_stats():
+    """
+    Connexions ouvertes et utilisées, temps d'attente pour obtenir une connexion
+    """
+    settings = get_mongo_settings()
+    return {
+        **pool_stats.stats(),
+        "read_preference": settings.read_preference,
+        "write_concern": settings.write_concern,
+        "ingest_write_mode": settings.ingest_write_mode
+    }
+
+# Route de suivi des caches en mémoire
+@app.get("/cache/stats", dependencies=[Depends(require_ops_access)])
+async def cache_stats():
+    """
+    Taux de succès et compteurs des caches en mémoire
+    """
+    return {
+        "users": user_cache.stats(),
+        "capteurs": capteur_cache.stats(),
+        "latest": latest_cache.stats(),
+        "latest_absents": latest_misses.stats()
+    }
+
 # Point d'entrée pour le développement
 if __name__ == "_main_":
     import uvicorn
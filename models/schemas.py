@@ -1,5 +1,7 @@
-from typing import Optional
-from pydantic import BaseModel, Field, EmailStr
+from datetime import datetime
+from typing import Dict, List, Optional
+from pydantic import BaseModel, Field, EmailStr, field_validator, model_validator
+from utils.timestamps import parse_timestamp
 
 # ✅ Modèle pour créer un utilisateur (inscription)
 class UserCreate(BaseModel):
@@ -26,20 +28,125 @@ class Objet(BaseModel):
     capteurId: str
     utilisateur: Optional[str] = None
 
+# ✅ Modèle de création d'un jeton d'appareil
+class DeviceTokenCreate(BaseModel):
+    nom: Optional[str] = Field(None, max_length=100)
+
 # ✅ Modèle de données de capteur
 class Donnee(BaseModel):
     capteurId: str
     valeur: float
     timestamp: str
 
-# ✅ Modèle de seuil d'alerte
+    @field_validator("timestamp")
+    @classmethod
+    def timestamp_iso8601(cls, value: str) -> str:
+        # Le timestamp doit être convertible en date (champ ts utilisé pour les requêtes)
+        parse_timestamp(value)
+        return value
+
+# ✅ Modèle de requête des dernières valeurs de plusieurs capteurs
+class LatestRequest(BaseModel):
+    capteurs: List[str] = Field(..., min_length=1, max_length=1000)
+
+# ✅ Modèle de seuil d'alerte (règles évaluées par services/alerts.py)
 class Seuil(BaseModel):
     capteurId: str
-    seuil_max: float
+    seuil_max: Optional[float] = None
+    seuil_min: Optional[float] = None
+    variation_max: Optional[float] = Field(None, gt=0, description="Variation maximale par seconde")
+    hysteresis: float = Field(0, ge=0, description="Marge de retour sous le seuil avant réarmement")
+    consecutifs: int = Field(1, ge=1, le=1000, description="Dépassements consécutifs avant alerte")
+    cooldown_seconds: int = Field(300, ge=0, description="Délai minimal entre deux alertes d'une même règle")
+
+    @model_validator(mode="after")
+    def regles_coherentes(self):
+        if self.seuil_max is None and self.seuil_min is None and self.variation_max is None:
+            raise ValueError("Au moins une règle est requise (seuil_max, seuil_min ou variation_max)")
+        if self.seuil_max is not None and self.seuil_min is not None and self.seuil_min >= self.seuil_max:
+            raise ValueError("seuil_min doit être inférieur à seuil_max")
+        return self
+
+# ✅ Politique de rétention (services/retention.py)
+class RetentionPolicy(BaseModel):
+    capteurId: Optional[str] = Field(None, description="Absent : politique par défaut du propriétaire")
+    jours: int = Field(..., ge=1, le=36500, description="Durée de conservation en base avant archivage")
 
 # ✅ Modèle d'alerte
 class Alerte(BaseModel):
     capteurId: str
     valeur: float
     message: str
-    timestamp: str
\ No newline at end of file
+    timestamp: str
+    regle: Optional[str] = None
+
+# ✅ Modèles de réponse (documentation OpenAPI ; champs absents si exclus par fields)
+class DonneeOut(BaseModel):
+    id: str
+    capteurId: Optional[str] = None
+    valeur: Optional[float] = None
+    timestamp: Optional[str] = None
+    ts: Optional[datetime] = None
+    owner_id: Optional[str] = None
+
+class DonneesPage(BaseModel):
+    capteur_id: str
+    total_donnees: int
+    donnees: List[DonneeOut]
+    next_cursor: Optional[str] = None
+
+class AlerteOut(BaseModel):
+    id: str
+    capteurId: Optional[str] = None
+    valeur: Optional[float] = None
+    message: Optional[str] = None
+    regle: Optional[str] = None
+    timestamp: Optional[str] = None
+    ts: Optional[datetime] = None
+    owner_id: Optional[str] = None
+
+class AlertesPage(BaseModel):
+    total_alertes: int
+    alertes: List[AlerteOut]
+    next_cursor: Optional[str] = None
+
+class DonneeCreee(BaseModel):
+    message: str
+    data_id: str
+
+class LatestOut(BaseModel):
+    id: str
+    capteurId: str
+    valeur: float
+    timestamp: str
+    ts: datetime
+    owner_id: str
+
+class LatestBulk(BaseModel):
+    total_capteurs: int
+    latest: Dict[str, Optional[LatestOut]]
+    non_autorises: List[str]
+
+class PointAgrege(BaseModel):
+    debut: datetime
+    count: int
+    min: Optional[float] = None
+    max: Optional[float] = None
+    avg: Optional[float] = None
+    last: Optional[float] = None
+
+class AggregateResponse(BaseModel):
+    capteur_id: str
+    bucket: str
+    from_: datetime = Field(..., alias="from")
+    to: datetime
+    total_points: int
+    points: List[PointAgrege]
+
+class RollupResponse(BaseModel):
+    capteur_id: str
+    granularite: str
+    from_: datetime = Field(..., alias="from")
+    to: datetime
+    total_points: int
+    points: List[PointAgrege]
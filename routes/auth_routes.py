@@ -1,7 +1,15 @@
 from fastapi import APIRouter, HTTPException, status
+from pymongo.errors import DuplicateKeyError
 from database.mongo import db
 from models.schemas import UserCreate, UserLogin
-from utils.security import hash_password, verify_password, create_access_token
+from utils.metrics import AUTH_FAILURES
+from utils.security import (
+    create_access_token,
+    hash_password_async,
+    invalidate_user,
+    password_hasher,
+    verify_and_update_password,
+)
 
 router = APIRouter()
 
@@ -10,21 +18,19 @@ async def register(user: UserCreate):
     """
     Inscription d'un nouvel utilisateur
     """
-    # Vérifier si l'email existe déjà
-    existing_user = await db["users"].find_one({"email": user.email})
-    if existing_user:
+    # Créer l'utilisateur avec mot de passe hashé
+    user_dict = user.model_dump()
+    user_dict["password"] = await hash_password_async(user.password)
+    
+    # Insérer dans MongoDB (l'index unique sur email rejette les doublons)
+    try:
+        result = await db["users"].insert_one(user_dict)
+    except DuplicateKeyError:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email déjà utilisé"
         )
     
-    # Créer l'utilisateur avec mot de passe hashé
-    user_dict = user.model_dump()
-    user_dict["password"] = hash_password(user.password)
-    
-    # Insérer dans MongoDB
-    result = await db["users"].insert_one(user_dict)
-    
     return {
         "message": "Utilisateur créé avec succès",
         "user_id": str(result.inserted_id),
@@ -39,12 +45,28 @@ async def login(user_credentials: UserLogin):
     # Chercher l'utilisateur par email
     user = await db["users"].find_one({"email": user_credentials.email})
     
-    # Vérifier email et mot de passe
-    if not user or not verify_password(user_credentials.password, user["password"]):
+    # Vérifier email et mot de passe (bcrypt hors de la boucle d'événements)
+    valide, nouveau_hash = (False, None)
+    if user:
+        valide, nouveau_hash = await verify_and_update_password(user_credentials.password, user["password"])
+    if not valide:
+        AUTH_FAILURES.labels("login").inc()
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Email ou mot de passe incorrect"
         )
+
+    # Paramètres bcrypt modifiés : remplacer le hash, le mot de passe clair est disponible
+    if nouveau_hash:
+        await db["users"].update_one(
+            {"_id": user["_id"], "password": user["password"]},
+            {"$set": {"password": nouveau_hash}}
+        )
+        password_hasher.rehashed += 1
+
+    # Document relu à l'instant : les requêtes suivantes rechargent l'utilisateur en cache
+    # (modification directe en base prise en compte sans attendre USER_CACHE_TTL_SECONDS)
+    invalidate_user(str(user["_id"]))
     
     # Créer le token JWT avec l'ID utilisateur
     access_token = create_access_token(data={"sub": str(user["_id"])})
@@ -1,68 +1,163 @@
-from fastapi import APIRouter, HTTPException, Depends, status
-from typing import List
+from fastapi import APIRouter, HTTPException, Depends, Query, status
+from fastapi.responses import StreamingResponse
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
+from pymongo.errors import DuplicateKeyError
 from database.mongo import db
-from models.schemas import Donnee, Seuil, Alerte
+from database import storage
+from models.schemas import (
+    AggregateResponse, AlertesPage, Donnee, DonneeCreee, DonneesPage, LatestBulk, LatestOut,
+    LatestRequest, RetentionPolicy, RollupResponse, Seuil
+)
 from utils.security import get_current_user
+from utils.device_tokens import get_current_device
+from utils.metrics import READINGS
+from utils.rate_limit import rate_limiter
+from utils.capteur_cache import SEUIL_FIELDS, check_capteur_owner, get_capteurs, invalidate_capteur
+from utils.export import EXPORT_BATCH_SIZE, EXPORT_FIELDS, MEDIA_TYPES, stream_export
+from utils.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, build_projection, fetch_page, json_projection, parse_query_timestamp,
+    time_range_filter
+)
+from utils.timestamps import parse_bucket, parse_timestamp
+from services.ingestion import MAX_BATCH_SIZE, STATUT_DOUBLON, STATUT_REJETEE, ingest_donnees, on_donnees_committed
+from services.write_behind import DURABILITY_IMMEDIATE, write_behind
+from services.rollups import read_rollups
+from services.latest import get_latest, get_latest_many
+from services.retention import delete_policy, retention_policies, set_policy, stream_archive
 
 router = APIRouter()
 
-@router.post("/")
-async def save_data(payload: Donnee, current_user: dict = Depends(get_current_user)):
-    """
-    Enregistrer une nouvelle donnée de capteur
-    Vérifie automatiquement les seuils et crée des alertes
-    """
-    # Vérifier si la donnée existe déjà
-    existing = await db["donnees"].find_one({
-        "capteurId": payload.capteurId,
-        "timestamp": payload.timestamp
-    })
-    if existing:
+# Champs projetables via le paramètre fields
+DONNEE_FIELDS = ("capteurId", "valeur", "timestamp", "ts", "owner_id")
+ALERTE_FIELDS = ("capteurId", "valeur", "message", "regle", "timestamp", "ts", "owner_id")
+
+# Nombre maximal d'intervalles retournés par /aggregate
+MAX_BUCKETS = 5000
+
+async def _save_donnee(payload: Donnee, owner_id: str) -> dict:
+    """Enregistrer une donnée dont la propriété a été vérifiée par l'appelant"""
+    # Préparer les données
+    data_dict = payload.model_dump()
+    data_dict["ts"] = parse_timestamp(payload.timestamp)
+    data_dict["owner_id"] = owner_id
+    retention_policies.stamp([data_dict])
+    
+    # Écriture différée (WRITE_BEHIND_ENABLED=1) : la donnée rejoint le prochain groupe
+    if write_behind.running:
+        statut = await write_behind.submit(data_dict)
+        if statut == STATUT_DOUBLON:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Donnée déjà enregistrée pour ce timestamp"
+            )
+        if statut == STATUT_REJETEE:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Donnée rejetée par MongoDB"
+            )
+        return {
+            "message": "Donnée acceptée, écriture différée" if write_behind.durability == DURABILITY_IMMEDIATE
+            else "Donnée enregistrée avec succès",
+            "data_id": str(data_dict["_id"])
+        }
+    
+    # Enregistrer la donnée (l'index unique capteurId + timestamp rejette les doublons ;
+    # absent en disposition timeseries, où un doublon est enregistré sans erreur)
+    try:
+        result = await db.ingest_collection().insert_one(storage.to_storage([data_dict])[0])
+    except DuplicateKeyError:
+        READINGS.labels(STATUT_DOUBLON).inc()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Donnée déjà enregistrée pour ce timestamp"
         )
     
-    # Vérifier que l'utilisateur possède ce capteur
-    capteur_exists = await db["objets"].find_one({
-        "capteurId": payload.capteurId,
-        "utilisateur": current_user["id"]
-    })
-    if not capteur_exists:
+    # Rollups, évaluation des alertes et autres traitements après écriture
+    await on_donnees_committed([data_dict])
+
+    return {
+        "message": "Donnée enregistrée avec succès",
+        "data_id": str(result.inserted_id)
+    }
+
+def _check_device_capteur(capteur_ids, device: dict):
+    """Un jeton d'appareil n'autorise que son propre capteurId"""
+    if any(capteur_id != device["capteurId"] for capteur_id in capteur_ids):
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
-            detail="Capteur non trouvé ou non autorisé"
+            detail="Jeton d'appareil non valable pour ce capteur"
         )
-    
-    # Préparer les données
-    data_dict = payload.model_dump()
-    data_dict["owner_id"] = current_user["id"]
-    
-    # Enregistrer la donnée
-    result = await db["donnees"].insert_one(data_dict)
-    
-    # Vérifier seuil et créer alerte si nécessaire
-    seuil_doc = await db["seuils"].find_one({
-        "capteurId": payload.capteurId,
-        "owner_id": current_user["id"]
-    })
-    
-    alerte_creee = False
-    if seuil_doc and payload.valeur > seuil_doc.get("seuil_max", float('inf')):
-        alerte = {
-            "capteurId": payload.capteurId,
-            "valeur": payload.valeur,
-            "message": f"⚠ Valeur {payload.valeur} dépasse le seuil ({seuil_doc['seuil_max']})",
-            "timestamp": payload.timestamp,
-            "owner_id": current_user["id"]
-        }
-        await db["alertes"].insert_one(alerte)
-        alerte_creee = True
-    
+
+@router.post("/", response_model=DonneeCreee)
+async def save_data(payload: Donnee, current_user: dict = Depends(get_current_user)):
+    """
+    Enregistrer une nouvelle donnée de capteur
+    Les seuils sont vérifiés en arrière-plan par le moteur d'alertes
+    """
+    # Vérifier que l'utilisateur possède ce capteur (cache propriétaire)
+    await check_capteur_owner(payload.capteurId, current_user["id"])
+    await rate_limiter.check(current_user["id"], [payload.capteurId])
+    return await _save_donnee(payload, current_user["id"])
+
+@router.post("/device", response_model=DonneeCreee)
+async def save_data_device(payload: Donnee, device: dict = Depends(get_current_device)):
+    """
+    Enregistrer une donnée avec un jeton d'appareil
+    Propriétaire et capteur sont lus dans le jeton : ni users ni objets ne sont consultés
+    """
+    _check_device_capteur([payload.capteurId], device)
+    await rate_limiter.check(device["owner_id"], [payload.capteurId])
+    return await _save_donnee(payload, device["owner_id"])
+
+@router.post("/device/batch")
+async def save_data_device_batch(payload: List[Donnee], device: dict = Depends(get_current_device)):
+    """
+    Enregistrer un lot de données d'un même capteur avec un jeton d'appareil
+    """
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le lot de données est vide"
+        )
+    if len(payload) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Le lot dépasse la taille maximale ({MAX_BATCH_SIZE})"
+        )
+    _check_device_capteur({d.capteurId for d in payload}, device)
+    await rate_limiter.check(device["owner_id"], {d.capteurId for d in payload})
+
+    rapport = await ingest_donnees(payload, device["owner_id"], verified=True)
+
     return {
-        "message": "Donnée enregistrée avec succès",
-        "data_id": str(result.inserted_id),
-        "alerte_creee": alerte_creee
+        "message": "Lot traité",
+        **rapport
+    }
+
+@router.post("/batch")
+async def save_data_batch(payload: List[Donnee], current_user: dict = Depends(get_current_user)):
+    """
+    Enregistrer un lot de données de capteurs en un seul aller-retour
+    Retourne le statut de chaque donnée (acceptée, doublon ou rejetée)
+    """
+    if not payload:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Le lot de données est vide"
+        )
+    if len(payload) > MAX_BATCH_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Le lot dépasse la taille maximale ({MAX_BATCH_SIZE})"
+        )
+    await rate_limiter.check(current_user["id"], {d.capteurId for d in payload})
+
+    rapport = await ingest_donnees(payload, current_user["id"])
+
+    return {
+        "message": "Lot traité",
+        **rapport
     }
 
 @router.post("/seuil")
@@ -71,15 +166,7 @@ async def set_seuil(payload: Seuil, current_user: dict = Depends(get_current_use
     Définir ou mettre à jour un seuil pour un capteur
     """
     # Vérifier que l'utilisateur possède ce capteur
-    capteur_exists = await db["objets"].find_one({
-        "capteurId": payload.capteurId,
-        "utilisateur": current_user["id"]
-    })
-    if not capteur_exists:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Capteur non trouvé ou non autorisé"
-        )
+    await check_capteur_owner(payload.capteurId, current_user["id"])
     
     # Mettre à jour ou créer le seuil
     seuil_dict = payload.model_dump()
@@ -90,63 +177,238 @@ async def set_seuil(payload: Seuil, current_user: dict = Depends(get_current_use
         {"$set": seuil_dict},
         upsert=True
     )
+    invalidate_capteur(payload.capteurId)
     
     return {"message": "Seuil mis à jour avec succès"}
 
-@router.get("/{capteur_id}")
-async def get_data(capteur_id: str, current_user: dict = Depends(get_current_user)):
+@router.put("/retention")
+async def set_retention(payload: RetentionPolicy, current_user: dict = Depends(get_current_user)):
     """
-    Récupérer toutes les données d'un capteur
+    Définir la durée de conservation des données et alertes (d'un capteur, ou par défaut)
+    S'applique aux écritures suivantes ; python -m services.retention apply
+    recalcule l'expiration de l'historique existant
     """
-    # Vérifier que l'utilisateur possède ce capteur
-    capteur_exists = await db["objets"].find_one({
-        "capteurId": capteur_id,
-        "utilisateur": current_user["id"]
-    })
-    if not capteur_exists:
+    if payload.capteurId is not None:
+        await check_capteur_owner(payload.capteurId, current_user["id"])
+    await set_policy(current_user["id"], payload.capteurId, payload.jours)
+    
+    return {"message": "Politique de rétention mise à jour avec succès"}
+
+@router.get("/retention/all")
+async def get_all_retention(current_user: dict = Depends(get_current_user)):
+    """
+    Récupérer les politiques de rétention de l'utilisateur
+    """
+    politiques = await db["retention"].find(
+        {"owner_id": current_user["id"]},
+        {"_id": 0, "capteurId": 1, "jours": 1}
+    ).to_list(length=None)
+    
+    return {
+        "total_politiques": len(politiques),
+        "politiques": politiques
+    }
+
+@router.delete("/retention")
+async def delete_retention(
+    capteur_id: Optional[str] = Query(None, alias="capteurId", description="Absent : politique par défaut"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Supprimer une politique de rétention (conservation illimitée des écritures suivantes)
+    """
+    if await delete_policy(current_user["id"], capteur_id) == 0:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Capteur non trouvé ou non autorisé"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Politique de rétention non trouvée"
         )
     
-    # Récupérer les données
-    cursor = db["donnees"].find({
-        "capteurId": capteur_id,
-        "owner_id": current_user["id"]
-    }).sort("timestamp", -1)  # Trier par timestamp décroissant
+    return {"message": "Politique de rétention supprimée avec succès"}
+
+# response_model_exclude_unset : avec fields=, seuls les champs demandés sont retournés
+@router.get("/{capteur_id}", response_model=DonneesPage, response_model_exclude_unset=True)
+async def get_data(
+    capteur_id: str,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Curseur next_cursor de la page précédente"),
+    from_: Optional[str] = Query(None, alias="from", description="Timestamp minimal (inclus)"),
+    to: Optional[str] = Query(None, description="Timestamp maximal (inclus)"),
+    fields: Optional[str] = Query(None, description="Champs à retourner, ex: valeur,timestamp"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les données d'un capteur, page par page (plus récentes d'abord)
+    Utiliser next_cursor comme paramètre after pour obtenir la page suivante
+    """
+    # Vérifier que l'utilisateur possède ce capteur
+    await check_capteur_owner(capteur_id, current_user["id"])
     
-    data = []
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        data.append(doc)
+    # Récupérer une page de données (id converti par MongoDB, voir json_projection)
+    data, next_cursor = await fetch_page(
+        storage.collection(),
+        {
+            **storage.match(capteurId=capteur_id, owner_id=current_user["id"]),
+            **time_range_filter(from_, to)
+        },
+        build_projection(fields, DONNEE_FIELDS, storage.projection),
+        limit,
+        after
+    )
     
+    # Validée par DonneesPage puis sérialisée par orjson (default_response_class)
     return {
         "capteur_id": capteur_id,
         "total_donnees": len(data),
-        "donnees": data
+        "donnees": data,
+        "next_cursor": next_cursor
     }
 
-@router.get("/{capteur_id}/latest")
-async def get_latest_data(capteur_id: str, current_user: dict = Depends(get_current_user)):
+@router.get("/{capteur_id}/export")
+async def export_data(
+    capteur_id: str,
+    format_: Literal["ndjson", "csv"] = Query("ndjson", alias="format"),
+    from_: Optional[str] = Query(None, alias="from", description="Timestamp minimal (inclus)"),
+    to: Optional[str] = Query(None, description="Timestamp maximal (inclus)"),
+    gzip: bool = Query(False, description="Compresser la réponse à la volée"),
+    current_user: dict = Depends(get_current_user)
+):
     """
-    Récupérer la dernière donnée d'un capteur
+    Exporter les données d'un capteur en flux NDJSON ou CSV (ordre chronologique)
+    La réponse est produite au fil du curseur, sans charger l'historique en mémoire
+    """
+    # Vérifier que l'utilisateur possède ce capteur
+    await check_capteur_owner(capteur_id, current_user["id"])
+    
+    cursor = storage.collection().find(
+        {**storage.match(capteurId=capteur_id, owner_id=current_user["id"]), **time_range_filter(from_, to)},
+        storage.projection(EXPORT_FIELDS, with_id=False)
+    ).sort("ts", 1).batch_size(EXPORT_BATCH_SIZE)
+    
+    headers = {"Content-Disposition": f'attachment; filename="{capteur_id}.{format_}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        stream_export(cursor, format_, compress=gzip),
+        media_type=MEDIA_TYPES[format_],
+        headers=headers
+    )
+
+@router.get("/{capteur_id}/archive")
+async def get_archive(
+    capteur_id: str,
+    collection: Literal["donnees", "alertes"] = Query("donnees"),
+    from_: Optional[str] = Query(None, alias="from", description="Timestamp minimal (inclus)"),
+    to: Optional[str] = Query(None, description="Timestamp maximal (inclus)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Relire les données (ou alertes) archivées d'un capteur, en flux NDJSON chronologique
+    Les fichiers d'archive sont lus à la demande, un jour à la fois
     """
     # Vérifier que l'utilisateur possède ce capteur
-    capteur_exists = await db["objets"].find_one({
-        "capteurId": capteur_id,
-        "utilisateur": current_user["id"]
-    })
-    if not capteur_exists:
+    await check_capteur_owner(capteur_id, current_user["id"])
+    
+    debut = parse_query_timestamp(from_, "from") if from_ else None
+    fin = parse_query_timestamp(to, "to") if to else None
+    return StreamingResponse(
+        stream_archive(collection, current_user["id"], capteur_id, debut, fin),
+        media_type=MEDIA_TYPES["ndjson"]
+    )
+
+@router.get("/{capteur_id}/aggregate", response_model=AggregateResponse)
+async def aggregate_data(
+    capteur_id: str,
+    bucket: str = Query("1h", description="Intervalle : 30s, 1m, 15m, 1h, 1d..."),
+    from_: Optional[str] = Query(None, alias="from", description="Début (inclus), défaut : 24h avant to"),
+    to: Optional[str] = Query(None, description="Fin (incluse), défaut : maintenant"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Agréger les données d'un capteur par intervalle de temps (count/min/max/avg/last)
+    Le calcul est fait par MongoDB ($dateTrunc + $group) : seuls les points agrégés transitent
+    """
+    # Vérifier que l'utilisateur possède ce capteur
+    await check_capteur_owner(capteur_id, current_user["id"])
+    
+    try:
+        unit, bin_size, duration = parse_bucket(bucket)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    fin = parse_query_timestamp(to, "to") if to else datetime.now(timezone.utc)
+    debut = parse_query_timestamp(from_, "from") if from_ else fin - timedelta(days=1)
+    if (fin - debut) / duration > MAX_BUCKETS:
         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Capteur non trouvé ou non autorisé"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Trop d'intervalles demandés (maximum {MAX_BUCKETS}), augmentez bucket"
         )
     
-    # Récupérer la dernière donnée
-    latest = await db["donnees"].find_one(
-        {"capteurId": capteur_id, "owner_id": current_user["id"]},
-        sort=[("timestamp", -1)]
-    )
+    pipeline = [
+        {"$match": {
+            **storage.match(capteurId=capteur_id, owner_id=current_user["id"]),
+            "ts": {"$gte": debut, "$lte": fin}
+        }},
+        {"$sort": {"ts": 1}},
+        {"$group": {
+            "_id": {"$dateTrunc": {"date": "$ts", "unit": unit, "binSize": bin_size}},
+            "count": {"$sum": 1},
+            "min": {"$min": "$valeur"},
+            "max": {"$max": "$valeur"},
+            "avg": {"$avg": "$valeur"},
+            "last": {"$last": "$valeur"}
+        }},
+        {"$sort": {"_id": 1}},
+        {"$project": {"_id": 0, "debut": "$_id", "count": 1, "min": 1, "max": 1, "avg": 1, "last": 1}}
+    ]
+    points = await storage.collection().aggregate(pipeline).to_list(length=None)
+    
+    return {
+        "capteur_id": capteur_id,
+        "bucket": bucket,
+        "from": debut,
+        "to": fin,
+        "total_points": len(points),
+        "points": points
+    }
+
+@router.get("/{capteur_id}/rollups", response_model=RollupResponse)
+async def get_rollups(
+    capteur_id: str,
+    granularite: Literal["1m", "1h", "1d"] = Query("1h"),
+    from_: Optional[str] = Query(None, alias="from", description="Début (inclus), défaut : 30 jours avant to"),
+    to: Optional[str] = Query(None, description="Fin (incluse), défaut : maintenant"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Lire les agrégats précalculés d'un capteur (count/min/max/avg par intervalle)
+    Adapté aux longues périodes : un document par intervalle au lieu des données brutes
+    """
+    # Vérifier que l'utilisateur possède ce capteur
+    await check_capteur_owner(capteur_id, current_user["id"])
+    
+    fin = parse_query_timestamp(to, "to") if to else datetime.now(timezone.utc)
+    debut = parse_query_timestamp(from_, "from") if from_ else fin - timedelta(days=30)
+    points = await read_rollups(capteur_id, current_user["id"], granularite, debut, fin)
+    
+    return {
+        "capteur_id": capteur_id,
+        "granularite": granularite,
+        "from": debut,
+        "to": fin,
+        "total_points": len(points),
+        "points": points
+    }
+
+@router.get("/{capteur_id}/latest", response_model=LatestOut)
+async def get_latest_data(capteur_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Récupérer la dernière donnée d'un capteur
+    """
+    # Vérifier que l'utilisateur possède ce capteur
+    await check_capteur_owner(capteur_id, current_user["id"])
+    
+    # Récupérer la dernière donnée (mémoire, puis collection latest)
+    latest = await get_latest(capteur_id, current_user["id"])
     
     if not latest:
         raise HTTPException(
@@ -154,24 +416,52 @@ async def get_latest_data(capteur_id: str, current_user: dict = Depends(get_curr
             detail="Aucune donnée trouvée pour ce capteur"
         )
     
-    latest["id"] = str(latest.pop("_id"))
     return latest
 
-@router.get("/alertes/all")
-async def get_alertes(current_user: dict = Depends(get_current_user)):
+@router.post("/latest", response_model=LatestBulk)
+async def get_latest_bulk(payload: LatestRequest, current_user: dict = Depends(get_current_user)):
     """
-    Récupérer toutes les alertes de l'utilisateur
+    Récupérer la dernière donnée de plusieurs capteurs en une requête
+    Les capteurs inconnus ou non autorisés sont listés dans non_autorises
     """
-    cursor = db["alertes"].find({"owner_id": current_user["id"]}).sort("timestamp", -1)
+    capteurs = await get_capteurs(payload.capteurs)
+    autorises = [
+        capteur_id for capteur_id in payload.capteurs
+        if capteur_id in capteurs and capteurs[capteur_id]["owner_id"] == current_user["id"]
+    ]
+    latest = await get_latest_many(autorises, current_user["id"]) if autorises else {}
     
-    alertes = []
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        alertes.append(doc)
+    return {
+        # Capteurs autorisés sans aucune donnée : présents avec None, non comptés
+        "total_capteurs": sum(1 for entry in latest.values() if entry is not None),
+        "latest": latest,
+        "non_autorises": [c for c in dict.fromkeys(payload.capteurs) if c not in latest]
+    }
+
+@router.get("/alertes/all", response_model=AlertesPage, response_model_exclude_unset=True)
+async def get_alertes(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = Query(None, description="Curseur next_cursor de la page précédente"),
+    from_: Optional[str] = Query(None, alias="from", description="Timestamp minimal (inclus)"),
+    to: Optional[str] = Query(None, description="Timestamp maximal (inclus)"),
+    fields: Optional[str] = Query(None, description="Champs à retourner, ex: capteurId,message"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Récupérer les alertes de l'utilisateur, page par page (plus récentes d'abord)
+    """
+    alertes, next_cursor = await fetch_page(
+        db["alertes"],
+        {"owner_id": current_user["id"], **time_range_filter(from_, to)},
+        build_projection(fields, ALERTE_FIELDS),
+        limit,
+        after
+    )
     
     return {
         "total_alertes": len(alertes),
-        "alertes": alertes
+        "alertes": alertes,
+        "next_cursor": next_cursor
     }
 
 @router.get("/seuils/all")
@@ -179,12 +469,10 @@ async def get_all_seuils(current_user: dict = Depends(get_current_user)):
     """
     Récupérer tous les seuils configurés par l'utilisateur
     """
-    cursor = db["seuils"].find({"owner_id": current_user["id"]})
-    
-    seuils = []
-    async for doc in cursor:
-        doc["id"] = str(doc.pop("_id"))
-        seuils.append(doc)
+    seuils = await db["seuils"].find(
+        {"owner_id": current_user["id"]},
+        json_projection(("capteurId", "owner_id", *SEUIL_FIELDS))
+    ).to_list(length=None)
     
     return {
         "total_seuils": len(seuils),
@@ -1,7 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from models.schemas import Objet
+from pymongo.errors import DuplicateKeyError
+from models.schemas import DeviceTokenCreate, Objet
 from utils.security import get_current_user
 from database.mongo import db
+from services.alerts import alert_engine
+from utils.capteur_cache import check_capteur_owner, invalidate_capteur
+from utils.device_tokens import create_device_token, revoke_device_tokens
+from utils.pagination import json_projection
 
 router = APIRouter()
 
@@ -10,20 +15,20 @@ async def create_objet(objet: Objet, current_user: dict = Depends(get_current_us
     """
     Ajouter un nouvel objet IoT pour l'utilisateur connecté
     """
-    # Vérifier si le capteur existe déjà
-    existing = await db["objets"].find_one({"capteurId": objet.capteurId})
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Capteur déjà enregistré"
-        )
-    
     # Préparer les données de l'objet
     objet_dict = objet.model_dump()
     objet_dict["utilisateur"] = current_user["id"]  # Assigner à l'utilisateur connecté
     
-    # Insérer dans MongoDB
-    result = await db["objets"].insert_one(objet_dict)
+    # Insérer dans MongoDB (l'index unique sur capteurId rejette les doublons)
+    try:
+        result = await db["objets"].insert_one(objet_dict)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Capteur déjà enregistré"
+        )
+    # Retirer une éventuelle entrée négative du cache des capteurs
+    invalidate_capteur(objet.capteurId)
     
     return {
         "message": "Objet ajouté avec succès",
@@ -35,13 +40,11 @@ async def get_objets(current_user: dict = Depends(get_current_user)):
     """
     Récupérer tous les objets de l'utilisateur connecté
     """
-    # Récupérer les objets de l'utilisateur
-    cursor = db["objets"].find({"utilisateur": current_user["id"]})
-    objets = []
-    
-    async for obj in cursor:
-        obj["id"] = str(obj.pop("_id"))  # Convertir _id en id
-        objets.append(obj)
+    # Récupérer les objets de l'utilisateur (_id converti en id par MongoDB)
+    objets = await db["objets"].find(
+        {"utilisateur": current_user["id"]},
+        json_projection(("nom", "type", "emplacement", "capteurId", "utilisateur"))
+    ).to_list(length=None)
     
     return {
         "message": f"Trouvé {len(objets)} objets",
@@ -83,24 +86,81 @@ async def delete_objet(objet_id: str, current_user: dict = Depends(get_current_u
     Supprimer un objet de l'utilisateur connecté
     """
     from bson import ObjectId
+    from bson.errors import InvalidId
     
     try:
-        # Supprimer l'objet
-        result = await db["objets"].delete_one({
-            "_id": ObjectId(objet_id),
-            "utilisateur": current_user["id"]
-        })
-        
-        if result.deleted_count == 0:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Objet non trouvé ou non autorisé"
-            )
-        
-        return {"message": "Objet supprimé avec succès"}
-        
-    except Exception as e:
+        query = {"_id": ObjectId(objet_id), "utilisateur": current_user["id"]}
+    except InvalidId:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="ID d'objet invalide"
-        )
\ No newline at end of file
+        )
+    
+    objet = await db["objets"].find_one(query, {"capteurId": 1})
+    if objet is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Objet non trouvé ou non autorisé"
+        )
+    
+    # Les jetons d'appareil du capteur ne doivent plus être acceptés : révoqués avant
+    # la suppression, un échec laisse l'objet en place et la suppression peut être relancée
+    await revoke_device_tokens({"capteurId": objet["capteurId"], "owner_id": current_user["id"]})
+    
+    result = await db["objets"].delete_one(query)
+    if result.deleted_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Objet non trouvé ou non autorisé"
+        )
+    invalidate_capteur(objet["capteurId"])
+    alert_engine.forget(objet["capteurId"])
+    
+    return {"message": "Objet supprimé avec succès"}
+
+@router.post("/capteurs/{capteur_id}/tokens")
+async def create_capteur_token(
+    capteur_id: str,
+    payload: DeviceTokenCreate,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Créer un jeton d'appareil limité à ce capteur (affiché une seule fois)
+    """
+    await check_capteur_owner(capteur_id, current_user["id"])
+    jeton = await create_device_token(capteur_id, current_user["id"], payload.nom)
+    return {
+        "message": "Jeton d'appareil créé, conservez-le : il ne sera plus affiché",
+        **jeton
+    }
+
+@router.get("/capteurs/{capteur_id}/tokens")
+async def get_capteur_tokens(capteur_id: str, current_user: dict = Depends(get_current_user)):
+    """
+    Lister les jetons d'appareil d'un capteur (sans leur valeur)
+    """
+    await check_capteur_owner(capteur_id, current_user["id"])
+    cursor = db["device_tokens"].find({"capteurId": capteur_id, "owner_id": current_user["id"]})
+    jetons = []
+    async for doc in cursor:
+        jetons.append({
+            "jti": doc["_id"],
+            "nom": doc.get("nom"),
+            "created_at": doc["created_at"].isoformat(),
+            "expires_at": doc["expires_at"].isoformat(),
+            "revoque": doc.get("revoked_at") is not None
+        })
+    return {"total_jetons": len(jetons), "jetons": jetons}
+
+@router.delete("/capteurs/{capteur_id}/tokens/{jti}")
+async def revoke_capteur_token(capteur_id: str, jti: str, current_user: dict = Depends(get_current_user)):
+    """
+    Révoquer un jeton d'appareil
+    """
+    revoques = await revoke_device_tokens({"_id": jti, "capteurId": capteur_id, "owner_id": current_user["id"]})
+    if not revoques:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Jeton non trouvé ou déjà révoqué"
+        )
+    return {"message": "Jeton révoqué avec succès"}
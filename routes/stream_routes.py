@@ -0,0 +1,109 @@
+import asyncio
+import json
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from services.pubsub import EVENT_TYPES, FERMETURE_ARRET, FERMETURE_LENT, SubscriptionClosed, hub
+from utils.security import get_current_user, get_user_from_token, require_ops_access
+
+router = APIRouter()
+
+# ⚙ Intervalle des commentaires keep-alive SSE (évite la coupure par les proxys)
+SSE_KEEPALIVE_SECONDS = 15
+
+# Code de fermeture WebSocket selon la raison : réessayer plus tard ou serveur en arrêt
+WS_CLOSE_CODES = {
+    FERMETURE_LENT: status.WS_1013_TRY_AGAIN_LATER,
+    FERMETURE_ARRET: status.WS_1001_GOING_AWAY,
+}
+
+def _parse_filters(capteurs: Optional[str], types: Optional[str]):
+    """Convertir capteurs=a,b et types=donnee,alerte en filtres d'abonnement"""
+    capteur_ids = [c.strip() for c in capteurs.split(",") if c.strip()] if capteurs else None
+    event_types = [t.strip() for t in types.split(",") if t.strip()] if types else list(EVENT_TYPES)
+    inconnus = set(event_types) - set(EVENT_TYPES)
+    if inconnus:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Types d'événements inconnus: {', '.join(sorted(inconnus))}"
+        )
+    return capteur_ids, event_types
+
+@router.get("/sse")
+async def stream_sse(
+    capteurs: Optional[str] = Query(None, description="capteurId séparés par des virgules (tous par défaut)"),
+    types: Optional[str] = Query(None, description="donnee, alerte (les deux par défaut)"),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Recevoir en temps réel les nouvelles données et alertes (Server-Sent Events)
+    """
+    capteur_ids, event_types = _parse_filters(capteurs, types)
+
+    async def events():
+        async with hub.subscription(current_user["id"], capteur_ids, event_types) as sub:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(sub.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                except SubscriptionClosed as e:
+                    yield f"event: fermeture\ndata: {json.dumps({'raison': e.raison}, ensure_ascii=False)}\n\n"
+                    return
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/ws")
+async def stream_websocket(
+    websocket: WebSocket,
+    token: str = Query(..., description="Token JWT (les navigateurs ne peuvent pas envoyer d'en-tête)"),
+    capteurs: Optional[str] = Query(None),
+    types: Optional[str] = Query(None)
+):
+    """
+    Recevoir en temps réel les nouvelles données et alertes (WebSocket)
+    """
+    try:
+        user = await get_user_from_token(token)
+        capteur_ids, event_types = _parse_filters(capteurs, types)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    async with hub.subscription(user["id"], capteur_ids, event_types) as sub:
+
+        async def watch_disconnect():
+            # Les messages du client sont ignorés ; la déconnexion ferme l'abonnement
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                sub.close()
+
+        watcher = asyncio.create_task(watch_disconnect())
+        try:
+            while True:
+                await websocket.send_json(await sub.get())
+        except SubscriptionClosed as e:
+            if not watcher.done():
+                # Consommateur trop lent ou arrêt du serveur : fermeture côté serveur
+                await websocket.close(code=WS_CLOSE_CODES.get(e.raison, status.WS_1000_NORMAL_CLOSURE), reason=e.raison)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            watcher.cancel()
+
+@router.get("/stats", dependencies=[Depends(require_ops_access)])
+async def stream_stats():
+    """
+    Statistiques de diffusion : abonnés, événements publiés, distribués et abandonnés
+    """
+    return hub.stats()
@@ -0,0 +1,298 @@
+"""
+Moteur d'évaluation des alertes, hors du chemin de requête
+Les données enregistrées sont déposées dans une file ; une tâche de fond les
+évalue par lots contre les règles du capteur (seuils) puis écrit les alertes
+en un insert_many. Règles : seuil_max, seuil_min, variation_max (par seconde),
+avec hystérésis, N dépassements consécutifs et délai minimal entre alertes
+L'état des règles (alerte active, compteurs, dernière alerte) est en mémoire :
+avec plusieurs workers, la déduplication est faite par worker. Il est borné (les
+capteurs les moins récemment évalués sont oubliés et repartent d'un état vide) et
+retiré à la suppression de l'objet
+"""
+import asyncio
+import logging
+from collections import OrderedDict, defaultdict
+from datetime import timezone
+from typing import Dict, List, Optional
+from database.mongo import db
+from utils.capteur_cache import get_capteurs
+from services.pubsub import EVENT_ALERTE, publish_committed
+from services.retention import retention_policies
+from utils.metrics import ALERTS_CREATED
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration du moteur
+ALERT_QUEUE_MAXSIZE = 100000
+EVAL_BATCH_SIZE = 5000
+EVAL_INTERVAL_SECONDS = 0.05
+DEFAULT_COOLDOWN_SECONDS = 300
+ALERT_STATES_MAXSIZE = 100000
+
+# Règles disponibles
+REGLE_MAX = "max"
+REGLE_MIN = "min"
+REGLE_VARIATION = "variation"
+
+def _epoch(ts) -> float:
+    # Les dates relues de MongoDB sont naïves (UTC), celles de l'ingestion sont en UTC
+    return ts.replace(tzinfo=timezone.utc).timestamp() if ts.tzinfo is None else ts.timestamp()
+
+def build_alerte(donnee: dict, regle: str, message: str) -> dict:
+    """Construire le document d'alerte déclenché par une donnée"""
+    return {
+        "capteurId": donnee["capteurId"],
+        "valeur": donnee["valeur"],
+        "message": message,
+        "regle": regle,
+        "timestamp": donnee["timestamp"],
+        "ts": donnee["ts"],
+        "owner_id": donnee["owner_id"]
+    }
+
+class RuleState:
+    """État d'une règle pour un capteur"""
+    __slots__ = ("actif", "consecutifs", "derniere_alerte")
+
+    def __init__(self):
+        self.actif = False
+        self.consecutifs = 0
+        self.derniere_alerte: Optional[float] = None
+
+class CapteurState:
+    """État d'un capteur : une entrée par règle et la dernière donnée vue (variation)"""
+    __slots__ = ("regles", "dernier_ts", "derniere_valeur")
+
+    def __init__(self):
+        self.regles: Dict[str, RuleState] = defaultdict(RuleState)
+        self.dernier_ts: Optional[float] = None
+        self.derniere_valeur: Optional[float] = None
+
+def _conditions(seuil: dict, valeurs: List[float], instants: List[float], state: CapteurState) -> dict:
+    """
+    Calculer, pour tout le lot d'un capteur, les colonnes déclenche/réarme de chaque règle
+    Les colonnes sont calculées d'un bloc ; seul le passage qui suit est séquentiel
+    """
+    hysteresis = seuil.get("hysteresis") or 0
+    conditions = {}
+
+    seuil_max = seuil.get("seuil_max")
+    if seuil_max is not None:
+        conditions[REGLE_MAX] = (
+            [v > seuil_max for v in valeurs],
+            [v <= seuil_max - hysteresis for v in valeurs],
+            lambda i: f"⚠ Valeur {valeurs[i]} dépasse le seuil ({seuil_max})"
+        )
+
+    seuil_min = seuil.get("seuil_min")
+    if seuil_min is not None:
+        conditions[REGLE_MIN] = (
+            [v < seuil_min for v in valeurs],
+            [v >= seuil_min + hysteresis for v in valeurs],
+            lambda i: f"⚠ Valeur {valeurs[i]} sous le seuil ({seuil_min})"
+        )
+
+    variation_max = seuil.get("variation_max")
+    if variation_max is not None:
+        # Variation par rapport à la donnée précédente, y compris celle du lot d'avant
+        precedentes = [state.derniere_valeur] + valeurs[:-1]
+        instants_precedents = [state.dernier_ts] + instants[:-1]
+        taux = [
+            abs(v - pv) / (t - pt) if pv is not None and pt is not None and t > pt else None
+            for v, pv, t, pt in zip(valeurs, precedentes, instants, instants_precedents)
+        ]
+        conditions[REGLE_VARIATION] = (
+            [r is not None and r > variation_max for r in taux],
+            [r is not None and r <= variation_max for r in taux],
+            lambda i: f"⚠ Variation {taux[i]:.3g}/s dépasse le maximum ({variation_max}/s)"
+        )
+    return conditions
+
+class AlertEngine:
+    """
+    File bornée et tâche d'évaluation par lots
+    submit() ne bloque jamais : l'ingestion ne dépend pas du coût des règles
+    """
+
+    def __init__(
+        self,
+        queue_maxsize: int = ALERT_QUEUE_MAXSIZE,
+        batch_size: int = EVAL_BATCH_SIZE,
+        interval: float = EVAL_INTERVAL_SECONDS,
+        states_maxsize: int = ALERT_STATES_MAXSIZE
+    ):
+        self.queue_maxsize = queue_maxsize
+        self.batch_size = batch_size
+        self.interval = interval
+        self.queue: Optional[asyncio.Queue] = None
+        self.pending = 0
+        self.states_maxsize = states_maxsize
+        self.states: "OrderedDict[str, CapteurState]" = OrderedDict()
+        self._task = None
+        self._loop = None
+        self.counters = {
+            "evaluees": 0,
+            "lots": 0,
+            "alertes_creees": 0,
+            "dedupliquees": 0,
+            "cooldown": 0,
+            "abandonnees": 0,
+            "echecs": 0,
+            "etats_oublies": 0
+        }
+        self.lag_ms_last = 0.0
+        self.lag_ms_max = 0.0
+
+    # 🚀 Cycle de vie
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Évaluer les données encore en file avant de s'arrêter"""
+        if self._task is not None:
+            self.queue.put_nowait(None)
+            await self._task
+            self._task = None
+
+    # 📥 Dépôt des données enregistrées
+    def submit(self, docs: List[dict]):
+        """Mettre en file des données enregistrées ; abandon (compté) si la file est pleine"""
+        if self._task is None or self.pending + len(docs) > self.queue_maxsize:
+            self.counters["abandonnees"] += len(docs)
+            return
+        self.pending += len(docs)
+        self.queue.put_nowait((docs, self._loop.time()))
+
+    # 🗑 Capteur supprimé : son état ne sert plus
+    def forget(self, capteur_id: str):
+        self.states.pop(capteur_id, None)
+
+    # 🔁 Évaluation par lots
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            items = [item]
+            taille = len(item[0])
+            stopping = False
+            deadline = self._loop.time() + self.interval
+            while taille < self.batch_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+                taille += len(item[0])
+
+            docs = [doc for lot, _ in items for doc in lot]
+            self.pending -= len(docs)
+            try:
+                await self.evaluate(docs)
+            except Exception:
+                logger.exception("Échec d'évaluation des alertes (%d données)", len(docs))
+                self.counters["echecs"] += len(docs)
+
+            lag_ms = (self._loop.time() - items[0][1]) * 1000
+            self.lag_ms_last = lag_ms
+            self.lag_ms_max = max(self.lag_ms_max, lag_ms)
+            if stopping:
+                return
+
+    async def evaluate(self, docs: List[dict]) -> List[dict]:
+        """Évaluer un lot de données et écrire les alertes déclenchées"""
+        par_capteur: Dict[str, List[dict]] = defaultdict(list)
+        for doc in docs:
+            par_capteur[doc["capteurId"]].append(doc)
+        capteurs = await get_capteurs(par_capteur)
+
+        alertes = []
+        for capteur_id, lot in par_capteur.items():
+            capteur = capteurs.get(capteur_id)
+            if capteur is None or capteur["seuil"] is None:
+                continue
+            lot.sort(key=lambda d: d["ts"])
+            alertes.extend(self._evaluate_capteur(capteur_id, capteur["seuil"], lot))
+
+        self.counters["lots"] += 1
+        self.counters["evaluees"] += len(docs)
+        if alertes:
+            retention_policies.stamp(alertes)
+            await db["alertes"].insert_many(alertes, ordered=False)
+            self.counters["alertes_creees"] += len(alertes)
+            for alerte in alertes:
+                ALERTS_CREATED.labels(alerte["regle"]).inc()
+            publish_committed(EVENT_ALERTE, alertes)
+        return alertes
+
+    def _evaluate_capteur(self, capteur_id: str, seuil: dict, lot: List[dict]) -> List[dict]:
+        state = self.states.get(capteur_id)
+        if state is None:
+            state = self.states[capteur_id] = CapteurState()
+            while len(self.states) > self.states_maxsize:
+                self.states.popitem(last=False)
+                self.counters["etats_oublies"] += 1
+        else:
+            self.states.move_to_end(capteur_id)
+        valeurs = [doc["valeur"] for doc in lot]
+        instants = [_epoch(doc["ts"]) for doc in lot]
+        consecutifs = seuil.get("consecutifs") or 1
+        cooldown = seuil.get("cooldown_seconds")
+        cooldown = DEFAULT_COOLDOWN_SECONDS if cooldown is None else cooldown
+
+        alertes = []
+        for regle, (declenche, rearme, message) in _conditions(seuil, valeurs, instants, state).items():
+            rule = state.regles[regle]
+            for i in range(len(lot)):
+                if rule.actif:
+                    # Alerte en cours : rien de nouveau tant que la valeur n'est pas revenue
+                    if rearme[i]:
+                        rule.actif = False
+                        rule.consecutifs = 0
+                    elif declenche[i]:
+                        self.counters["dedupliquees"] += 1
+                    continue
+                if not declenche[i]:
+                    rule.consecutifs = 0
+                    continue
+                rule.consecutifs += 1
+                if rule.consecutifs < consecutifs:
+                    continue
+                rule.actif = True
+                if rule.derniere_alerte is not None and instants[i] - rule.derniere_alerte < cooldown:
+                    self.counters["cooldown"] += 1
+                    continue
+                rule.derniere_alerte = instants[i]
+                alertes.append(build_alerte(lot[i], regle, message(i)))
+
+        if state.dernier_ts is None or instants[-1] >= state.dernier_ts:
+            state.derniere_valeur = valeurs[-1]
+            state.dernier_ts = instants[-1]
+        return alertes
+
+    # 📊 Statistiques
+    def stats(self) -> dict:
+        return {
+            "actif": self._task is not None,
+            "file": self.pending,
+            "file_max": self.queue_maxsize,
+            "capteurs_suivis": len(self.states),
+            "capteurs_suivis_max": self.states_maxsize,
+            "retard_ms_dernier_lot": round(self.lag_ms_last, 2),
+            "retard_ms_max": round(self.lag_ms_max, 2),
+            **self.counters
+        }
+
+# Instance utilisée par l'application
+alert_engine = AlertEngine()
@@ -0,0 +1,199 @@
+"""
+Sondes de vie et de disponibilité, arrêt progressif
+La disponibilité (readiness) lit le résultat d'un ping MongoDB rafraîchi en tâche
+de fond : les sondes ne génèrent jamais de requête vers la base
+L'arrêt progressif commence à la réception du signal, avant qu'uvicorn ne ferme
+les sockets et n'attende les connexions ouvertes : le lifespan ne tourne qu'après
+"""
+import asyncio
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable
+from database.mongo import db
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration des sondes et de l'arrêt
+HEALTH_PING_INTERVAL_SECONDS = float(os.getenv("HEALTH_PING_INTERVAL_SECONDS", "5"))
+HEALTH_PING_TIMEOUT_SECONDS = float(os.getenv("HEALTH_PING_TIMEOUT_SECONDS", "2"))
+# Au-delà, le dernier ping est trop ancien pour être considéré comme valide
+HEALTH_MAX_AGE_SECONDS = 3 * HEALTH_PING_INTERVAL_SECONDS
+SHUTDOWN_DRAIN_TIMEOUT_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT_SECONDS", "25"))
+# Après SIGTERM, durée pendant laquelle /health/ready répond « non prêt » avant la
+# fermeture des sockets (laisser le répartiteur retirer l'instance) ; ignorée pour SIGINT
+SHUTDOWN_NOT_READY_SECONDS = float(os.getenv("SHUTDOWN_NOT_READY_SECONDS", "5"))
+
+# Routes des sondes : jamais refusées ni comptées pendant l'arrêt
+HEALTH_PATHS = ("/health", "/health/live", "/health/ready")
+
+class HealthMonitor:
+    """État partagé : dernier ping MongoDB, requêtes en cours et phase d'arrêt"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.mongo_ok = False
+        self.mongo_latence_ms = None
+        self.mongo_erreur = "Pas encore vérifié"
+        self.mongo_verifie_a = None
+        self._checked_at = None
+        self.draining = False
+        self.in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._shutdown_task = None
+        self._previous_handlers = {}
+
+    # 🍃 Ping MongoDB
+    async def check_mongo(self):
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(db.command("ping"), HEALTH_PING_TIMEOUT_SECONDS)
+            self.mongo_ok, self.mongo_erreur = True, None
+        except asyncio.TimeoutError:
+            self.mongo_ok, self.mongo_erreur = False, f"Ping sans réponse après {HEALTH_PING_TIMEOUT_SECONDS}s"
+        except Exception as e:
+            self.mongo_ok, self.mongo_erreur = False, str(e)
+        self.mongo_latence_ms = round((time.perf_counter() - start) * 1000, 2)
+        self.mongo_verifie_a = datetime.now(timezone.utc).isoformat()
+        self._checked_at = time.monotonic()
+
+    async def run(self):
+        """Rafraîchir le ping en tâche de fond (lancée par le lifespan)"""
+        while True:
+            await asyncio.sleep(HEALTH_PING_INTERVAL_SECONDS)
+            await self.check_mongo()
+
+    # 🩺 Sondes
+    def liveness(self) -> dict:
+        return {
+            "status": "🟢 Vivant",
+            "uptime_s": round(time.monotonic() - self.started_at, 1)
+        }
+
+    def readiness(self) -> tuple:
+        """(prêt, détail) : prêt si MongoDB a répondu récemment et que l'arrêt n'a pas commencé"""
+        age = time.monotonic() - self._checked_at if self._checked_at is not None else None
+        raisons = []
+        if self.draining:
+            raisons.append("Arrêt en cours")
+        if not self.mongo_ok:
+            raisons.append(f"MongoDB indisponible : {self.mongo_erreur}")
+        elif age is None or age > HEALTH_MAX_AGE_SECONDS:
+            raisons.append("Dernier ping MongoDB trop ancien")
+        return not raisons, {
+            "status": "🟢 Prêt" if not raisons else "🔴 Non prêt",
+            "raisons": raisons,
+            "mongo": {
+                "ok": self.mongo_ok,
+                "latence_ms": self.mongo_latence_ms,
+                "verifie_a": self.mongo_verifie_a,
+                "age_s": round(age, 1) if age is not None else None
+            },
+            "requetes_en_cours": self.in_flight
+        }
+
+    # 🛑 Arrêt progressif
+    def request_started(self):
+        self.in_flight += 1
+        self._idle.clear()
+
+    def request_finished(self):
+        self.in_flight -= 1
+        if self.in_flight == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float = SHUTDOWN_DRAIN_TIMEOUT_SECONDS) -> bool:
+        """Refuser les nouvelles requêtes puis attendre la fin de celles en cours"""
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Arrêt : %d requêtes encore en cours après %ss", self.in_flight, timeout)
+            return False
+
+    def install_signal_handlers(self, on_drain: Callable[[], None]):
+        """
+        Intercepter SIGTERM et SIGINT devant le gestionnaire du serveur (uvicorn) :
+        passer en arrêt, appeler on_drain (fin des flux temps réel), attendre les
+        requêtes en cours, puis seulement transmettre le signal au serveur
+        Un second signal est transmis immédiatement (arrêt forcé)
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        loop = asyncio.get_running_loop()
+        self._shutdown_task = None
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            previous = self._previous_handlers[sig] = signal.getsignal(sig)
+
+            def handler(signum, frame, previous=previous):
+                if self._shutdown_task is not None:
+                    _forward_signal(signum, frame, previous)
+                    return
+                self._shutdown_task = loop.create_task(self._shutdown(signum, frame, previous, on_drain))
+
+            signal.signal(sig, handler)
+
+    def restore_signal_handlers(self):
+        """Remettre les gestionnaires d'origine (appelé à la fin du lifespan)"""
+        for sig, previous in self._previous_handlers.items():
+            signal.signal(sig, previous)
+        self._previous_handlers = {}
+
+    async def _shutdown(self, signum, frame, previous, on_drain: Callable[[], None]):
+        self.draining = True
+        logger.info("Signal %s reçu : arrêt progressif", signal.Signals(signum).name)
+        try:
+            on_drain()
+            if signum == signal.SIGTERM and SHUTDOWN_NOT_READY_SECONDS > 0:
+                await asyncio.sleep(SHUTDOWN_NOT_READY_SECONDS)
+            await self.drain()
+        finally:
+            _forward_signal(signum, frame, previous)
+
+def _forward_signal(signum, frame, previous):
+    """Rendre le signal au gestionnaire d'origine (uvicorn) ou au comportement par défaut"""
+    if callable(previous):
+        previous(signum, frame)
+    elif previous != signal.SIG_IGN:
+        signal.signal(signum, signal.SIG_DFL)
+        signal.raise_signal(signum)
+
+class DrainMiddleware:
+    """
+    Compter les requêtes HTTP en cours ; pendant l'arrêt, répondre 503 aux
+    nouvelles requêtes (hors sondes) pour que le répartiteur les envoie ailleurs
+    """
+
+    def __init__(self, app, monitor: "HealthMonitor"):
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in HEALTH_PATHS:
+            await self.app(scope, receive, send)
+            return
+        if self.monitor.draining:
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", b"1"),
+                    (b"connection", b"close")
+                ]
+            })
+            await send({"type": "http.response.body", "body": '{"detail":"Serveur en cours d\'arrêt"}'.encode()})
+            return
+        self.monitor.request_started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.request_finished()
+
+# Instance utilisée par l'application
+health_monitor = HealthMonitor()
@@ -0,0 +1,128 @@
+import asyncio
+import logging
+from typing import List, Optional
+from pymongo.errors import BulkWriteError
+from database.mongo import DUPLICATE_KEY_ERROR, db
+from database import storage
+from models.schemas import Donnee
+from utils.capteur_cache import get_capteurs
+from utils.timestamps import parse_timestamp
+from services.rollups import update_rollups
+from services.latest import update_latest
+from services.pubsub import EVENT_DONNEE, publish_committed
+from services.alerts import alert_engine
+from services.retention import retention_policies
+from utils.metrics import READINGS
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration de l'ingestion par lot
+MAX_BATCH_SIZE = 5000
+
+# Statuts possibles d'une donnée dans un lot
+STATUT_ACCEPTEE = "acceptee"
+STATUT_DOUBLON = "doublon"
+STATUT_REJETEE = "rejetee"
+
+# 🔔 Traitements après écriture des données
+async def on_donnees_committed(docs: List[dict]):
+    """
+    Appelé une fois par écriture (requête unitaire ou lot) avec les données
+    effectivement insérées (doublons exclus)
+    Un échec ici n'annule pas l'écriture : les rollups se reconstruisent avec
+    python -m services.rollups backfill et la dernière valeur retombe sur donnees
+    Les alertes sont évaluées en arrière-plan (services/alerts.py)
+    """
+    READINGS.labels(STATUT_ACCEPTEE).inc(len(docs))
+    alert_engine.submit(docs)
+    publish_committed(EVENT_DONNEE, docs)
+    resultats = await asyncio.gather(update_rollups(docs), update_latest(docs), return_exceptions=True)
+    for nom, resultat in zip(("rollups", "latest"), resultats):
+        if isinstance(resultat, Exception):
+            logger.error("Échec de mise à jour %s (%d données)", nom, len(docs), exc_info=resultat)
+
+# 📥 Ingestion d'un lot de données
+async def ingest_donnees(donnees: List[Donnee], owner_id: Optional[str] = None, verified: bool = False) -> dict:
+    """
+    Enregistrer un lot de données avec un nombre fixe d'allers-retours MongoDB :
+    propriété via le cache des capteurs (deux requêtes au plus pour les absents)
+    puis un insert_many non ordonné ; les alertes sont évaluées en arrière-plan
+    Sans owner_id (ingestion MQTT), le propriétaire est celui de l'objet du capteur
+    verified : propriété déjà établie par l'appelant (jeton d'appareil), sans lecture
+    """
+    resultats = [None] * len(donnees)
+
+    # Propriétaire de chaque capteurId distinct (cache, puis MongoDB)
+    if verified:
+        proprietaires = {d.capteurId: owner_id for d in donnees}
+    else:
+        capteurs = await get_capteurs(d.capteurId for d in donnees)
+        proprietaires = {
+            capteur_id: capteur["owner_id"]
+            for capteur_id, capteur in capteurs.items()
+            if owner_id is None or capteur["owner_id"] == owner_id
+        }
+
+    # Préparer les documents des capteurs autorisés
+    docs, positions = [], []
+    for index, donnee in enumerate(donnees):
+        if donnee.capteurId not in proprietaires:
+            resultats[index] = {
+                "index": index,
+                "statut": STATUT_REJETEE,
+                "raison": "Capteur non trouvé ou non autorisé"
+            }
+            continue
+        doc = donnee.model_dump()
+        doc["ts"] = parse_timestamp(donnee.timestamp)
+        doc["owner_id"] = proprietaires[donnee.capteurId]
+        docs.append(doc)
+        positions.append(index)
+    retention_policies.stamp(docs)
+
+    # Insertion non ordonnée : les doublons sont signalés par l'index unique
+    # donnees_capteur_timestamp_unique (database/indexes.py, disposition documents)
+    erreurs = {}
+    if docs:
+        try:
+            await db.ingest_collection().insert_many(storage.to_storage(docs), ordered=False)
+        except BulkWriteError as e:
+            for erreur in e.details.get("writeErrors", []):
+                erreurs[erreur["index"]] = erreur
+
+    inseres = []
+    for rang, (position, doc) in enumerate(zip(positions, docs)):
+        erreur = erreurs.get(rang)
+        if erreur is None:
+            resultats[position] = {
+                "index": position,
+                "statut": STATUT_ACCEPTEE,
+                "data_id": str(doc["_id"])
+            }
+            inseres.append(doc)
+        elif erreur.get("code") == DUPLICATE_KEY_ERROR:
+            resultats[position] = {
+                "index": position,
+                "statut": STATUT_DOUBLON,
+                "raison": "Donnée déjà enregistrée pour ce timestamp"
+            }
+        else:
+            resultats[position] = {
+                "index": position,
+                "statut": STATUT_REJETEE,
+                "raison": erreur.get("errmsg", "Erreur d'écriture")
+            }
+
+    if inseres:
+        await on_donnees_committed(inseres)
+
+    statuts = [r["statut"] for r in resultats]
+    doublons, rejetees = statuts.count(STATUT_DOUBLON), statuts.count(STATUT_REJETEE)
+    READINGS.labels(STATUT_DOUBLON).inc(doublons)
+    READINGS.labels(STATUT_REJETEE).inc(rejetees)
+    return {
+        "acceptees": statuts.count(STATUT_ACCEPTEE),
+        "doublons": doublons,
+        "rejetees": rejetees,
+        "resultats": resultats
+    }
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from database.mongo import DUPLICATE_KEY_ERROR, db
+from database import storage
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration du magasin "dernière valeur"
+# TTL court : avec plusieurs workers, la mémoire locale peut ignorer une écriture
+# faite ailleurs ; la collection latest reste la référence
+LATEST_CACHE_MAXSIZE = 100000
+LATEST_CACHE_TTL_SECONDS = 2
+
+# Cache négatif : capteurs sans aucune donnée, pour ne pas relancer la requête triée
+# sur donnees à chaque lecture. Consulté après la collection latest, que chaque
+# écriture alimente : une donnée arrivée entre-temps est vue sans attendre le TTL
+LATEST_MISS_TTL_SECONDS = 5
+
+latest_cache = TTLCache(maxsize=LATEST_CACHE_MAXSIZE, ttl=LATEST_CACHE_TTL_SECONDS, name="latest")
+latest_misses = TTLCache(maxsize=LATEST_CACHE_MAXSIZE, ttl=LATEST_MISS_TTL_SECONDS, name="latest_absents")
+
+def _ts_key(ts):
+    # Les dates relues de MongoDB sont naïves (UTC), celles de l'ingestion sont en UTC
+    return ts.replace(tzinfo=None) if ts.tzinfo is not None else ts
+
+def _latest_doc(doc: dict) -> dict:
+    """Document compact stocké pour un capteur (une entrée par capteurId)"""
+    return {
+        "capteurId": doc["capteurId"],
+        "valeur": doc["valeur"],
+        "timestamp": doc["timestamp"],
+        "ts": _ts_key(doc["ts"]),
+        "owner_id": doc["owner_id"],
+        "id": str(doc["_id"])
+    }
+
+def _remember(entry: dict):
+    """Mettre à jour la mémoire locale si entry est plus récente que la valeur connue"""
+    current = latest_cache.get(entry["capteurId"], default=None)
+    if current is None or _ts_key(entry["ts"]) >= _ts_key(current["ts"]):
+        latest_cache.set(entry["capteurId"], entry)
+
+# ✏ Mise à jour à l'écriture
+async def update_latest(docs: List[dict]):
+    """
+    Retenir la donnée la plus récente (par ts) de chaque capteur d'un lot
+    L'upsert ne remplace l'entrée que si ts est plus récent : une donnée arrivée
+    en retard ne peut pas écraser une valeur plus récente
+    """
+    plus_recentes: Dict[str, dict] = {}
+    for doc in docs:
+        current = plus_recentes.get(doc["capteurId"])
+        if current is None or _ts_key(doc["ts"]) > _ts_key(current["ts"]):
+            plus_recentes[doc["capteurId"]] = doc
+
+    operations = []
+    for capteur_id, doc in plus_recentes.items():
+        entry = _latest_doc(doc)
+        _remember(entry)
+        operations.append(UpdateOne(
+            {"_id": capteur_id, "ts": {"$lt": entry["ts"]}},
+            {"$set": entry},
+            upsert=True
+        ))
+    try:
+        await db["latest"].bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        # Clé dupliquée = une entrée plus récente existe déjà : rien à faire
+        autres = [err for err in e.details.get("writeErrors", []) if err.get("code") != DUPLICATE_KEY_ERROR]
+        if autres:
+            raise
+
+async def _seed_from_donnees(capteur_id: str, owner_id: str) -> Optional[dict]:
+    """
+    Capteur sans entrée latest (données antérieures) : requête triée puis initialisation
+    Un capteur sans donnée est retenu LATEST_MISS_TTL_SECONDS
+    """
+    if latest_misses.get((capteur_id, owner_id), default=None):
+        return None
+    doc = storage.from_storage(await storage.collection().find_one(
+        storage.match(capteurId=capteur_id, owner_id=owner_id),
+        sort=[("ts", DESCENDING)]
+    ))
+    if doc is None:
+        latest_misses.set((capteur_id, owner_id), True)
+        return None
+    await update_latest([doc])
+    return _latest_doc(doc)
+
+# 🔍 Lecture
+async def get_latest(capteur_id: str, owner_id: str) -> Optional[dict]:
+    """Dernière donnée d'un capteur : mémoire, puis collection latest, puis donnees"""
+    entry = latest_cache.get(capteur_id, default=None)
+    if entry is not None and entry["owner_id"] == owner_id:
+        return entry
+
+    entry = await db["latest"].find_one({"_id": capteur_id, "owner_id": owner_id}, {"_id": 0})
+    if entry is not None:
+        _remember(entry)
+        return entry
+    return await _seed_from_donnees(capteur_id, owner_id)
+
+async def get_latest_many(capteur_ids: Iterable[str], owner_id: str) -> Dict[str, Optional[dict]]:
+    """Version groupée de get_latest : une requête $in pour les absents de la mémoire"""
+    resultats, manquants = {}, []
+    for capteur_id in dict.fromkeys(capteur_ids):
+        entry = latest_cache.get(capteur_id, default=None)
+        if entry is not None and entry["owner_id"] == owner_id:
+            resultats[capteur_id] = entry
+        else:
+            manquants.append(capteur_id)
+
+    if manquants:
+        cursor = db["latest"].find({"_id": {"$in": manquants}, "owner_id": owner_id}, {"_id": 0})
+        async for entry in cursor:
+            _remember(entry)
+            resultats[entry["capteurId"]] = entry
+
+    restants = [c for c in manquants if c not in resultats]
+    if restants:
+        entries = await asyncio.gather(*(_seed_from_donnees(c, owner_id) for c in restants))
+        resultats.update(zip(restants, entries))
+    return resultats
@@ -0,0 +1,241 @@
+"""
+Ingestion MQTT : abonnement à iot/<capteurId>/data, écriture en micro-lots
+Le propriétaire de chaque donnée est celui du capteur du topic : le broker est la
+seule frontière d'accès. En production, activer l'authentification (MQTT_USERNAME /
+MQTT_PASSWORD), le chiffrement (MQTT_TLS=1) et des ACL de topics sur le broker
+(chaque appareil ne publie que sur iot/<son capteurId>/data) ; sans elles, tout
+client du broker écrit des données pour n'importe quel capteur
+"""
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+import paho.mqtt.client as mqtt
+from pydantic import ValidationError
+from models.schemas import Donnee
+from services.ingestion import ingest_donnees
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration MQTT
+MQTT_ENABLED = os.getenv("MQTT_ENABLED", "0") == "1"
+MQTT_HOST = os.getenv("MQTT_HOST", "localhost")
+MQTT_TLS = os.getenv("MQTT_TLS", "0") == "1"
+MQTT_PORT = int(os.getenv("MQTT_PORT", "8883" if MQTT_TLS else "1883"))
+MQTT_TOPIC = os.getenv("MQTT_TOPIC", "iot/+/data")
+MQTT_USERNAME = os.getenv("MQTT_USERNAME")
+MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
+# Autorité de certification du broker (certificats système par défaut)
+MQTT_TLS_CA_CERTS = os.getenv("MQTT_TLS_CA_CERTS")
+
+# ⚙ Configuration du tampon et des micro-lots
+QUEUE_MAXSIZE = 10000
+FLUSH_SIZE = 500
+FLUSH_INTERVAL_SECONDS = 0.05
+ENQUEUE_TIMEOUT_SECONDS = 1.0
+
+def capteur_from_topic(topic: str) -> Optional[str]:
+    """Extraire le capteurId d'un topic iot/<capteurId>/data"""
+    parts = topic.split("/")
+    if len(parts) == 3 and parts[0] == "iot" and parts[2] == "data" and parts[1]:
+        return parts[1]
+    return None
+
+def default_client_factory() -> mqtt.Client:
+    """Créer le client paho-mqtt utilisé en production"""
+    client = mqtt.Client(callback_api_version=mqtt.CallbackAPIVersion.VERSION2)
+    client.reconnect_delay_set(min_delay=1, max_delay=30)
+    if MQTT_USERNAME:
+        client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+    if MQTT_TLS:
+        client.tls_set(ca_certs=MQTT_TLS_CA_CERTS)
+    else:
+        logger.warning("MQTT sans TLS : identifiants et données circulent en clair")
+    return client
+
+class MqttIngestWorker:
+    """
+    Abonné MQTT qui alimente le pipeline d'ingestion
+    Le thread réseau paho valide les messages et les dépose dans une file asyncio
+    bornée ; une tâche de fond les écrit en micro-lots via ingest_donnees
+    Le client est injectable (client_factory) pour tester avec un broker factice
+    """
+
+    def __init__(
+        self,
+        client_factory: Callable[[], mqtt.Client] = default_client_factory,
+        host: str = MQTT_HOST,
+        port: int = MQTT_PORT,
+        topic: str = MQTT_TOPIC,
+        queue_maxsize: int = QUEUE_MAXSIZE,
+        flush_size: int = FLUSH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_SECONDS,
+        enqueue_timeout: float = ENQUEUE_TIMEOUT_SECONDS
+    ):
+        self.client_factory = client_factory
+        self.host = host
+        self.port = port
+        self.topic = topic
+        self.queue_maxsize = queue_maxsize
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.queue: Optional[asyncio.Queue] = None
+        self._client = None
+        self._loop = None
+        self._loop_thread = None
+        self._flusher = None
+        self.counters = {
+            "recus": 0,
+            "invalides": 0,
+            "abandonnes": 0,
+            "acceptes": 0,
+            "doublons": 0,
+            "rejetes": 0,
+            "echecs_ecriture": 0,
+            "lots": 0
+        }
+        self.lag_ms_last = 0.0
+        self.lag_ms_max = 0.0
+
+    # 🚀 Cycle de vie
+    async def start(self):
+        """Démarrer la tâche d'écriture puis la connexion au broker"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self.queue = asyncio.Queue(maxsize=self.queue_maxsize)
+        self._flusher = asyncio.create_task(self._run_flusher())
+
+        self._client = self.client_factory()
+        self._client.on_connect = self._on_connect
+        self._client.on_message = self._on_message
+        self._client.connect_async(self.host, self.port)
+        self._client.loop_start()
+
+    async def stop(self):
+        """Se déconnecter du broker puis vider la file avant de s'arrêter"""
+        if self._client is not None:
+            self._client.disconnect()
+            await asyncio.to_thread(self._client.loop_stop)
+            self._client = None
+        if self._flusher is not None:
+            await self.queue.put(None)
+            await self._flusher
+            self._flusher = None
+
+    # 📡 Callbacks paho (thread réseau)
+    def _on_connect(self, client, userdata, flags, reason_code, properties):
+        if reason_code.is_failure:
+            logger.warning("Connexion MQTT refusée: %s", reason_code)
+            return
+        client.subscribe(self.topic, qos=1)
+
+    def _on_message(self, client, userdata, message):
+        self.handle_message(message.topic, message.payload)
+
+    # 📥 Réception d'un message
+    def parse_message(self, topic: str, payload: bytes) -> Optional[Donnee]:
+        """Valider un message contre le schéma Donnee (capteurId issu du topic)"""
+        capteur_id = capteur_from_topic(topic)
+        if capteur_id is None:
+            return None
+        try:
+            data = json.loads(payload)
+            if not isinstance(data, dict):
+                return None
+            data["capteurId"] = capteur_id
+            return Donnee(**data)
+        except (ValueError, ValidationError):
+            return None
+
+    def handle_message(self, topic: str, payload: bytes) -> bool:
+        """
+        Valider et mettre en file un message
+        Depuis le thread réseau, bloque jusqu'à enqueue_timeout quand la file est
+        pleine : paho cesse alors de lire le socket et le broker ralentit l'envoi
+        """
+        self.counters["recus"] += 1
+        donnee = self.parse_message(topic, payload)
+        if donnee is None:
+            self.counters["invalides"] += 1
+            return False
+
+        item = (donnee, time.monotonic())
+        if threading.get_ident() == self._loop_thread:
+            try:
+                self.queue.put_nowait(item)
+                return True
+            except asyncio.QueueFull:
+                self.counters["abandonnes"] += 1
+                return False
+
+        future = asyncio.run_coroutine_threadsafe(self.queue.put(item), self._loop)
+        try:
+            future.result(timeout=self.enqueue_timeout)
+            return True
+        except TimeoutError:
+            future.cancel()
+            self.counters["abandonnes"] += 1
+            return False
+
+    # 💾 Écriture en micro-lots
+    async def _run_flusher(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            stopping = False
+            deadline = self._loop.time() + self.flush_interval
+            while len(batch) < self.flush_size:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+            if stopping:
+                return
+
+    async def _flush(self, batch: List[Tuple[Donnee, float]]):
+        try:
+            rapport = await ingest_donnees([donnee for donnee, _ in batch])
+        except Exception:
+            logger.exception("Échec d'écriture d'un lot MQTT (%d données)", len(batch))
+            self.counters["echecs_ecriture"] += len(batch)
+            return
+        self.counters["lots"] += 1
+        self.counters["acceptes"] += rapport["acceptees"]
+        self.counters["doublons"] += rapport["doublons"]
+        self.counters["rejetes"] += rapport["rejetees"]
+
+        # Retard d'ingestion : réception du plus ancien message -> écriture du lot
+        lag_ms = (time.monotonic() - batch[0][1]) * 1000
+        self.lag_ms_last = lag_ms
+        self.lag_ms_max = max(self.lag_ms_max, lag_ms)
+
+    # 📊 Statistiques
+    def stats(self) -> dict:
+        return {
+            "actif": self._client is not None,
+            "file": self.queue.qsize() if self.queue is not None else 0,
+            "file_max": self.queue_maxsize,
+            "retard_ms_dernier_lot": round(self.lag_ms_last, 2),
+            "retard_ms_max": round(self.lag_ms_max, 2),
+            **self.counters
+        }
+
+# Instance utilisée par l'application
+mqtt_worker = MqttIngestWorker()
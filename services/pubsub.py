@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+from pymongo.errors import PyMongoError
+from database.mongo import db
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration de la diffusion temps réel
+# local : publication par ce worker après écriture
+# changestream : publication depuis le change stream MongoDB (plusieurs workers)
+PUBSUB_SOURCE = os.getenv("PUBSUB_SOURCE", "local")
+SUBSCRIBER_QUEUE_SIZE = 256
+MAX_DROPS_BEFORE_DISCONNECT = 1000
+
+EVENT_DONNEE = "donnee"
+EVENT_ALERTE = "alerte"
+EVENT_TYPES = (EVENT_DONNEE, EVENT_ALERTE)
+
+# Raisons de fermeture d'un abonnement (transmises au client SSE / WebSocket)
+FERMETURE_CLIENT = "client déconnecté"
+FERMETURE_LENT = "consommateur trop lent"
+FERMETURE_ARRET = "arrêt du serveur"
+
+class SubscriptionClosed(Exception):
+    """L'abonnement a été fermé ; raison : FERMETURE_CLIENT, FERMETURE_LENT ou FERMETURE_ARRET"""
+
+    def __init__(self, raison: str):
+        super().__init__(raison)
+        self.raison = raison
+
+_CLOSED = object()
+
+def event_from_doc(event_type: str, doc: dict) -> dict:
+    """Construire un événement sérialisable en JSON à partir d'un document MongoDB"""
+    data = {}
+    for key, value in doc.items():
+        if key == "_id":
+            data["id"] = str(value)
+        elif isinstance(value, datetime):
+            data[key] = value.isoformat()
+        else:
+            data[key] = value
+    return {
+        "type": event_type,
+        "capteurId": doc["capteurId"],
+        "owner_id": doc["owner_id"],
+        "data": data
+    }
+
+class Subscription:
+    """
+    Abonnement d'un client : file bornée et filtres (capteurs, types d'événements)
+    Consommateur lent : l'événement le plus ancien est abandonné pour faire de la place,
+    et l'abonnement est fermé après MAX_DROPS_BEFORE_DISCONNECT pertes
+    """
+
+    def __init__(self, hub: "PubSubHub", owner_id: str, capteurs: Optional[Set[str]], types: Set[str], maxsize: int):
+        self.hub = hub
+        self.owner_id = owner_id
+        self.capteurs = capteurs
+        self.types = types
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+        self.closed = False
+        self.raison: Optional[str] = None
+
+    def offer(self, event: dict):
+        """Déposer un événement sans jamais bloquer l'éditeur"""
+        if self.closed or event["type"] not in self.types:
+            return
+        if self.capteurs is not None and event["capteurId"] not in self.capteurs:
+            return
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.hub.dropped += 1
+            if self.dropped >= self.hub.max_drops:
+                self.hub.disconnected += 1
+                self.close(FERMETURE_LENT)
+                return
+        self.queue.put_nowait(event)
+        self.hub.delivered += 1
+
+    def close(self, raison: str = FERMETURE_CLIENT):
+        if self.closed:
+            return
+        self.closed = True
+        self.raison = raison
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(_CLOSED)
+
+    async def get(self) -> dict:
+        event = await self.queue.get()
+        if event is _CLOSED:
+            raise SubscriptionClosed(self.raison)
+        return event
+
+class PubSubHub:
+    """Diffusion en mémoire des données et alertes, indexée par propriétaire"""
+
+    def __init__(self, queue_size: int = SUBSCRIBER_QUEUE_SIZE, max_drops: int = MAX_DROPS_BEFORE_DISCONNECT):
+        self.queue_size = queue_size
+        self.max_drops = max_drops
+        self._by_owner: Dict[str, Set[Subscription]] = {}
+        self.published = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.disconnected = 0
+
+    def subscribe(
+        self,
+        owner_id: str,
+        capteurs: Optional[Iterable[str]] = None,
+        types: Iterable[str] = EVENT_TYPES
+    ) -> Subscription:
+        sub = Subscription(self, owner_id, set(capteurs) if capteurs else None, set(types), self.queue_size)
+        self._by_owner.setdefault(owner_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        subs = self._by_owner.get(sub.owner_id)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._by_owner[sub.owner_id]
+        sub.close()
+
+    @asynccontextmanager
+    async def subscription(self, owner_id: str, capteurs=None, types=EVENT_TYPES):
+        sub = self.subscribe(owner_id, capteurs, types)
+        try:
+            yield sub
+        finally:
+            self.unsubscribe(sub)
+
+    def publish(self, event: dict):
+        """Diffuser un événement aux abonnés de son propriétaire uniquement"""
+        self.published += 1
+        for sub in tuple(self._by_owner.get(event["owner_id"], ())):
+            sub.offer(event)
+
+    def close_all(self):
+        """Fermer tous les abonnements (arrêt du serveur) : les flux SSE et WebSocket se terminent"""
+        for subs in tuple(self._by_owner.values()):
+            for sub in tuple(subs):
+                sub.close(FERMETURE_ARRET)
+
+    def stats(self) -> dict:
+        return {
+            "source": PUBSUB_SOURCE,
+            "abonnes": sum(len(subs) for subs in self._by_owner.values()),
+            "proprietaires": len(self._by_owner),
+            "publies": self.published,
+            "distribues": self.delivered,
+            "abandonnes": self.dropped,
+            "deconnectes_lents": self.disconnected
+        }
+
+# Instance utilisée par l'application
+hub = PubSubHub()
+
+# 📣 Publication après écriture (source locale)
+def publish_committed(event_type: str, docs: List[dict]):
+    """Publier les documents écrits par ce worker ; ignoré si le change stream publie"""
+    if PUBSUB_SOURCE != "local":
+        return
+    for doc in docs:
+        hub.publish(event_from_doc(event_type, doc))
+
+# 🔄 Source change stream (plusieurs workers)
+async def watch_events():
+    """Publier chaque insertion dans donnees et alertes, quel que soit le worker d'origine"""
+    pipeline = [{"$match": {"operationType": "insert", "ns.coll": {"$in": ["donnees", "alertes"]}}}]
+    types = {"donnees": EVENT_DONNEE, "alertes": EVENT_ALERTE}
+    delay = 1
+    while True:
+        try:
+            async with db.watch(pipeline) as stream:
+                delay = 1
+                async for change in stream:
+                    hub.publish(event_from_doc(types[change["ns"]["coll"]], change["fullDocument"]))
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.warning("Change stream temps réel interrompu (%s), reprise dans %ss", e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
@@ -0,0 +1,418 @@
+"""
+Rétention des données et des alertes, archivage avant suppression
+Politique par propriétaire (capteurId absent) ou par capteur : nombre de jours
+conservés en base. À l'écriture, chaque donnée et chaque alerte reçoit
+expire_at = ts + jours (sans politique : pas de champ, conservation illimitée)
+La tâche d'archivage lit par lots les documents dont expire_at est passé, les
+écrit en NDJSON compressé (ARCHIVE_DIR/<collection>/<owner_id>/<capteurId>/<jour>.ndjson.gz)
+puis les supprime, en ralentissant quand le pool MongoDB est chargé
+Un seul archiveur à la fois : chaque passe prend un bail dans la collection
+archive_lease (plusieurs workers ou instances peuvent avoir ARCHIVE_ENABLED=1)
+L'index TTL sur expire_at (database/indexes.py) supprime avec un délai de grâce ce
+que l'archivage n'a pas traité : la base reste bornée si l'archivage prend du retard.
+Il n'existe que si ARCHIVE_ENABLED=1 : sans archiveur, rien n'est supprimé
+En disposition timeseries, pas d'index TTL sur expire_at : seul l'archivage supprime
+(un index simple sur expire_at y sert la recherche des documents expirés)
+Usage : python -m services.retention apply|archive
+"""
+import argparse
+import asyncio
+import errno
+import gzip
+import json
+import logging
+import os
+import socket
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+from pymongo.errors import DuplicateKeyError, PyMongoError
+from database.mongo import db, pool_stats
+from database import storage
+from database.settings import get_mongo_settings
+from utils.export import EXPORT_CHUNK_ROWS
+
+# Verrou de fichier : flock (POSIX) ou msvcrt.locking (Windows, poste de développement)
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration de la rétention et de l'archivage
+RETENTION_REFRESH_SECONDS = 30
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "0") == "1"
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archives")
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "300"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Pause entre deux lots, puis attente tant que le pool est chargé (ingestion prioritaire)
+ARCHIVE_PAUSE_SECONDS = float(os.getenv("ARCHIVE_PAUSE_SECONDS", "0.2"))
+ARCHIVE_BACKOFF_SECONDS = float(os.getenv("ARCHIVE_BACKOFF_SECONDS", "2"))
+# Part du pool (connexions utilisées / MONGO_MAX_POOL_SIZE) au-delà de laquelle l'archivage attend
+ARCHIVE_MAX_POOL_USAGE = float(os.getenv("ARCHIVE_MAX_POOL_USAGE", "0.5"))
+# Durée du bail d'archivage, renouvelé à chaque lot (repris par un autre worker s'il expire)
+ARCHIVE_LEASE_SECONDS = float(os.getenv("ARCHIVE_LEASE_SECONDS", "120"))
+ARCHIVE_LEASE_ID = "archiver"
+
+# Collections soumises à la rétention
+ARCHIVED_COLLECTIONS = ("donnees", "alertes")
+
+def _collection(name: str):
+    return storage.collection() if name == "donnees" else db[name]
+
+class RetentionPolicies:
+    """
+    Politiques en mémoire : (owner_id, capteurId) → jours, capteurId None pour la
+    politique par défaut du propriétaire. Rechargées périodiquement (autres workers)
+    """
+
+    def __init__(self):
+        self._jours: Dict[Tuple[str, Optional[str]], int] = {}
+        self.synced_at: Optional[datetime] = None
+
+    def jours(self, owner_id: str, capteur_id: str) -> Optional[int]:
+        jours = self._jours.get((owner_id, capteur_id))
+        return jours if jours is not None else self._jours.get((owner_id, None))
+
+    def stamp(self, docs: List[dict]):
+        """Ajouter expire_at aux documents (donnée ou alerte) avant leur écriture"""
+        if not self._jours:
+            return
+        for doc in docs:
+            jours = self.jours(doc["owner_id"], doc["capteurId"])
+            if jours is not None:
+                doc["expire_at"] = doc["ts"] + timedelta(days=jours)
+
+    def set(self, owner_id: str, capteur_id: Optional[str], jours: int):
+        self._jours[(owner_id, capteur_id)] = jours
+
+    def discard(self, owner_id: str, capteur_id: Optional[str]):
+        self._jours.pop((owner_id, capteur_id), None)
+
+    def replace(self, policies):
+        self._jours = {(p["owner_id"], p.get("capteurId")): p["jours"] for p in policies}
+
+    def by_owner(self) -> Dict[str, Dict[Optional[str], int]]:
+        proprietaires = defaultdict(dict)
+        for (owner_id, capteur_id), jours in self._jours.items():
+            proprietaires[owner_id][capteur_id] = jours
+        return proprietaires
+
+    def __len__(self) -> int:
+        return len(self._jours)
+
+# Instance utilisée par l'application
+retention_policies = RetentionPolicies()
+
+# 📋 Politiques
+async def set_policy(owner_id: str, capteur_id: Optional[str], jours: int):
+    """Créer ou remplacer une politique ; s'applique aux écritures suivantes"""
+    await db["retention"].update_one(
+        {"owner_id": owner_id, "capteurId": capteur_id},
+        {"$set": {"jours": jours, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    retention_policies.set(owner_id, capteur_id, jours)
+
+async def delete_policy(owner_id: str, capteur_id: Optional[str]) -> int:
+    result = await db["retention"].delete_one({"owner_id": owner_id, "capteurId": capteur_id})
+    retention_policies.discard(owner_id, capteur_id)
+    return result.deleted_count
+
+async def load_policies():
+    """Recharger les politiques (démarrage, puis périodiquement)"""
+    retention_policies.replace(await db["retention"].find({}, {"_id": 0}).to_list(length=None))
+    retention_policies.synced_at = datetime.now(timezone.utc)
+
+async def refresh_policies():
+    """Synchroniser les politiques modifiées par d'autres workers"""
+    while True:
+        await asyncio.sleep(RETENTION_REFRESH_SECONDS)
+        try:
+            await load_policies()
+        except PyMongoError as e:
+            logger.warning("Rechargement des politiques de rétention impossible (%s)", e)
+
+async def apply_policies() -> Dict[str, int]:
+    """
+    Recalculer expire_at des documents déjà enregistrés selon les politiques actuelles
+    (création d'une politique sur un historique existant, changement de durée)
+    Les propriétaires sans politique perdent leur expire_at
+    """
+    await load_policies()
+    proprietaires = retention_policies.by_owner()
+    modifies = {}
+    for name in ARCHIVED_COLLECTIONS:
+        if name == "donnees" and storage.is_timeseries():
+            logger.warning("Disposition timeseries : expire_at des données existantes non recalculé")
+            continue
+        collection, total = db[name], 0
+        for owner_id, politiques in proprietaires.items():
+            specifiques = [c for c in politiques if c is not None]
+            for capteur_id, jours in politiques.items():
+                filtre = {"owner_id": owner_id, "ts": {"$type": "date"}}
+                filtre["capteurId"] = capteur_id if capteur_id is not None else {"$nin": specifiques}
+                result = await collection.update_many(filtre, [{"$set": {
+                    "expire_at": {"$dateAdd": {"startDate": "$ts", "unit": "day", "amount": jours}}
+                }}])
+                total += result.modified_count
+            if None not in politiques:
+                result = await collection.update_many(
+                    {"owner_id": owner_id, "capteurId": {"$nin": specifiques}, "expire_at": {"$exists": True}},
+                    {"$unset": {"expire_at": ""}}
+                )
+                total += result.modified_count
+        result = await collection.update_many(
+            {"owner_id": {"$nin": list(proprietaires)}, "expire_at": {"$exists": True}},
+            {"$unset": {"expire_at": ""}}
+        )
+        modifies[name] = total + result.modified_count
+    return modifies
+
+# 🗄 Fichiers d'archive
+def _archive_path(name: str, owner_id: str, capteur_id: str, jour: date) -> str:
+    # capteurId est choisi par l'utilisateur : encodé pour rester un seul nom de dossier
+    dossier = quote(capteur_id, safe="").replace(".", "%2E")
+    return os.path.join(ARCHIVE_DIR, name, owner_id, dossier, f"{jour.isoformat()}.ndjson.gz")
+
+def _utc(ts: datetime) -> datetime:
+    # Les dates relues de MongoDB sont naïves (UTC)
+    return ts.replace(tzinfo=timezone.utc) if ts.tzinfo is None else ts
+
+@contextmanager
+def _verrou_exclusif(fd: int):
+    """Verrou exclusif bloquant sur un fichier d'archive ouvert, entre processus"""
+    if os.name != "nt":
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        return
+    # msvcrt verrouille une plage depuis la position courante : l'octet 0 sert de jeton
+    # (O_APPEND replace la position en fin de fichier à chaque écriture)
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        try:
+            # LK_LOCK réessaie pendant ~10 s puis lève EDEADLOCK
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            break
+        except OSError as e:
+            if e.errno != errno.EDEADLOCK:
+                raise
+    try:
+        yield
+    finally:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+def write_archive(name: str, docs: List[dict]) -> int:
+    """
+    Ajouter des documents aux fichiers du jour de leur ts (un membre gzip par lot)
+    Chaque membre est compressé en mémoire puis ajouté en un seul write sous verrou
+    exclusif (flock ou msvcrt) : deux processus ne peuvent pas entremêler leurs octets
+    Les fichiers sont synchronisés sur disque avant que l'appelant ne supprime les documents
+    Retourne le nombre de fichiers modifiés
+    """
+    fichiers = defaultdict(list)
+    for doc in docs:
+        ts = _utc(doc["ts"])
+        record = {k: v for k, v in doc.items() if k not in ("_id", "expire_at")}
+        record["id"] = str(doc["_id"])
+        record["ts"] = ts.isoformat()
+        fichiers[_archive_path(name, doc["owner_id"], doc["capteurId"], ts.date())].append(record)
+    for path, records in fichiers.items():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        membre = gzip.compress("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode())
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            with _verrou_exclusif(fd):
+                ecrits = os.write(fd, membre)
+                if ecrits != len(membre):
+                    # Écriture partielle (disque plein) : retirer le membre tronqué
+                    os.ftruncate(fd, os.fstat(fd).st_size - ecrits)
+                    raise OSError(f"Écriture incomplète de {path}")
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+    return len(fichiers)
+
+def read_archive(
+    name: str,
+    owner_id: str,
+    capteur_id: str,
+    debut: Optional[datetime] = None,
+    fin: Optional[datetime] = None
+) -> Iterator[dict]:
+    """
+    Relire une plage archivée d'un capteur, par ordre chronologique
+    Un jour est chargé à la fois ; un document archivé deux fois (archivage
+    interrompu entre l'écriture et la suppression) n'est retourné qu'une fois
+    """
+    dossier = os.path.dirname(_archive_path(name, owner_id, capteur_id, date.today()))
+    if not os.path.isdir(dossier):
+        return
+    jours = sorted(f for f in os.listdir(dossier) if f.endswith(".ndjson.gz"))
+    for fichier in jours:
+        jour = date.fromisoformat(fichier[:-len(".ndjson.gz")])
+        if (debut is not None and jour < debut.date()) or (fin is not None and jour > fin.date()):
+            continue
+        vus, records = set(), []
+        with gzip.open(os.path.join(dossier, fichier), "rt", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                ts = datetime.fromisoformat(record["ts"])
+                if record["id"] in vus or (debut is not None and ts < debut) or (fin is not None and ts > fin):
+                    continue
+                vus.add(record["id"])
+                records.append(record)
+        records.sort(key=lambda r: r["ts"])
+        yield from records
+
+def stream_archive(
+    name: str,
+    owner_id: str,
+    capteur_id: str,
+    debut: Optional[datetime] = None,
+    fin: Optional[datetime] = None
+) -> Iterator[bytes]:
+    """
+    read_archive encodé en NDJSON par morceaux de EXPORT_CHUNK_ROWS lignes
+    Itérateur synchrone : StreamingResponse le parcourt dans un thread
+    """
+    lignes = []
+    for record in read_archive(name, owner_id, capteur_id, debut, fin):
+        lignes.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if len(lignes) >= EXPORT_CHUNK_ROWS:
+            yield "".join(lignes).encode()
+            lignes = []
+    if lignes:
+        yield "".join(lignes).encode()
+
+# 🧹 Archivage puis suppression
+class Archiver:
+    """Tâche de fond : archiver puis supprimer les documents expirés, par lots ralentis"""
+
+    def __init__(self):
+        self.counters = {
+            "passes": 0,
+            "lots": 0,
+            "fichiers": 0,
+            "attentes_pool": 0,
+            "echecs": 0,
+            **{f"{name}_archivees": 0 for name in ARCHIVED_COLLECTIONS}
+        }
+        self.derniere_passe: Optional[str] = None
+        self.en_cours = False
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.counters["passes_sans_bail"] = 0
+
+    async def run(self):
+        """Passe d'archivage toutes les ARCHIVE_INTERVAL_SECONDS (lancée par le lifespan)"""
+        while True:
+            try:
+                await self.archive_pass()
+            except Exception:
+                logger.exception("Échec de la passe d'archivage")
+                self.counters["echecs"] += 1
+            await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+    # 🔒 Bail : un seul archiveur entre workers et instances
+    async def acquire_lease(self) -> bool:
+        """Prendre ou renouveler le bail ; False s'il est tenu par un autre archiveur"""
+        now = datetime.now(timezone.utc)
+        try:
+            await db["archive_lease"].find_one_and_update(
+                {"_id": ARCHIVE_LEASE_ID, "$or": [{"holder": self.holder}, {"expires_at": {"$lte": now}}]},
+                {"$set": {"holder": self.holder, "expires_at": now + timedelta(seconds=ARCHIVE_LEASE_SECONDS)}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def release_lease(self):
+        await db["archive_lease"].update_one(
+            {"_id": ARCHIVE_LEASE_ID, "holder": self.holder},
+            {"$set": {"expires_at": datetime.now(timezone.utc)}}
+        )
+
+    async def archive_pass(self) -> Optional[Dict[str, int]]:
+        """Une passe sur chaque collection ; None si un autre archiveur tient le bail"""
+        if not await self.acquire_lease():
+            self.counters["passes_sans_bail"] += 1
+            return None
+        self.en_cours = True
+        try:
+            archivees = {name: await self.archive_collection(name) for name in ARCHIVED_COLLECTIONS}
+        finally:
+            self.en_cours = False
+            await self.release_lease()
+        self.counters["passes"] += 1
+        self.derniere_passe = datetime.now(timezone.utc).isoformat()
+        return archivees
+
+    async def archive_collection(self, name: str) -> int:
+        collection, total = _collection(name), 0
+        while True:
+            await self._throttle()
+            if not await self.acquire_lease():
+                # Bail perdu (lot plus long que ARCHIVE_LEASE_SECONDS) : l'autre archiveur reprend
+                logger.warning("Bail d'archivage perdu, passe interrompue")
+                return total
+            docs = await collection.find(
+                {"expire_at": {"$lte": datetime.now(timezone.utc)}}
+            ).sort("expire_at", 1).limit(ARCHIVE_BATCH_SIZE).to_list(length=ARCHIVE_BATCH_SIZE)
+            if not docs:
+                return total
+            if name == "donnees":
+                docs = [storage.from_storage(doc) for doc in docs]
+            # Écriture disque hors de la boucle d'événements, suppression seulement ensuite
+            self.counters["fichiers"] += await asyncio.to_thread(write_archive, name, docs)
+            await collection.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            total += len(docs)
+            self.counters["lots"] += 1
+            self.counters[f"{name}_archivees"] += len(docs)
+            await asyncio.sleep(ARCHIVE_PAUSE_SECONDS)
+
+    async def _throttle(self):
+        """Attendre tant que le pool MongoDB est chargé"""
+        limite = ARCHIVE_MAX_POOL_USAGE * get_mongo_settings().max_pool_size
+        while True:
+            if pool_stats.checked_out <= limite:
+                return
+            self.counters["attentes_pool"] += 1
+            await asyncio.sleep(ARCHIVE_BACKOFF_SECONDS)
+
+    def stats(self) -> dict:
+        return {
+            "actif": ARCHIVE_ENABLED,
+            "en_cours": self.en_cours,
+            "dossier": ARCHIVE_DIR,
+            "politiques": len(retention_policies),
+            "derniere_passe": self.derniere_passe,
+            **self.counters
+        }
+
+# Instance utilisée par l'application
+archiver = Archiver()
+
+async def _main(args):
+    await load_policies()
+    if args.commande == "apply":
+        rapport = await apply_policies()
+    else:
+        rapport = await archiver.archive_pass()
+        if rapport is None:
+            rapport = {"message": "Bail d'archivage tenu par un autre archiveur, réessayez plus tard"}
+    print(json.dumps(rapport, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rétention et archivage des données")
+    parser.add_argument("commande", choices=["apply", "archive"])
+    asyncio.run(_main(parser.parse_args()))
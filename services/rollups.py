@@ -0,0 +1,191 @@
+"""
+Agrégats précalculés (rollups) des données par minute, heure et jour
+Mis à jour de façon incrémentale à l'ingestion ; reconstruction et contrôle :
+python -m services.rollups backfill|check [--capteur ID] [--granularite 1h]
+"""
+import argparse
+import asyncio
+import json
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from pymongo import UpdateOne
+from database.mongo import db
+from database import storage
+
+# 🗂 Granularités disponibles : unité $dateTrunc et collection cible
+GRANULARITES = {
+    "1m": {"unit": "minute", "collection": "donnees_1m"},
+    "1h": {"unit": "hour", "collection": "donnees_1h"},
+    "1d": {"unit": "day", "collection": "donnees_1d"},
+}
+
+def bucket_start(ts: datetime, granularite: str) -> datetime:
+    """Début (UTC) de l'intervalle contenant ts"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    ts = ts.replace(second=0, microsecond=0)
+    if granularite in ("1h", "1d"):
+        ts = ts.replace(minute=0)
+    if granularite == "1d":
+        ts = ts.replace(hour=0)
+    return ts
+
+# ➕ Mise à jour incrémentale
+async def update_rollups(docs: List[dict]):
+    """
+    Reporter un lot de données enregistrées dans les rollups
+    Les données sont d'abord regroupées par intervalle en mémoire, puis chaque
+    intervalle reçoit un seul upsert $inc/$min/$max par granularité
+    """
+    if not docs:
+        return
+    await asyncio.gather(*(_update_granularite(docs, g) for g in GRANULARITES))
+
+async def _update_granularite(docs: List[dict], granularite: str):
+    buckets: Dict[tuple, dict] = defaultdict(
+        lambda: {"count": 0, "sum": 0.0, "min": None, "max": None, "last_ts": None}
+    )
+    for doc in docs:
+        bucket = buckets[(doc["capteurId"], doc["owner_id"], bucket_start(doc["ts"], granularite))]
+        valeur = doc["valeur"]
+        bucket["count"] += 1
+        bucket["sum"] += valeur
+        bucket["min"] = valeur if bucket["min"] is None else min(bucket["min"], valeur)
+        bucket["max"] = valeur if bucket["max"] is None else max(bucket["max"], valeur)
+        bucket["last_ts"] = doc["ts"] if bucket["last_ts"] is None else max(bucket["last_ts"], doc["ts"])
+
+    operations = [
+        UpdateOne(
+            {"capteurId": capteur_id, "owner_id": owner_id, "debut": debut},
+            {
+                "$inc": {"count": b["count"], "sum": b["sum"]},
+                "$min": {"min": b["min"]},
+                "$max": {"max": b["max"], "last_ts": b["last_ts"]}
+            },
+            upsert=True
+        )
+        for (capteur_id, owner_id, debut), b in buckets.items()
+    ]
+    await db[GRANULARITES[granularite]["collection"]].bulk_write(operations, ordered=False)
+
+# 📖 Lecture
+async def read_rollups(
+    capteur_id: str,
+    owner_id: str,
+    granularite: str,
+    debut: datetime,
+    fin: datetime
+) -> List[dict]:
+    """Lire les intervalles précalculés d'un capteur, avec la moyenne calculée"""
+    cursor = db[GRANULARITES[granularite]["collection"]].find(
+        {"capteurId": capteur_id, "owner_id": owner_id, "debut": {"$gte": debut, "$lte": fin}},
+        {"_id": 0, "debut": 1, "count": 1, "sum": 1, "min": 1, "max": 1}
+    ).sort("debut", 1)
+    points = []
+    async for doc in cursor:
+        doc["avg"] = doc.pop("sum") / doc["count"] if doc["count"] else None
+        points.append(doc)
+    return points
+
+# 🔁 Reconstruction depuis les données brutes
+def _raw_pipeline(granularite: str, match: dict) -> list:
+    return [
+        {"$match": {**match, "ts": {"$type": "date"}}},
+        {"$group": {
+            "_id": {
+                "capteurId": storage.ref("capteurId"),
+                "owner_id": storage.ref("owner_id"),
+                "debut": {"$dateTrunc": {"date": "$ts", "unit": GRANULARITES[granularite]["unit"]}}
+            },
+            "count": {"$sum": 1},
+            "sum": {"$sum": "$valeur"},
+            "min": {"$min": "$valeur"},
+            "max": {"$max": "$valeur"},
+            "last_ts": {"$max": "$ts"}
+        }},
+        {"$project": {
+            "_id": 0,
+            "capteurId": "$_id.capteurId",
+            "owner_id": "$_id.owner_id",
+            "debut": "$_id.debut",
+            "count": 1, "sum": 1, "min": 1, "max": 1, "last_ts": 1
+        }}
+    ]
+
+async def backfill(granularite: str, capteur_id: Optional[str] = None):
+    """
+    Recalculer les rollups depuis donnees ($group puis $merge côté serveur)
+    Les intervalles existants sont remplacés par la valeur recalculée
+    """
+    match = storage.match(capteurId=capteur_id) if capteur_id else {}
+    pipeline = _raw_pipeline(granularite, match) + [{"$merge": {
+        "into": GRANULARITES[granularite]["collection"],
+        "on": ["capteurId", "owner_id", "debut"],
+        "whenMatched": "replace",
+        "whenNotMatched": "insert"
+    }}]
+    await storage.collection().aggregate(pipeline).to_list(length=None)
+
+# ✅ Contrôle de cohérence
+async def check_consistency(
+    granularite: str,
+    capteur_id: Optional[str] = None,
+    debut: Optional[datetime] = None
+) -> List[dict]:
+    """Comparer count et somme de chaque intervalle avec les données brutes"""
+    match = storage.match(capteurId=capteur_id) if capteur_id else {}
+    if debut is not None:
+        # Comparer des intervalles complets
+        debut = bucket_start(debut, granularite)
+        match["ts"] = {"$gte": debut}
+    raw = {}
+    async for doc in storage.collection().aggregate(_raw_pipeline(granularite, match)):
+        raw[(doc["capteurId"], doc["owner_id"], doc["debut"])] = doc
+
+    rollup_match = {"capteurId": capteur_id} if capteur_id else {}
+    if debut is not None:
+        rollup_match["debut"] = {"$gte": debut}
+    ecarts = []
+    async for doc in db[GRANULARITES[granularite]["collection"]].find(rollup_match):
+        key = (doc["capteurId"], doc["owner_id"], doc["debut"])
+        attendu = raw.pop(key, None)
+        if (
+            attendu is None
+            or attendu["count"] != doc["count"]
+            or not math.isclose(attendu["sum"], doc["sum"], rel_tol=1e-9, abs_tol=1e-6)
+        ):
+            ecarts.append({
+                "capteurId": key[0],
+                "debut": key[2].isoformat(),
+                "rollup": {"count": doc["count"], "sum": doc["sum"]},
+                "brut": {"count": attendu["count"], "sum": attendu["sum"]} if attendu else None
+            })
+    for key, attendu in raw.items():
+        ecarts.append({
+            "capteurId": key[0],
+            "debut": key[2].isoformat(),
+            "rollup": None,
+            "brut": {"count": attendu["count"], "sum": attendu["sum"]}
+        })
+    return ecarts
+
+async def _main(args):
+    granularites = [args.granularite] if args.granularite else list(GRANULARITES)
+    for granularite in granularites:
+        if args.commande == "backfill":
+            await backfill(granularite, args.capteur)
+            print(f"{granularite} : rollups reconstruits")
+        else:
+            debut = datetime.now(timezone.utc) - timedelta(days=args.jours) if args.jours else None
+            ecarts = await check_consistency(granularite, args.capteur, debut)
+            print(json.dumps({"granularite": granularite, "ecarts": len(ecarts), "details": ecarts[:20]}, indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("commande", choices=["backfill", "check"])
+    parser.add_argument("--capteur", default=None)
+    parser.add_argument("--granularite", choices=list(GRANULARITES), default=None)
+    parser.add_argument("--jours", type=int, default=None, help="check : limiter aux N derniers jours")
+    asyncio.run(_main(parser.parse_args()))
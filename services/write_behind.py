@@ -0,0 +1,252 @@
+"""
+Écriture différée (write-behind) des données unitaires de POST /data/
+Les données acceptées sont déposées dans un tampon en mémoire ; une tâche de fond
+les écrit par groupes avec un insert_many non ordonné, dès que le groupe atteint
+WRITE_BEHIND_MAX_BATCH données ou que la plus ancienne attend depuis
+WRITE_BEHIND_MAX_DELAY_MS. Durabilité (WRITE_BEHIND_DURABILITY) :
+- commit : la requête attend l'écriture de son groupe (doublons signalés, sauf en
+  disposition timeseries qui n'a pas d'index unique, voir database/storage.py)
+- immediate : réponse dès la mise en tampon ; une donnée non écrite (doublon,
+  erreur, arrêt brutal du processus) est seulement comptée
+Le tampon est borné : au-delà de WRITE_BEHIND_MAX_PENDING, la requête reçoit une 503
+Les requêtes sont réveillées dès la fin de l'insert_many ; le travail post-commit
+(rollups, dernière valeur, alertes) tourne en tâche séparée sans retarder le groupe suivant
+"""
+import asyncio
+import logging
+import os
+from typing import List, Optional
+from bson import ObjectId
+from fastapi import HTTPException, status
+from pymongo.errors import BulkWriteError, PyMongoError
+from database.mongo import DUPLICATE_KEY_ERROR, db
+from database import storage
+from services.ingestion import STATUT_ACCEPTEE, STATUT_DOUBLON, STATUT_REJETEE, on_donnees_committed
+from utils.metrics import READINGS, WRITE_BEHIND_FLUSH_DURATION, WRITE_BEHIND_FLUSH_SIZE, WRITE_BEHIND_PENDING
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration de l'écriture différée
+WRITE_BEHIND_ENABLED = os.getenv("WRITE_BEHIND_ENABLED", "0") == "1"
+WRITE_BEHIND_MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "500"))
+WRITE_BEHIND_MAX_DELAY_MS = float(os.getenv("WRITE_BEHIND_MAX_DELAY_MS", "20"))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))
+WRITE_BEHIND_DURABILITY = os.getenv("WRITE_BEHIND_DURABILITY", "commit")
+
+# Modes de durabilité
+DURABILITY_COMMIT = "commit"
+DURABILITY_IMMEDIATE = "immediate"
+
+class WriteBehindBuffer:
+    """Tampon borné et tâche d'écriture par groupes"""
+
+    def __init__(
+        self,
+        max_batch: int = WRITE_BEHIND_MAX_BATCH,
+        max_delay_ms: float = WRITE_BEHIND_MAX_DELAY_MS,
+        max_pending: int = WRITE_BEHIND_MAX_PENDING,
+        durability: str = WRITE_BEHIND_DURABILITY
+    ):
+        if durability not in (DURABILITY_COMMIT, DURABILITY_IMMEDIATE):
+            raise ValueError(f"WRITE_BEHIND_DURABILITY invalide : {durability}")
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.max_pending = max_pending
+        self.durability = durability
+        self.queue: Optional[asyncio.Queue] = None
+        self.pending = 0
+        self._task = None
+        self._loop = None
+        self._post_commit = set()
+        self.counters = {
+            "recues": 0,
+            "ecrites": 0,
+            "doublons": 0,
+            "rejetees": 0,
+            "refusees": 0,
+            "groupes": 0,
+            "echecs_groupe": 0
+        }
+        self.taille_dernier_groupe = 0
+        self.duree_ms_dernier_groupe = 0.0
+        self.attente_ms_max = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    # 🚀 Cycle de vie
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._on_task_done)
+
+    async def stop(self):
+        """Écrire les données encore en tampon et terminer le travail post-commit avant de s'arrêter"""
+        if self._task is not None:
+            task, self._task = self._task, None
+            self.queue.put_nowait(None)
+            await asyncio.gather(task, return_exceptions=True)
+        if self._post_commit:
+            await asyncio.gather(*self._post_commit, return_exceptions=True)
+
+    def _on_task_done(self, task: asyncio.Task):
+        """
+        Tâche d'écriture terminée sans stop() (erreur inattendue) : libérer les requêtes
+        en attente (503) et repasser en écriture directe (running devient False)
+        """
+        if task is not self._task:
+            return
+        self._task = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("Arrêt de l'écriture différée", exc_info=task.exception())
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None and item[1] is not None and not item[1].done():
+                item[1].set_result(None)
+        self.pending = 0
+        WRITE_BEHIND_PENDING.set(0)
+
+    # 📥 Dépôt d'une donnée
+    async def submit(self, doc: dict) -> str:
+        """
+        Mettre une donnée en tampon ; son _id est attribué ici (réponse immédiate possible)
+        Retourne le statut d'écriture en mode commit, STATUT_ACCEPTEE en mode immediate
+        Lève une 503 si le tampon est plein ou, en mode commit, si le groupe n'a pas pu être écrit
+        """
+        if self._task is None or self.pending >= self.max_pending:
+            self.counters["refusees"] += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Trop de données en attente d'écriture, réessayez",
+                headers={"Retry-After": "1"}
+            )
+        doc.setdefault("_id", ObjectId())
+        future = self._loop.create_future() if self.durability == DURABILITY_COMMIT else None
+        self.pending += 1
+        self.counters["recues"] += 1
+        WRITE_BEHIND_PENDING.set(self.pending)
+        self.queue.put_nowait((doc, future, self._loop.time()))
+        if future is None:
+            return STATUT_ACCEPTEE
+        statut = await future
+        if statut is None:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Écriture de la donnée impossible, réessayez",
+                headers={"Retry-After": "1"}
+            )
+        return statut
+
+    # 🔁 Écriture par groupes
+    async def _run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            items = [item]
+            stopping = False
+            deadline = item[2] + self.max_delay
+            while len(items) < self.max_batch:
+                try:
+                    item = self.queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    remaining = deadline - self._loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+
+            self.pending -= len(items)
+            WRITE_BEHIND_PENDING.set(self.pending)
+            try:
+                await self.flush(items)
+            except Exception:
+                # Requêtes du groupe déjà libérées par flush ; le groupe suivant est traité
+                logger.exception("Échec inattendu d'un groupe de %d données", len(items))
+                self.counters["echecs_groupe"] += 1
+            if stopping:
+                # Données déposées entre l'arrêt et la fin du dernier groupe
+                restants = []
+                while not self.queue.empty():
+                    item = self.queue.get_nowait()
+                    if item is not None:
+                        restants.append(item)
+                if restants:
+                    self.pending -= len(restants)
+                    await self.flush(restants)
+                return
+
+    async def flush(self, items: List[tuple]):
+        """
+        Écrire un groupe en un insert_many non ordonné, résoudre aussitôt les requêtes
+        en attente (503 si l'écriture a échoué) puis lancer le travail post-commit
+        """
+        docs = [doc for doc, _, _ in items]
+        start = self._loop.time()
+        statuts: List[Optional[str]] = [None] * len(docs)
+        try:
+            try:
+                await db.ingest_collection().insert_many(storage.to_storage(docs), ordered=False)
+                statuts = [STATUT_ACCEPTEE] * len(docs)
+            except BulkWriteError as e:
+                statuts = [STATUT_ACCEPTEE] * len(docs)
+                for erreur in e.details.get("writeErrors", []):
+                    doublon = erreur.get("code") == DUPLICATE_KEY_ERROR
+                    statuts[erreur["index"]] = STATUT_DOUBLON if doublon else STATUT_REJETEE
+            except PyMongoError:
+                logger.exception("Échec d'écriture d'un groupe de %d données", len(docs))
+                self.counters["echecs_groupe"] += 1
+        finally:
+            for (_, future, _), statut in zip(items, statuts):
+                if future is not None and not future.done():
+                    future.set_result(statut)
+
+        duree = self._loop.time() - start
+        inseres = [doc for doc, statut in zip(docs, statuts) if statut == STATUT_ACCEPTEE]
+        doublons, rejetees = statuts.count(STATUT_DOUBLON), statuts.count(STATUT_REJETEE) + statuts.count(None)
+        self.counters["groupes"] += 1
+        self.counters["ecrites"] += len(inseres)
+        self.counters["doublons"] += doublons
+        self.counters["rejetees"] += rejetees
+        self.taille_dernier_groupe = len(docs)
+        self.duree_ms_dernier_groupe = round(duree * 1000, 2)
+        self.attente_ms_max = max(self.attente_ms_max, (start - items[0][2]) * 1000)
+        WRITE_BEHIND_FLUSH_SIZE.observe(len(docs))
+        WRITE_BEHIND_FLUSH_DURATION.observe(duree)
+        READINGS.labels(STATUT_DOUBLON).inc(doublons)
+        READINGS.labels(STATUT_REJETEE).inc(rejetees)
+
+        if inseres:
+            task = asyncio.create_task(on_donnees_committed(inseres))
+            self._post_commit.add(task)
+            task.add_done_callback(self._post_commit.discard)
+
+    def stats(self) -> dict:
+        return {
+            "actif": self.running,
+            "durabilite": self.durability,
+            "en_attente": self.pending,
+            "max_en_attente": self.max_pending,
+            "groupe_max": self.max_batch,
+            "delai_max_ms": self.max_delay * 1000,
+            **self.counters,
+            "taille_moyenne_groupe": round(
+                (self.counters["ecrites"] + self.counters["doublons"] + self.counters["rejetees"])
+                / self.counters["groupes"], 1
+            ) if self.counters["groupes"] else 0.0,
+            "taille_dernier_groupe": self.taille_dernier_groupe,
+            "duree_ms_dernier_groupe": self.duree_ms_dernier_groupe,
+            "attente_ms_max": round(self.attente_ms_max, 2),
+            "post_commit_en_cours": len(self._post_commit)
+        }
+
+# Instance utilisée par l'application
+write_behind = WriteBehindBuffer()
@@ -0,0 +1,9 @@
+"""
+Fixtures communes aux tests
+"""
+import pytest
+
+@pytest.fixture
+def anyio_backend():
+    # Tests asynchrones (@pytest.mark.anyio) sur asyncio uniquement, comme l'application
+    return "asyncio"
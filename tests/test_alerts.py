@@ -0,0 +1,104 @@
+"""
+Règles d'alerte (AlertEngine.evaluate) sans MongoDB : capteurs et collection alertes simulés
+"""
+from datetime import datetime, timedelta, timezone
+import pytest
+from services import alerts
+from services.alerts import AlertEngine
+
+ORIGINE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+class FakeAlertes:
+    def __init__(self):
+        self.inserees = []
+
+    async def insert_many(self, docs, ordered=True):
+        self.inserees.extend(docs)
+
+@pytest.fixture
+def seuils(monkeypatch):
+    """Seuil de chaque capteur, à renseigner par le test"""
+    seuils = {}
+
+    async def get_capteurs(capteur_ids):
+        return {c: {"owner_id": "u1", "seuil": seuils[c]} for c in capteur_ids if c in seuils}
+
+    monkeypatch.setattr(alerts, "get_capteurs", get_capteurs)
+    monkeypatch.setattr(alerts, "db", {"alertes": FakeAlertes()})
+    monkeypatch.setattr(alerts, "publish_committed", lambda event, docs: None)
+    return seuils
+
+def _donnees(valeurs, capteur_id="c1", debut=0, pas=10):
+    """Une donnée toutes les pas secondes à partir de debut"""
+    return [
+        {
+            "capteurId": capteur_id,
+            "valeur": valeur,
+            "timestamp": (ORIGINE + timedelta(seconds=debut + i * pas)).isoformat(),
+            "ts": ORIGINE + timedelta(seconds=debut + i * pas),
+            "owner_id": "u1"
+        }
+        for i, valeur in enumerate(valeurs)
+    ]
+
+@pytest.mark.anyio
+async def test_hysteresis_deduplicates_until_value_recovers(seuils):
+    seuils["c1"] = {"seuil_max": 30, "hysteresis": 3, "cooldown_seconds": 0}
+    engine = AlertEngine()
+    alertes = await engine.evaluate(_donnees([10, 31, 32, 29, 31, 25, 31]))
+    # 29 reste au-dessus de 30 - 3 : pas de réarmement, 25 réarme
+    assert [a["valeur"] for a in alertes] == [31, 31]
+    assert alertes[1]["ts"] == ORIGINE + timedelta(seconds=60)
+    assert engine.counters["dedupliquees"] == 2
+    assert alerts.db["alertes"].inserees == alertes
+
+@pytest.mark.anyio
+async def test_consecutive_breaches_are_required(seuils):
+    seuils["c1"] = {"seuil_min": 5, "consecutifs": 3, "cooldown_seconds": 0}
+    engine = AlertEngine()
+    alertes = await engine.evaluate(_donnees([1, 1, 8, 1, 1]))
+    assert alertes == []
+    # Le compteur continue d'un lot à l'autre
+    alertes = await engine.evaluate(_donnees([2], debut=50))
+    assert [(a["regle"], a["valeur"]) for a in alertes] == [("min", 2)]
+
+@pytest.mark.anyio
+async def test_cooldown_suppresses_realerts(seuils):
+    seuils["c1"] = {"seuil_max": 30, "cooldown_seconds": 60}
+    engine = AlertEngine()
+    # Réarmée à 20 mais nouvelle alerte 20 s après la première : retenue
+    alertes = await engine.evaluate(_donnees([31, 20, 31]))
+    assert len(alertes) == 1
+    assert engine.counters["cooldown"] == 1
+    alertes = await engine.evaluate(_donnees([20, 31], debut=90))
+    assert [a["ts"] for a in alertes] == [ORIGINE + timedelta(seconds=100)]
+
+@pytest.mark.anyio
+async def test_variation_uses_previous_batch(seuils):
+    seuils["c1"] = {"variation_max": 1.0, "cooldown_seconds": 0}
+    engine = AlertEngine()
+    assert await engine.evaluate(_donnees([10, 15], pas=10)) == []
+    # 15 → 30 en 5 s : 3/s
+    alertes = await engine.evaluate(_donnees([30], debut=15))
+    assert [a["regle"] for a in alertes] == ["variation"]
+    assert "3/s" in alertes[0]["message"]
+
+@pytest.mark.anyio
+async def test_capteur_without_seuil_is_ignored(seuils):
+    engine = AlertEngine()
+    assert await engine.evaluate(_donnees([1000], capteur_id="inconnu")) == []
+    assert engine.counters["evaluees"] == 1
+    assert "inconnu" not in engine.states
+
+@pytest.mark.anyio
+async def test_states_are_bounded_and_forgotten(seuils):
+    for capteur_id in ("a", "b", "c"):
+        seuils[capteur_id] = {"seuil_max": 30}
+    engine = AlertEngine(states_maxsize=2)
+    for capteur_id in ("a", "b", "a", "c"):
+        await engine.evaluate(_donnees([1], capteur_id=capteur_id))
+    # b, le moins récemment évalué, est oublié
+    assert list(engine.states) == ["a", "c"]
+    assert engine.counters["etats_oublies"] == 1
+    engine.forget("a")
+    assert list(engine.states) == ["c"]
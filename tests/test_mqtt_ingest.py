@@ -0,0 +1,119 @@
+"""
+Worker MQTT contre un client factice injecté par client_factory (pas de broker) :
+mise en file, abandons quand la file est pleine et écriture en micro-lots
+"""
+import asyncio
+import json
+import threading
+import pytest
+from services import mqtt_ingest
+from services.mqtt_ingest import MqttIngestWorker
+
+class FakeMessage:
+    def __init__(self, topic, payload):
+        self.topic = topic
+        self.payload = payload
+
+class FakeClient:
+    """Remplace paho : connect_async déclenche on_connect, publish appelle on_message depuis un thread"""
+
+    def __init__(self):
+        self.on_connect = None
+        self.on_message = None
+        self.subscriptions = []
+        self.connected = False
+
+    def connect_async(self, host, port):
+        self.connected = True
+
+    def loop_start(self):
+        reason = type("Reason", (), {"is_failure": False})()
+        self.on_connect(self, None, None, reason, None)
+
+    def loop_stop(self):
+        pass
+
+    def disconnect(self):
+        self.connected = False
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append((topic, qos))
+
+    def publish(self, capteur_id, valeur, seconde=0):
+        """Livrer un message depuis un thread, comme le thread réseau de paho"""
+        payload = json.dumps({"valeur": valeur, "timestamp": f"2024-01-01T00:00:{seconde:02d}Z"}).encode()
+        thread = threading.Thread(
+            target=self.on_message, args=(self, None, FakeMessage(f"iot/{capteur_id}/data", payload))
+        )
+        thread.start()
+        thread.join()
+
+class Lots(list):
+    """Lots écrits ; ouvert bloque l'écriture tant qu'il n'est pas positionné"""
+
+@pytest.fixture
+def lots(monkeypatch):
+    """Remplacer l'écriture MongoDB par l'enregistrement des lots"""
+    lots = Lots()
+    lots.ouvert = asyncio.Event()
+    lots.ouvert.set()
+
+    async def fake_ingest(donnees):
+        await lots.ouvert.wait()
+        lots.append(donnees)
+        return {"acceptees": len(donnees), "doublons": 0, "rejetees": 0}
+
+    monkeypatch.setattr(mqtt_ingest, "ingest_donnees", fake_ingest)
+    return lots
+
+@pytest.mark.anyio
+async def test_messages_are_buffered_and_flushed_in_batches(lots):
+    client = FakeClient()
+    worker = MqttIngestWorker(client_factory=lambda: client, flush_size=3, flush_interval=0.05)
+    await worker.start()
+    assert client.subscriptions == [("iot/+/data", 1)]
+
+    for i in range(7):
+        await asyncio.to_thread(client.publish, "c1", float(i), i)
+    await worker.stop()
+
+    assert [d.valeur for lot in lots for d in lot] == [float(i) for i in range(7)]
+    assert all(len(lot) <= 3 for lot in lots)
+    assert all(d.capteurId == "c1" for lot in lots for d in lot)
+    stats = worker.stats()
+    assert stats["recus"] == 7 and stats["acceptes"] == 7 and stats["abandonnes"] == 0
+    assert stats["lots"] == len(lots)
+
+@pytest.mark.anyio
+async def test_invalid_messages_are_counted_not_queued(lots):
+    client = FakeClient()
+    worker = MqttIngestWorker(client_factory=lambda: client)
+    await worker.start()
+    assert not worker.handle_message("iot/c1/autre", b'{"valeur": 1}')
+    assert not worker.handle_message("iot/c1/data", b"pas du json")
+    assert not worker.handle_message("iot/c1/data", b'{"timestamp": "2024-01-01T00:00:00Z"}')
+    await worker.stop()
+    assert worker.stats()["invalides"] == 3
+    assert lots == []
+
+@pytest.mark.anyio
+async def test_full_queue_drops_messages_then_flushes_the_rest(lots):
+    client = FakeClient()
+    worker = MqttIngestWorker(
+        client_factory=lambda: client, queue_maxsize=2, flush_size=1, enqueue_timeout=0.05
+    )
+    lots.ouvert.clear()
+    await worker.start()
+
+    # Écriture bloquée : un message est retenu par le flusher, deux remplissent la file
+    for i in range(6):
+        await asyncio.to_thread(client.publish, "c1", float(i), i)
+    stats = worker.stats()
+    assert stats["recus"] == 6
+    assert stats["abandonnes"] == 3
+    assert stats["file"] == 2
+
+    lots.ouvert.set()
+    await worker.stop()
+    assert sum(len(lot) for lot in lots) == 3
+    assert worker.stats()["acceptes"] == 3
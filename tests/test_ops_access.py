@@ -0,0 +1,41 @@
+"""
+Accès aux routes d'exploitation : désactivées, jeton partagé ou publiques
+"""
+import httpx
+import pytest
+from fastapi import Depends, FastAPI
+from utils import security
+from utils.security import require_ops_access
+
+def _app():
+    app = FastAPI()
+
+    @app.get("/cache/stats", dependencies=[Depends(require_ops_access)])
+    async def stats():
+        return {"ok": True}
+
+    return app
+
+async def _get(headers=None):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=_app()), base_url="http://t") as client:
+        return await client.get("/cache/stats", headers=headers)
+
+@pytest.mark.anyio
+async def test_ops_routes_are_disabled_without_token(monkeypatch):
+    monkeypatch.setattr(security, "OPS_TOKEN", None)
+    monkeypatch.setattr(security, "OPS_PUBLIC", False)
+    assert (await _get()).status_code == 404
+
+@pytest.mark.anyio
+async def test_ops_routes_require_the_shared_token(monkeypatch):
+    monkeypatch.setattr(security, "OPS_TOKEN", "s3cret")
+    monkeypatch.setattr(security, "OPS_PUBLIC", False)
+    assert (await _get()).status_code == 401
+    assert (await _get({"Authorization": "Bearer autre"})).status_code == 401
+    assert (await _get({"Authorization": "Bearer s3cret"})).status_code == 200
+
+@pytest.mark.anyio
+async def test_ops_routes_can_be_public(monkeypatch):
+    monkeypatch.setattr(security, "OPS_TOKEN", None)
+    monkeypatch.setattr(security, "OPS_PUBLIC", True)
+    assert (await _get()).status_code == 200
@@ -0,0 +1,41 @@
+"""
+Raisons de fermeture des abonnements temps réel
+"""
+import pytest
+from services.pubsub import FERMETURE_ARRET, FERMETURE_CLIENT, FERMETURE_LENT, PubSubHub, SubscriptionClosed
+
+def _event(owner_id="u1"):
+    return {"type": "donnee", "owner_id": owner_id, "capteurId": "c1"}
+
+async def _raison(sub) -> str:
+    with pytest.raises(SubscriptionClosed) as e:
+        await sub.get()
+    return e.value.raison
+
+@pytest.mark.anyio
+async def test_slow_consumer_is_closed_as_slow():
+    hub = PubSubHub(queue_size=2, max_drops=3)
+    sub = hub.subscribe("u1")
+    for _ in range(5):
+        hub.publish(_event())
+    assert await _raison(sub) == FERMETURE_LENT
+    assert hub.stats()["deconnectes_lents"] == 1
+
+@pytest.mark.anyio
+async def test_shutdown_reason_differs_from_slow_consumer():
+    hub = PubSubHub()
+    sub = hub.subscribe("u1")
+    hub.close_all()
+    assert await _raison(sub) == FERMETURE_ARRET
+    assert hub.stats()["deconnectes_lents"] == 0
+
+@pytest.mark.anyio
+async def test_first_close_reason_is_kept():
+    hub = PubSubHub()
+    sub = hub.subscribe("u1")
+    hub.close_all()
+    hub.unsubscribe(sub)
+    assert await _raison(sub) == FERMETURE_ARRET
+    autre = hub.subscribe("u2")
+    hub.unsubscribe(autre)
+    assert await _raison(autre) == FERMETURE_CLIENT
@@ -0,0 +1,221 @@
+"""
+Limitation de débit (backend memory) et limiteur global, sans MongoDB
+"""
+import asyncio
+from collections import Counter
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from pymongo.errors import BulkWriteError
+from utils import rate_limit
+from utils.rate_limit import AdmissionController, AdmissionMiddleware, MemoryBuckets, MongoBuckets, RateLimiter
+
+class FakeClock:
+    """Horloge manuelle substituée à time.monotonic dans utils.rate_limit"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+@pytest.fixture
+def limites(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_CAPTEUR_PER_SECOND", 5.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_CAPTEUR_BURST", 10.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_USER_PER_SECOND", 1000.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_USER_BURST", 2000.0)
+
+async def _statut(limiter, user_id, capteurs):
+    try:
+        await limiter.check(user_id, capteurs)
+        return 200, None
+    except HTTPException as e:
+        return e.status_code, e.headers.get("Retry-After")
+
+# 🪣 Seaux
+@pytest.mark.anyio
+async def test_bucket_refills_over_time(clock):
+    buckets = MemoryBuckets()
+    assert await buckets.acquire(["k"], 2.0, 2.0) == ([], 0.0)
+    assert await buckets.acquire(["k"], 2.0, 2.0) == ([], 0.0)
+    refuses, retry_after = await buckets.acquire(["k"], 2.0, 2.0)
+    assert refuses == ["k"] and retry_after == pytest.approx(0.5)
+    clock.now += 0.5
+    assert await buckets.acquire(["k"], 2.0, 2.0) == ([], 0.0)
+
+@pytest.mark.anyio
+async def test_bucket_is_all_or_nothing(clock):
+    buckets = MemoryBuckets()
+    await buckets.acquire(["vide"], 1.0, 1.0)
+    refuses, _ = await buckets.acquire(["plein", "vide"], 1.0, 1.0)
+    assert refuses == ["vide"]
+    # Le seau plein n'a pas été débité par la requête refusée
+    assert await buckets.acquire(["plein"], 1.0, 1.0) == ([], 0.0)
+
+@pytest.mark.anyio
+async def test_least_recently_used_buckets_are_forgotten(clock):
+    buckets = MemoryBuckets(max_keys=2)
+    for key in ("a", "b", "c"):
+        await buckets.acquire([key], 1.0, 1.0)
+    assert len(buckets) == 2
+
+# 🚦 Limiteur des routes d'ingestion
+@pytest.mark.anyio
+async def test_noisy_device_gets_429_with_retry_after(clock, limites):
+    limiter = RateLimiter(backend="memory", enabled=True)
+    statuts = [await _statut(limiter, "u1", ["bruyant"]) for _ in range(15)]
+    assert [code for code, _ in statuts].count(200) == 10
+    assert statuts[-1] == (429, "1")
+    assert limiter.stats()["refus"]["capteur"] == 5
+
+@pytest.mark.anyio
+async def test_polite_devices_are_never_rejected_next_to_a_noisy_one(clock, limites):
+    limiter = RateLimiter(backend="memory", enabled=True)
+    polis = [f"poli-{i}" for i in range(20)]
+    refus_polis, acceptees_bruyant = 0, 0
+    # 10 s simulées : le voisin envoie 100 requêtes par seconde, chaque poli 2
+    for tick in range(1000):
+        clock.now += 0.01
+        code, _ = await _statut(limiter, "bruyant", ["capteur-bruyant"])
+        acceptees_bruyant += code == 200
+        if tick % 50 == 0:
+            for capteur in polis:
+                code, _ = await _statut(limiter, "poli", [capteur])
+                refus_polis += code != 200
+    assert refus_polis == 0
+    # Rafale puis débit soutenu : 10 + 5/s pendant 10 s
+    assert acceptees_bruyant == pytest.approx(10 + 5 * 10, abs=2)
+
+@pytest.mark.anyio
+async def test_rejected_request_consumes_no_token(clock, limites, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_CAPTEUR_BURST", 1.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_USER_BURST", 3.0)
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_USER_PER_SECOND", 0.001)
+    limiter = RateLimiter(backend="memory", enabled=True)
+    statuts = [(await _statut(limiter, "u1", ["vide"]))[0] for _ in range(10)]
+    assert statuts == [200] + [429] * 9
+    # Jeton utilisateur rendu à chaque refus capteur : il en reste 2 sur 3
+    assert limiter.stats()["refus"] == {"capteur": 9, "utilisateur": 0}
+    assert (await _statut(limiter, "u1", ["autre-1"]))[0] == 200
+    assert (await _statut(limiter, "u1", ["autre-2"]))[0] == 200
+    assert (await _statut(limiter, "u1", ["autre-3"]))[0] == 429
+
+@pytest.mark.anyio
+async def test_distinct_capteurs_charged_per_request_are_capped(clock, limites, monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_MAX_CAPTEURS_PER_REQUEST", 5)
+    limiter = RateLimiter(backend="memory", enabled=True)
+    await limiter.check("u1", [f"c{i}" for i in range(100)])
+    assert limiter.stats()["seaux_en_memoire"] == 1 + 5
+
+@pytest.mark.anyio
+async def test_noisy_neighbor_excess_never_reaches_the_pool(clock, limites):
+    """
+    Écritures comptées à l'entrée du pool MongoDB (horloge figée : aucune recharge) :
+    sans limite, les 300 requêtes du voisin y passent devant les appareils polis ;
+    avec la limite, seule sa rafale y parvient et les appareils polis passent tous
+    """
+
+    async def rafale(enabled: bool):
+        limiter = RateLimiter(backend="memory", enabled=enabled)
+        ecritures = Counter()
+        app = FastAPI()
+
+        @app.post("/data/{user_id}/{capteur_id}")
+        async def save(user_id: str, capteur_id: str):
+            await limiter.check(user_id, [capteur_id])
+            ecritures[user_id] += 1
+            return {"ok": True}
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://t") as client:
+            reponses = await asyncio.gather(
+                *(client.post("/data/bruyant/capteur-bruyant") for _ in range(300)),
+                *(client.post(f"/data/poli/poli-{i}") for i in range(5))
+            )
+        statuts = Counter((r.url.path.split("/")[2], r.status_code) for r in reponses)
+        return ecritures, statuts
+
+    ecritures, statuts = await rafale(enabled=False)
+    assert ecritures == {"bruyant": 300, "poli": 5}
+    ecritures, statuts = await rafale(enabled=True)
+    assert ecritures == {"bruyant": 10, "poli": 5}
+    assert statuts == {("bruyant", 200): 10, ("bruyant", 429): 290, ("poli", 200): 5}
+
+class FakeRateLimits:
+    """Collection rate_limits : refuse en clé dupliquée les _id listés, un appel chacun"""
+
+    def __init__(self, refus):
+        self.refus = list(refus)
+        self.appels, self.rendus = [], []
+
+    async def bulk_write(self, operations, ordered=True):
+        keys = [op._filter["_id"] for op in operations]
+        self.appels.append(keys)
+        refus = self.refus.pop(0) if self.refus else set()
+        erreurs = [{"index": i, "code": rate_limit.DUPLICATE_KEY_ERROR} for i, key in enumerate(keys) if key in refus]
+        if erreurs:
+            raise BulkWriteError({"writeErrors": erreurs})
+
+    async def update_many(self, filter, update):
+        self.rendus.extend(filter["_id"]["$in"])
+
+@pytest.mark.anyio
+async def test_mongo_bucket_creation_race_is_retried(monkeypatch):
+    # Upsert perdu sur un seau neuf : accepté au second essai, rien n'est rendu
+    collection = FakeRateLimits([{"b"}])
+    monkeypatch.setattr(rate_limit, "db", {"rate_limits": collection})
+    assert await MongoBuckets().acquire(["a", "b"], 1.0, 1.0) == ([], 0.0)
+    assert collection.appels == [["a", "b"], ["b"]]
+    assert collection.rendus == []
+
+@pytest.mark.anyio
+async def test_mongo_empty_bucket_is_refused_after_retry(monkeypatch):
+    collection = FakeRateLimits([{"b"}, {"b"}])
+    monkeypatch.setattr(rate_limit, "db", {"rate_limits": collection})
+    assert await MongoBuckets().acquire(["a", "b"], 2.0, 1.0) == (["b"], 0.5)
+    # Tout ou rien : le jeton pris dans « a » est rendu
+    assert collection.rendus == ["a"]
+
+# 🛡 Limiteur global
+def _app(controller: AdmissionController):
+    async def endpoint(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+    return AdmissionMiddleware(endpoint, controller=controller)
+
+async def _get(controller, path="/data/c1"):
+    transport = httpx.ASGITransport(app=_app(controller))
+    async with httpx.AsyncClient(transport=transport, base_url="http://t") as client:
+        return await client.get(path)
+
+@pytest.mark.anyio
+async def test_admission_accepts_when_healthy(monkeypatch):
+    monkeypatch.setattr(rate_limit.pool_stats, "recent_wait_ms", lambda window=1.0: 0.0)
+    controller = AdmissionController()
+    response = await _get(controller)
+    assert response.status_code == 200
+    assert controller.in_flight == 0
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("raison", ["concurrence", "attente_pool", "retard_boucle"])
+async def test_admission_sheds_load_with_503(monkeypatch, raison):
+    attente = rate_limit.ADMISSION_MAX_POOL_WAIT_MS + 1 if raison == "attente_pool" else 0.0
+    monkeypatch.setattr(rate_limit.pool_stats, "recent_wait_ms", lambda window=1.0: attente)
+    controller = AdmissionController()
+    if raison == "concurrence":
+        controller.in_flight = rate_limit.ADMISSION_MAX_IN_FLIGHT
+    if raison == "retard_boucle":
+        controller.loop_lag_ms = rate_limit.ADMISSION_MAX_LOOP_LAG_MS + 1
+
+    response = await _get(controller)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert controller.stats()["refus"][raison] == 1
+    # Les sondes passent toujours
+    assert (await _get(controller, "/health/ready")).status_code == 200
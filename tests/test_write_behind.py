@@ -0,0 +1,90 @@
+"""
+Écriture différée sans MongoDB : collection et travail post-commit remplacés
+"""
+import asyncio
+import pytest
+from fastapi import HTTPException
+from services import write_behind as wb
+from services.ingestion import STATUT_ACCEPTEE
+from services.write_behind import WriteBehindBuffer
+
+class FakeCollection:
+    def __init__(self, erreur=None):
+        self.erreur = erreur
+        self.inserts = []
+
+    async def insert_many(self, docs, ordered=True):
+        if self.erreur is not None:
+            raise self.erreur
+        self.inserts.append(docs)
+
+class FakeDb:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def ingest_collection(self):
+        return self.collection
+
+@pytest.fixture
+def post_commit(monkeypatch):
+    """Travail post-commit bloqué tant que libre n'est pas positionné"""
+    libre = asyncio.Event()
+
+    async def fake_on_donnees_committed(docs):
+        await libre.wait()
+
+    monkeypatch.setattr(wb, "on_donnees_committed", fake_on_donnees_committed)
+    return libre
+
+def _doc(i):
+    return {"capteurId": "c1", "valeur": float(i), "timestamp": f"2024-01-01T00:00:{i:02d}Z", "owner_id": "u"}
+
+@pytest.mark.anyio
+async def test_commit_resolves_before_post_commit_work(monkeypatch, post_commit):
+    collection = FakeCollection()
+    monkeypatch.setattr(wb, "db", FakeDb(collection))
+    buffer = WriteBehindBuffer(max_delay_ms=1)
+    await buffer.start()
+
+    statut = await asyncio.wait_for(buffer.submit(_doc(1)), 1)
+    assert statut == STATUT_ACCEPTEE
+    assert buffer.stats()["post_commit_en_cours"] == 1
+
+    post_commit.set()
+    await buffer.stop()
+    assert buffer.stats()["post_commit_en_cours"] == 0
+    assert len(collection.inserts) == 1
+
+@pytest.mark.anyio
+async def test_unexpected_error_fails_the_group_and_keeps_writing(monkeypatch, post_commit):
+    post_commit.set()
+    collection = FakeCollection(erreur=RuntimeError("boom"))
+    monkeypatch.setattr(wb, "db", FakeDb(collection))
+    buffer = WriteBehindBuffer(max_delay_ms=1)
+    await buffer.start()
+
+    with pytest.raises(HTTPException) as erreur:
+        await asyncio.wait_for(buffer.submit(_doc(1)), 1)
+    assert erreur.value.status_code == 503
+
+    collection.erreur = None
+    assert await asyncio.wait_for(buffer.submit(_doc(2)), 1) == STATUT_ACCEPTEE
+    assert buffer.stats()["echecs_groupe"] == 1
+    await buffer.stop()
+
+@pytest.mark.anyio
+async def test_dead_task_releases_waiters_and_stops_running(monkeypatch, post_commit):
+    monkeypatch.setattr(wb, "db", FakeDb(FakeCollection()))
+    buffer = WriteBehindBuffer(max_delay_ms=1000)
+
+    async def crash():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(buffer, "_run", crash)
+    await buffer.start()
+    with pytest.raises(HTTPException) as erreur:
+        await asyncio.wait_for(buffer.submit(_doc(1)), 1)
+    assert erreur.value.status_code == 503
+    assert not buffer.running
+    assert buffer.stats()["en_attente"] == 0
@@ -0,0 +1,142 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+# Valeur sentinelle pour distinguer "absent du cache" d'une valeur None en cache
+_MISSING = object()
+
+def _consume_exception(task: asyncio.Task):
+    """Éviter l'avertissement asyncio quand aucune requête n'attend plus le chargement"""
+    if not task.cancelled():
+        task.exception()
+
+class TTLCache:
+    """
+    Cache en mémoire borné (LRU) avec expiration (TTL) et compteurs
+    get_or_load regroupe les chargements concurrents d'une même clé (single-flight) :
+    un seul appel au loader, les autres requêtes attendent son résultat
+    generation augmente à chaque invalidation : un chargement hors get_or_load relève
+    la génération avant de lire la base et la passe à set, qui ignore alors un
+    résultat lu avant une invalidation
+    """
+
+    def __init__(self, maxsize: int, ttl: float, name: str = "cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.generation = 0
+        self.stale_sets = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # 🔍 Lecture
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """Retourner la valeur en cache, ou default si absente ou expirée"""
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    # ✏ Écriture
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None):
+        """
+        Stocker une valeur ; évince l'entrée la moins récemment utilisée si plein
+        Avec generation : ne rien stocker si une invalidation a eu lieu depuis
+        """
+        if self.maxsize <= 0:
+            return
+        if generation is not None and generation != self.generation:
+            self.stale_sets += 1
+            return
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    # 🗑 Invalidation
+    def invalidate(self, key: Hashable):
+        """Retirer une clé ; un chargement en cours pour cette clé ne sera pas stocké"""
+        self._data.pop(key, None)
+        self._inflight.pop(key, None)
+        self.invalidations += 1
+        self.generation += 1
+
+    def clear(self):
+        self._data.clear()
+        self._inflight.clear()
+        self.generation += 1
+
+    # ⚡ Lecture avec chargement regroupé
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        none_ttl: Optional[float] = None
+    ) -> Any:
+        """
+        Retourner la valeur en cache ou la charger via loader
+        Un résultat None n'est mis en cache que si none_ttl est fourni (cache négatif)
+        """
+        value = self.get(key)
+        if value is not _MISSING:
+            return value
+
+        # Le chargement tourne dans sa propre tâche : l'annulation d'une requête
+        # en attente n'interrompt pas le chargement partagé
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader, ttl, none_ttl))
+            task.add_done_callback(_consume_exception)
+            self._inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader, ttl, none_ttl):
+        try:
+            value = await loader()
+        finally:
+            # Une invalidation pendant le chargement rend le résultat obsolète
+            current = self._inflight.get(key) is asyncio.current_task()
+            if current:
+                del self._inflight[key]
+        if current:
+            if value is not None:
+                self.set(key, value, ttl)
+            elif none_ttl:
+                self.set(key, value, none_ttl)
+        return value
+
+    # 📊 Statistiques
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "nom": self.name,
+            "taille": len(self._data),
+            "taille_max": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "ecritures_obsoletes": self.stale_sets
+        }
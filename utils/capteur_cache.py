@@ -0,0 +1,140 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, Optional
+from fastapi import HTTPException, status
+from pymongo.errors import PyMongoError
+from database.mongo import db
+from utils.cache import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration du cache des capteurs (propriétaire + règles d'alerte)
+CAPTEUR_CACHE_MAXSIZE = 50000
+CAPTEUR_CACHE_TTL_SECONDS = 300
+CAPTEUR_CACHE_NEGATIVE_TTL_SECONDS = 5
+CAPTEUR_CACHE_CHANGE_STREAM = os.getenv("CAPTEUR_CACHE_CHANGE_STREAM", "0") == "1"
+
+capteur_cache = TTLCache(
+    maxsize=CAPTEUR_CACHE_MAXSIZE,
+    ttl=CAPTEUR_CACHE_TTL_SECONDS,
+    name="capteurs"
+)
+
+# Champs des règles d'alerte conservés dans le cache (voir models.schemas.Seuil)
+SEUIL_FIELDS = ("seuil_max", "seuil_min", "variation_max", "hysteresis", "consecutifs", "cooldown_seconds")
+SEUIL_PROJECTION = {field: 1 for field in SEUIL_FIELDS}
+
+def _entry(capteur_id: str, owner_id: str, seuil: Optional[dict]) -> dict:
+    return {
+        "capteurId": capteur_id,
+        "owner_id": owner_id,
+        "seuil": {field: seuil.get(field) for field in SEUIL_FIELDS} if seuil else None
+    }
+
+async def _load_capteur(capteur_id: str) -> Optional[dict]:
+    """Charger le propriétaire et les règles d'alerte d'un capteur depuis MongoDB"""
+    objet = await db["objets"].find_one({"capteurId": capteur_id}, {"utilisateur": 1})
+    if objet is None:
+        return None
+    seuil = await db["seuils"].find_one(
+        {"capteurId": capteur_id, "owner_id": objet["utilisateur"]},
+        SEUIL_PROJECTION
+    )
+    return _entry(capteur_id, objet["utilisateur"], seuil)
+
+# 🔍 Lecture
+async def get_capteur(capteur_id: str) -> Optional[dict]:
+    """Retourner {capteurId, owner_id, seuil} ou None si le capteur n'existe pas"""
+    return await capteur_cache.get_or_load(
+        capteur_id,
+        lambda: _load_capteur(capteur_id),
+        none_ttl=CAPTEUR_CACHE_NEGATIVE_TTL_SECONDS
+    )
+
+async def get_capteurs(capteur_ids: Iterable[str]) -> Dict[str, dict]:
+    """
+    Version groupée de get_capteur pour l'ingestion par lot
+    Les absents du cache sont chargés en deux requêtes ($in sur objets puis seuils) ;
+    le résultat n'est pas mis en cache si une invalidation survient pendant le chargement
+    """
+    trouves, manquants = {}, []
+    for capteur_id in set(capteur_ids):
+        entry = capteur_cache.get(capteur_id, default=False)
+        if entry is False:
+            manquants.append(capteur_id)
+        elif entry is not None:
+            trouves[capteur_id] = entry
+    if not manquants:
+        return trouves
+
+    generation = capteur_cache.generation
+    proprietaires = {}
+    cursor = db["objets"].find({"capteurId": {"$in": manquants}}, {"capteurId": 1, "utilisateur": 1})
+    async for doc in cursor:
+        proprietaires[doc["capteurId"]] = doc["utilisateur"]
+
+    seuils = {}
+    if proprietaires:
+        cursor = db["seuils"].find(
+            {"capteurId": {"$in": list(proprietaires)}},
+            {"capteurId": 1, "owner_id": 1, **SEUIL_PROJECTION}
+        )
+        async for doc in cursor:
+            if doc.get("owner_id") == proprietaires[doc["capteurId"]]:
+                seuils[doc["capteurId"]] = doc
+
+    for capteur_id in manquants:
+        if capteur_id in proprietaires:
+            entry = _entry(capteur_id, proprietaires[capteur_id], seuils.get(capteur_id))
+            capteur_cache.set(capteur_id, entry, generation=generation)
+            trouves[capteur_id] = entry
+        else:
+            capteur_cache.set(capteur_id, None, CAPTEUR_CACHE_NEGATIVE_TTL_SECONDS, generation=generation)
+    return trouves
+
+# 🔒 Vérification de propriété
+async def check_capteur_owner(capteur_id: str, user_id: str) -> dict:
+    """
+    Vérifier que l'utilisateur possède ce capteur
+    Lève une 403 sinon, retourne l'entrée du cache (avec les règles) si oui
+    """
+    capteur = await get_capteur(capteur_id)
+    if capteur is None or capteur["owner_id"] != user_id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Capteur non trouvé ou non autorisé"
+        )
+    return capteur
+
+# 🗑 Invalidation (appelée par les routes qui modifient objets et seuils)
+def invalidate_capteur(capteur_id: str):
+    capteur_cache.invalidate(capteur_id)
+
+# 🔄 Synchronisation multi-workers via change stream
+async def watch_capteur_changes():
+    """
+    Invalider le cache à chaque modification d'objets ou de seuils, quel que soit
+    le worker à l'origine de l'écriture (nécessite un replica set MongoDB)
+    """
+    pipeline = [{"$match": {"ns.coll": {"$in": ["objets", "seuils"]}}}]
+    delay = 1
+    while True:
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                delay = 1
+                async for change in stream:
+                    document = change.get("fullDocument")
+                    if document and "capteurId" in document:
+                        invalidate_capteur(document["capteurId"])
+                    else:
+                        # Suppression : le capteurId n'est plus disponible
+                        capteur_cache.clear()
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            logger.warning("Change stream capteurs interrompu (%s), reprise dans %ss", e, delay)
+            # Le cache peut avoir manqué des modifications pendant la coupure
+            capteur_cache.clear()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
@@ -0,0 +1,147 @@
+"""
+Jetons d'appareil : identifiants longue durée limités à un capteurId
+Le jeton JWT signé porte déjà le propriétaire et le capteur : la route d'ingestion
+autorise une donnée sans lire users ni objets. La révocation passe par un
+ensemble en mémoire des identifiants (jti) révoqués, rechargé périodiquement
+"""
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Set
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from jose import JWTError, jwt
+from pymongo.errors import PyMongoError
+from database.mongo import db
+from utils.metrics import AUTH_FAILURES
+from utils.security import ALGORITHM, SECRET_KEY
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration des jetons d'appareil
+DEVICE_TOKEN_TYPE = "device"
+DEVICE_TOKEN_EXPIRE_DAYS = 365
+REVOCATION_REFRESH_SECONDS = 30
+
+device_security = HTTPBearer()
+
+class RevocationSet:
+    """
+    jti révoqués, stockés sur 16 octets (uuid) : ~100 octets par entrée en mémoire
+    Seuls les jetons révoqués non expirés y figurent
+    """
+
+    def __init__(self):
+        self._jtis: Set[bytes] = set()
+        self.synced_at: Optional[datetime] = None
+
+    @staticmethod
+    def _key(jti: str) -> bytes:
+        return uuid.UUID(hex=jti).bytes
+
+    def add(self, jti: str):
+        self._jtis.add(self._key(jti))
+
+    def __contains__(self, jti: str) -> bool:
+        try:
+            return self._key(jti) in self._jtis
+        except ValueError:
+            # jti mal formé : considéré comme révoqué
+            return True
+
+    def __len__(self) -> int:
+        return len(self._jtis)
+
+    def replace(self, jtis):
+        self._jtis = {self._key(jti) for jti in jtis}
+
+# Instance utilisée par l'application
+revoked_tokens = RevocationSet()
+
+# 🔐 Émission
+async def create_device_token(capteur_id: str, owner_id: str, nom: Optional[str] = None) -> dict:
+    """Créer un jeton d'appareil ; seule sa description est conservée en base"""
+    jti = uuid.uuid4().hex
+    emis = datetime.now(timezone.utc)
+    expire = emis + timedelta(days=DEVICE_TOKEN_EXPIRE_DAYS)
+    token = jwt.encode(
+        {"typ": DEVICE_TOKEN_TYPE, "jti": jti, "cap": capteur_id, "own": owner_id, "exp": expire},
+        SECRET_KEY,
+        algorithm=ALGORITHM
+    )
+    await db["device_tokens"].insert_one({
+        "_id": jti,
+        "capteurId": capteur_id,
+        "owner_id": owner_id,
+        "nom": nom,
+        "created_at": emis,
+        "expires_at": expire,
+        "revoked_at": None
+    })
+    return {"token": token, "jti": jti, "capteurId": capteur_id, "expires_at": expire.isoformat()}
+
+# 🚫 Révocation
+async def revoke_device_tokens(query: dict) -> int:
+    """Révoquer les jetons correspondant à query (owner_id inclus par l'appelant)"""
+    query = {**query, "revoked_at": None}
+    jtis = [doc["_id"] async for doc in db["device_tokens"].find(query, {"_id": 1})]
+    if not jtis:
+        return 0
+    await db["device_tokens"].update_many(
+        {"_id": {"$in": jtis}},
+        {"$set": {"revoked_at": datetime.now(timezone.utc)}}
+    )
+    for jti in jtis:
+        revoked_tokens.add(jti)
+    return len(jtis)
+
+async def load_revocations():
+    """Recharger les jti révoqués et non expirés (démarrage, puis périodiquement)"""
+    cursor = db["device_tokens"].find(
+        {"revoked_at": {"$ne": None}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 1}
+    )
+    revoked_tokens.replace([doc["_id"] async for doc in cursor])
+    revoked_tokens.synced_at = datetime.now(timezone.utc)
+
+async def refresh_revocations():
+    """Synchroniser les révocations faites par d'autres workers"""
+    while True:
+        await asyncio.sleep(REVOCATION_REFRESH_SECONDS)
+        try:
+            await load_revocations()
+        except PyMongoError as e:
+            logger.warning("Rechargement des révocations impossible (%s)", e)
+
+# 📟 Appareil courant
+def decode_device_token(token: str) -> dict:
+    """Vérifier signature, type, expiration et révocation ; aucune requête MongoDB"""
+    try:
+        return _decode_device_token(token)
+    except HTTPException:
+        AUTH_FAILURES.labels("device").inc()
+        raise
+
+def _decode_device_token(token: str) -> dict:
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Jeton d'appareil invalide ou révoqué",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    if payload.get("typ") != DEVICE_TOKEN_TYPE or not payload.get("cap") or not payload.get("own"):
+        raise credentials_exception
+    if payload.get("jti", "") in revoked_tokens:
+        raise credentials_exception
+    return {"capteurId": payload["cap"], "owner_id": payload["own"], "jti": payload["jti"]}
+
+async def get_current_device(credentials: HTTPAuthorizationCredentials = Depends(device_security)) -> dict:
+    """
+    Dépendance des routes d'ingestion des appareils
+    Retourne {capteurId, owner_id, jti} issus du jeton
+    """
+    return decode_device_token(credentials.credentials)
@@ -0,0 +1,64 @@
+import csv
+import io
+import json
+import logging
+import zlib
+from typing import AsyncIterator, Iterable
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration de l'export
+EXPORT_BATCH_SIZE = 5000      # documents par aller-retour du curseur Motor
+EXPORT_CHUNK_ROWS = 1000      # lignes encodées par morceau envoyé au client
+EXPORT_FIELDS = ("capteurId", "timestamp", "valeur")
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv"
+}
+
+def _encode_ndjson(rows: Iterable[dict]) -> bytes:
+    return "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode()
+
+def _encode_csv(rows: Iterable[dict], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+# 📤 Export en flux
+async def stream_export(cursor, fmt: str, compress: bool = False) -> AsyncIterator[bytes]:
+    """
+    Encoder un curseur Motor en NDJSON ou CSV, par morceaux de EXPORT_CHUNK_ROWS lignes
+    La mémoire reste constante quel que soit le nombre de documents ; gzip optionnel
+    Le curseur est fermé côté serveur même si le client se déconnecte en cours de route
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None  # 31 = format gzip
+    rows, header, sent = [], True, 0
+
+    def encode(rows, header):
+        chunk = _encode_csv(rows, header) if fmt == "csv" else _encode_ndjson(rows)
+        return compressor.compress(chunk) if compressor else chunk
+
+    try:
+        async for doc in cursor:
+            rows.append(doc)
+            if len(rows) >= EXPORT_CHUNK_ROWS:
+                chunk = encode(rows, header)
+                sent += len(rows)
+                rows, header = [], False
+                if chunk:
+                    yield chunk
+        if rows or header:
+            chunk = encode(rows, header)
+            sent += len(rows)
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+    finally:
+        # Déconnexion du client : la génération est annulée, on libère le curseur
+        await cursor.close()
+        logger.debug("Export terminé après %d lignes", sent)
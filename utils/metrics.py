@@ -0,0 +1,123 @@
+"""
+Métriques Prometheus exposées sur /metrics
+Latence HTTP par modèle de route, requêtes en cours, durée des commandes MongoDB,
+compteurs métier (données, alertes, échecs d'authentification) et retard de la
+boucle d'événements. METRICS_ENABLED=0 désactive le middleware et l'écouteur MongoDB
+"""
+import asyncio
+import os
+import time
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from pymongo import monitoring
+
+# ⚙ Configuration
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+LOOP_LAG_INTERVAL_SECONDS = 0.5
+
+# Intervalles des histogrammes : de la milliseconde (lectures en cache) à quelques secondes
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 🌐 HTTP
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par modèle de route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "Requêtes HTTP en cours de traitement")
+
+# 🍃 MongoDB
+MONGO_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds",
+    "Durée des commandes MongoDB (CommandListener)",
+    ["command", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+# 📊 Métier
+READINGS = Counter("iot_readings_total", "Données reçues par statut d'écriture", ["statut"])
+ALERTS_CREATED = Counter("iot_alerts_created_total", "Alertes créées par règle", ["regle"])
+AUTH_FAILURES = Counter("iot_auth_failures_total", "Échecs d'authentification", ["type"])
+THROTTLED_REQUESTS = Counter("iot_throttled_requests_total", "Requêtes refusées par limitation de débit ou surcharge", ["raison"])
+
+# ✍ Écriture différée (services/write_behind.py)
+WRITE_BEHIND_FLUSH_SIZE = Histogram(
+    "iot_write_behind_flush_size",
+    "Nombre de données par groupe écrit",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+)
+WRITE_BEHIND_FLUSH_DURATION = Histogram(
+    "iot_write_behind_flush_duration_seconds",
+    "Durée de l'insert_many d'un groupe",
+    buckets=LATENCY_BUCKETS
+)
+WRITE_BEHIND_PENDING = Gauge("iot_write_behind_pending", "Données en tampon en attente d'écriture")
+
+# 🔄 Boucle d'événements
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Retard de réveil de la boucle d'événements",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI pur (sans BaseHTTPMiddleware) : quelques appels par requête
+    Le modèle de route (/data/{capteur_id}) est lu dans scope["route"] après le
+    routage, pour que le nombre de séries reste borné
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            HTTP_LATENCY.labels(
+                scope["method"],
+                route.path if route is not None else "non_routee",
+                str(status)
+            ).observe(time.perf_counter() - start)
+
+class CommandMetrics(monitoring.CommandListener):
+    """Durée de chaque commande MongoDB, mesurée par le pilote"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "ok").observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGO_COMMAND_LATENCY.labels(event.command_name, "erreur").observe(event.duration_micros / 1e6)
+
+command_metrics = CommandMetrics()
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL_SECONDS):
+    """Mesurer l'écart entre le réveil prévu et le réveil réel d'un sleep"""
+    loop = asyncio.get_running_loop()
+    while True:
+        prevu = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - prevu))
+
+def render_metrics() -> tuple:
+    """Corps et type de contenu de la réponse /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
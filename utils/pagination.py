@@ -0,0 +1,114 @@
+import base64
+import json
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Tuple, Union
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+from pymongo import DESCENDING
+from utils.timestamps import parse_timestamp
+
+# ⚙ Taille des pages
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Ordre de parcours : du plus récent au plus ancien (date ts), _id pour départager
+PAGE_SORT = [("ts", DESCENDING), ("_id", DESCENDING)]
+
+# 🔖 Curseurs opaques (ts, _id) du dernier élément d'une page
+def encode_cursor(ts: datetime, doc_id: Union[ObjectId, str]) -> str:
+    raw = json.dumps([ts.isoformat(), str(doc_id)], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, ObjectId]:
+    """Décoder un curseur ; lève une 400 s'il est invalide"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        ts, doc_id = json.loads(base64.urlsafe_b64decode(padded))
+        return parse_timestamp(ts), ObjectId(doc_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Curseur de pagination invalide"
+        )
+
+# 🔎 Construction des filtres
+def parse_query_timestamp(value: str, name: str) -> datetime:
+    """Convertir un paramètre de requête ISO 8601 ; lève une 400 s'il est invalide"""
+    try:
+        return parse_timestamp(value)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Paramètre {name} invalide (format ISO 8601 attendu)"
+        )
+
+def time_range_filter(from_: Optional[str], to: Optional[str]) -> dict:
+    """Filtre sur la date ts à partir de bornes ISO 8601 incluses"""
+    bornes = {}
+    if from_ is not None:
+        bornes["$gte"] = parse_query_timestamp(from_, "from")
+    if to is not None:
+        bornes["$lte"] = parse_query_timestamp(to, "to")
+    return {"ts": bornes} if bornes else {}
+
+def keyset_filter(after: Optional[str]) -> dict:
+    """Éléments strictement après le curseur dans l'ordre PAGE_SORT"""
+    if after is None:
+        return {}
+    ts, doc_id = decode_cursor(after)
+    return {"$or": [
+        {"ts": {"$lt": ts}},
+        {"ts": ts, "_id": {"$lt": doc_id}}
+    ]}
+
+def json_projection(fields: Iterable[str]) -> dict:
+    """
+    Projection qui convertit _id en chaîne id côté MongoDB ($toString)
+    Les documents reçus sont directement sérialisables : pas de boucle str(_id)
+    """
+    return {"_id": 0, "id": {"$toString": "$_id"}, **{field: 1 for field in fields}}
+
+def build_projection(
+    fields: Optional[str],
+    allowed: Iterable[str],
+    project: Callable[[Iterable[str]], dict] = json_projection
+) -> dict:
+    """
+    Projection à partir de fields=valeur,timestamp (tous les champs autorisés par défaut)
+    ts et id sont toujours inclus car ils forment le curseur
+    project : construction de la projection (storage.projection pour les données brutes)
+    """
+    if not fields:
+        return project(allowed)
+    demandes = {f.strip() for f in fields.split(",") if f.strip()}
+    inconnus = demandes - set(allowed)
+    if inconnus:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Champs inconnus: {', '.join(sorted(inconnus))}"
+        )
+    return project(demandes | {"ts"})
+
+# 📄 Lecture d'une page
+async def fetch_page(
+    collection,
+    query: dict,
+    projection: dict,
+    limit: int,
+    after: Optional[str] = None
+) -> Tuple[List[dict], Optional[str]]:
+    """
+    Lire une page triée par (ts, _id) décroissants
+    projection : résultat de build_projection (id déjà converti en chaîne)
+    Retourne les documents et le curseur de la page suivante (None en fin de parcours)
+    """
+    query = {**query, **keyset_filter(after)}
+    cursor = collection.find(query, projection).sort(PAGE_SORT).limit(limit + 1)
+    docs = await cursor.to_list(length=limit + 1)
+
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        next_cursor = encode_cursor(docs[-1]["ts"], docs[-1]["id"])
+    return docs, next_cursor
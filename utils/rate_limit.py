@@ -0,0 +1,300 @@
+"""
+Contrôle d'admission
+- Seaux à jetons par capteurId et par utilisateur sur les routes d'ingestion :
+  un appareil qui boucle sur POST /data/ reçoit des 429 sans toucher MongoDB
+- Limiteur global (middleware) : refus 503 quand les requêtes simultanées, l'attente
+  du pool MongoDB ou le retard de la boucle d'événements dépassent leur seuil
+Backend des seaux (RATE_LIMIT_BACKEND) : memory (par worker) ou mongo (partagé
+entre workers, deux bulk_write par requête acceptée quel que soit le nombre de capteurs)
+"""
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+from fastapi import HTTPException, status
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from database.mongo import DUPLICATE_KEY_ERROR, db, pool_stats
+from utils.metrics import THROTTLED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# ⚙ Configuration des seaux à jetons (une requête = un jeton, lot compris)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_CAPTEUR_PER_SECOND = float(os.getenv("RATE_LIMIT_CAPTEUR_PER_SECOND", "5"))
+RATE_LIMIT_CAPTEUR_BURST = float(os.getenv("RATE_LIMIT_CAPTEUR_BURST", "20"))
+RATE_LIMIT_USER_PER_SECOND = float(os.getenv("RATE_LIMIT_USER_PER_SECOND", "200"))
+RATE_LIMIT_USER_BURST = float(os.getenv("RATE_LIMIT_USER_BURST", "400"))
+# Seaux gardés en mémoire (les moins récemment utilisés sont oubliés, donc pleins)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# capteurId distincts débités par requête (lots) : borne le coût du limiteur lui-même
+RATE_LIMIT_MAX_CAPTEURS_PER_REQUEST = int(os.getenv("RATE_LIMIT_MAX_CAPTEURS_PER_REQUEST", "50"))
+
+# ⚙ Configuration du limiteur global
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "0") == "1"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "512"))
+ADMISSION_MAX_POOL_WAIT_MS = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "100"))
+ADMISSION_MAX_LOOP_LAG_MS = float(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "200"))
+ADMISSION_LAG_INTERVAL_SECONDS = 0.1
+ADMISSION_RETRY_AFTER_SECONDS = 1
+
+# Routes jamais refusées : sondes, métriques, flux temps réel (connexions longues)
+# (/health, /health/live, /health/ready : HEALTH_PATHS de services/health.py)
+ADMISSION_EXEMPT_PATHS = ("/metrics",)
+ADMISSION_EXEMPT_PREFIXES = ("/health", "/stream/")
+
+# Raisons de refus (label de iot_throttled_requests_total)
+RAISON_CAPTEUR = "capteur"
+RAISON_UTILISATEUR = "utilisateur"
+RAISON_CONCURRENCE = "concurrence"
+RAISON_POOL = "attente_pool"
+RAISON_BOUCLE = "retard_boucle"
+
+# 🪣 Backends des seaux
+# acquire(keys, rate, burst) prend un jeton dans chaque seau, tout ou rien : si un
+# seau est vide, aucun n'est débité ; retourne (clés refusées, secondes avant un jeton)
+class MemoryBuckets:
+    """Seaux par worker : clé → (jetons, instant de mise à jour), ordre LRU"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def acquire(self, keys: List[str], rate: float, burst: float) -> Tuple[List[str], float]:
+        now = time.monotonic()
+        niveaux = {}
+        for key in keys:
+            tokens, updated = self._buckets.pop(key, (burst, now))
+            niveaux[key] = min(burst, tokens + (now - updated) * rate)
+        refuses = [key for key, tokens in niveaux.items() if tokens < 1]
+        for key, tokens in niveaux.items():
+            self._buckets[key] = (tokens if refuses else tokens - 1, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        if not refuses:
+            return [], 0.0
+        return refuses, max((1 - niveaux[key]) / rate for key in refuses)
+
+    async def refund(self, keys: List[str], burst: float):
+        for key in keys:
+            if key in self._buckets:
+                tokens, updated = self._buckets[key]
+                self._buckets[key] = (min(burst, tokens + 1), updated)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+class MongoBuckets:
+    """
+    Seaux partagés dans la collection rate_limits, un seul aller-retour par appel
+    accepté : un bulk_write non ordonné avec, par seau, une mise à jour atomique
+    (pipeline) qui recharge et débite, filtrée sur « au moins un jeton après recharge ».
+    Un seau vide ne correspond pas au filtre : l'upsert tente alors d'insérer un
+    _id existant, et l'erreur de clé dupliquée signale le refus. Deux requêtes qui
+    créent le même seau en même temps échouent de la même façon, seau plein :
+    un refus est donc retenté une fois avant d'être confirmé. Heure du serveur
+    ($$NOW) pour ne pas dépendre de l'horloge des workers ; les seaux inactifs
+    expirent (index TTL)
+    """
+
+    @staticmethod
+    def _recharge(rate: float, burst: float) -> dict:
+        ecoule = {"$divide": [{"$subtract": ["$$NOW", {"$ifNull": ["$updated_at", "$$NOW"]}]}, 1000]}
+        return {"$min": [burst, {"$add": [{"$ifNull": ["$tokens", burst]}, {"$multiply": [ecoule, rate]}]}]}
+
+    async def _debiter(self, keys: List[str], recharge: dict) -> List[int]:
+        """Débiter chaque seau en un bulk_write ; retourne les index des seaux refusés"""
+        operations = [
+            UpdateOne(
+                {"_id": key, "$expr": {"$gte": [recharge, 1]}},
+                [{"$set": {"tokens": {"$subtract": [recharge, 1]}, "updated_at": "$$NOW"}}],
+                upsert=True
+            )
+            for key in keys
+        ]
+        try:
+            await db["rate_limits"].bulk_write(operations, ordered=False)
+            return []
+        except BulkWriteError as e:
+            erreurs = e.details.get("writeErrors", [])
+            if any(erreur.get("code") != DUPLICATE_KEY_ERROR for erreur in erreurs):
+                raise
+            return sorted(erreur["index"] for erreur in erreurs)
+
+    async def acquire(self, keys: List[str], rate: float, burst: float) -> Tuple[List[str], float]:
+        recharge = self._recharge(rate, burst)
+        refus = await self._debiter(keys, recharge)
+        if not refus:
+            return [], 0.0
+        # Second essai : distingue un seau vide d'une course à la création du seau
+        refus = {refus[i] for i in await self._debiter([keys[i] for i in refus], recharge)}
+        if not refus:
+            return [], 0.0
+        # Rendre les jetons débités dans les autres seaux (tout ou rien)
+        await self.refund([key for i, key in enumerate(keys) if i not in refus], burst)
+        # Au plus 1/rate secondes avant qu'un seau vide ne retrouve un jeton
+        return [keys[i] for i in sorted(refus)], 1 / rate
+
+    async def refund(self, keys: List[str], burst: float):
+        if keys:
+            await db["rate_limits"].update_many(
+                {"_id": {"$in": keys}},
+                [{"$set": {"tokens": {"$min": [burst, {"$add": ["$tokens", 1]}]}}}]
+            )
+
+    def __len__(self) -> int:
+        return 0
+
+# 🚦 Limiteur des routes d'ingestion
+class RateLimiter:
+    def __init__(self, backend: str = RATE_LIMIT_BACKEND, enabled: bool = RATE_LIMIT_ENABLED):
+        if backend not in ("memory", "mongo"):
+            raise ValueError(f"RATE_LIMIT_BACKEND invalide : {backend}")
+        self.enabled = enabled
+        self.backend_name = backend
+        self.backend = MongoBuckets() if backend == "mongo" else MemoryBuckets()
+        self.counters = {"acceptees": 0, RAISON_CAPTEUR: 0, RAISON_UTILISATEUR: 0, "erreurs_backend": 0}
+
+    async def _acquire(self, keys: List[str], rate: float, burst: float) -> Tuple[List[str], float]:
+        try:
+            return await self.backend.acquire(keys, rate, burst)
+        except PyMongoError as e:
+            # Backend partagé indisponible : la requête passe (le limiteur global protège encore)
+            self.counters["erreurs_backend"] += 1
+            logger.warning("Seaux %s non vérifiés (%s)", keys[:3], e)
+            return [], 0.0
+
+    async def _refund(self, keys: List[str], burst: float):
+        try:
+            await self.backend.refund(keys, burst)
+        except PyMongoError as e:
+            self.counters["erreurs_backend"] += 1
+            logger.warning("Jetons non rendus (%s)", e)
+
+    async def check(self, user_id: str, capteur_ids: Iterable[str]):
+        """
+        Prendre un jeton dans le seau de l'utilisateur puis dans celui de chaque
+        capteurId distinct (au plus RATE_LIMIT_MAX_CAPTEURS_PER_REQUEST), tout ou
+        rien : une requête refusée (429) ne consomme aucun jeton
+        Les seaux des capteurs sont propres à l'utilisateur : un capteurId inconnu ou
+        d'un autre propriétaire ne vide pas le seau du vrai capteur
+        """
+        if not self.enabled:
+            return
+        user_key = f"user:{user_id}"
+        refuses, retry_after = await self._acquire([user_key], RATE_LIMIT_USER_PER_SECOND, RATE_LIMIT_USER_BURST)
+        if refuses:
+            self._reject(RAISON_UTILISATEUR, retry_after, "Trop de requêtes pour cet utilisateur")
+
+        capteurs = sorted(set(capteur_ids))[:RATE_LIMIT_MAX_CAPTEURS_PER_REQUEST]
+        refuses, retry_after = await self._acquire(
+            [f"capteur:{user_id}:{capteur_id}" for capteur_id in capteurs],
+            RATE_LIMIT_CAPTEUR_PER_SECOND, RATE_LIMIT_CAPTEUR_BURST
+        )
+        if refuses:
+            await self._refund([user_key], RATE_LIMIT_USER_BURST)
+            capteur_id = refuses[0].split(":", 2)[2]
+            self._reject(RAISON_CAPTEUR, retry_after, f"Trop de requêtes pour le capteur {capteur_id}")
+        self.counters["acceptees"] += 1
+
+    def _reject(self, raison: str, retry_after: float, detail: str):
+        self.counters[raison] += 1
+        THROTTLED_REQUESTS.labels(raison).inc()
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail=detail,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+
+    def stats(self) -> dict:
+        return {
+            "actif": self.enabled,
+            "backend": self.backend_name,
+            "seaux_en_memoire": len(self.backend),
+            "capteur": {"par_seconde": RATE_LIMIT_CAPTEUR_PER_SECOND, "rafale": RATE_LIMIT_CAPTEUR_BURST},
+            "utilisateur": {"par_seconde": RATE_LIMIT_USER_PER_SECOND, "rafale": RATE_LIMIT_USER_BURST},
+            "refus": {raison: self.counters[raison] for raison in (RAISON_CAPTEUR, RAISON_UTILISATEUR)},
+            "acceptees": self.counters["acceptees"],
+            "erreurs_backend": self.counters["erreurs_backend"]
+        }
+
+# 🛡 Limiteur global
+class AdmissionController:
+    """Requêtes en cours et signaux de surcharge (pool MongoDB, boucle d'événements)"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.loop_lag_ms = 0.0
+        self.refus = {RAISON_CONCURRENCE: 0, RAISON_POOL: 0, RAISON_BOUCLE: 0}
+
+    async def monitor_loop_lag(self, interval: float = ADMISSION_LAG_INTERVAL_SECONDS):
+        """Mesurer en continu le retard de réveil de la boucle (lancé par le lifespan)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            prevu = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag_ms = max(0.0, loop.time() - prevu) * 1000
+
+    def overload_reason(self) -> Optional[str]:
+        if self.in_flight >= ADMISSION_MAX_IN_FLIGHT:
+            return RAISON_CONCURRENCE
+        if pool_stats.recent_wait_ms() > ADMISSION_MAX_POOL_WAIT_MS:
+            return RAISON_POOL
+        if self.loop_lag_ms > ADMISSION_MAX_LOOP_LAG_MS:
+            return RAISON_BOUCLE
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "actif": ADMISSION_ENABLED,
+            "requetes_en_cours": self.in_flight,
+            "max_en_cours": ADMISSION_MAX_IN_FLIGHT,
+            "attente_pool_ms": round(pool_stats.recent_wait_ms(), 2),
+            "max_attente_pool_ms": ADMISSION_MAX_POOL_WAIT_MS,
+            "retard_boucle_ms": round(self.loop_lag_ms, 2),
+            "max_retard_boucle_ms": ADMISSION_MAX_LOOP_LAG_MS,
+            "refus": dict(self.refus)
+        }
+
+class AdmissionMiddleware:
+    """
+    Refuser (503 + Retry-After) les nouvelles requêtes quand le serveur est saturé,
+    avant tout accès à MongoDB ; les requêtes déjà admises continuent normalement
+    """
+
+    def __init__(self, app, controller: "AdmissionController"):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get("path", "")
+        if scope["type"] != "http" or path in ADMISSION_EXEMPT_PATHS or path.startswith(ADMISSION_EXEMPT_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+        raison = self.controller.overload_reason()
+        if raison is not None:
+            self.controller.refus[raison] += 1
+            THROTTLED_REQUESTS.labels(raison).inc()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"retry-after", str(ADMISSION_RETRY_AFTER_SECONDS).encode())
+                ]
+            })
+            await send({"type": "http.response.body", "body": '{"detail":"Serveur surchargé, réessayez"}'.encode()})
+            return
+        self.controller.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.in_flight -= 1
+
+# Instances utilisées par l'application
+rate_limiter = RateLimiter()
+admission = AdmissionController()
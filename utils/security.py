@@ -1,20 +1,46 @@
+import asyncio
+import hmac
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
 from jose import JWTError, jwt
 from bson import ObjectId
 from database.mongo import db
+from utils.cache import TTLCache
+from utils.metrics import AUTH_FAILURES
 
 # ⚙ Configuration JWT
 SECRET_KEY = "votre-cle-secrete-super-longue-et-complexe-2024-iot-jwt"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
+# ⚙ Configuration du cache des utilisateurs authentifiés
+USER_CACHE_MAXSIZE = 10000
+USER_CACHE_TTL_SECONDS = 60
+
+# ⚙ Configuration du hachage des mots de passe
+# Changer BCRYPT_ROUNDS : les anciens hash sont recalculés à la connexion suivante
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "256"))
+
+# ⚙ Configuration des routes d'exploitation (/metrics, /…/stats)
+# Jeton partagé attendu en Bearer (ex. bearer_token du scrape Prometheus) ;
+# sans OPS_TOKEN ni OPS_PUBLIC=1, ces routes répondent 404. /health/* reste ouvert
+OPS_TOKEN = os.getenv("OPS_TOKEN")
+OPS_PUBLIC = os.getenv("OPS_PUBLIC", "0") == "1"
+
 # ⚙ Configuration sécurité
 security = HTTPBearer()
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+ops_security = HTTPBearer(auto_error=False)
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+user_cache = TTLCache(maxsize=USER_CACHE_MAXSIZE, ttl=USER_CACHE_TTL_SECONDS, name="users")
 
 # 🔐 Génération du token JWT
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -26,20 +52,117 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 # 🔒 Hash du mot de passe
 def hash_password(password: str) -> str:
-    """Hasher le mot de passe avec bcrypt"""
+    """Hasher le mot de passe avec bcrypt (bloquant : utiliser hash_password_async dans les routes)"""
     return pwd_context.hash(password)
 
 # ✅ Vérifier le mot de passe
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Vérifier si le mot de passe correspond au hash"""
+    """Vérifier si le mot de passe correspond au hash (bloquant)"""
     return pwd_context.verify(plain_password, hashed_password)
 
-# 👤 Récupérer l'utilisateur actuel depuis le token
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+# 🧵 Pool borné pour bcrypt, hors de la boucle d'événements
+class PasswordHasher:
     """
-    Récupérer l'utilisateur connecté depuis le token JWT
-    Cette fonction sera utilisée avec Depends() dans vos routes protégées
+    Exécuter bcrypt (~100 ms par appel) dans un pool de threads dédié
+    Au-delà de max_pending appels en cours ou en attente, la requête est refusée
+    (503) plutôt que d'allonger indéfiniment la file
+    """
+
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, max_pending: int = PASSWORD_HASH_MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self.pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self._queue_ms = deque(maxlen=1000)
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Trop de connexions simultanées, réessayez",
+                headers={"Retry-After": "1"}
+            )
+        self.pending += 1
+        submitted = time.perf_counter()
+
+        def job():
+            # Temps passé en file avant qu'un thread du pool soit libre
+            self._queue_ms.append((time.perf_counter() - submitted) * 1000)
+            return fn(*args)
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, job)
+        finally:
+            self.pending -= 1
+            self.completed += 1
+
+    def stats(self) -> dict:
+        attentes = sorted(self._queue_ms)
+
+        def rang(p):
+            return round(attentes[min(len(attentes) - 1, int(p * len(attentes)))], 2) if attentes else 0.0
+
+        return {
+            "threads": self.workers,
+            "en_cours": self.pending,
+            "max_en_attente": self.max_pending,
+            "termines": self.completed,
+            "refuses": self.rejected,
+            "rehash": self.rehashed,
+            "attente_ms_p50": rang(0.50),
+            "attente_ms_p99": rang(0.99),
+            "attente_ms_max": round(attentes[-1], 2) if attentes else 0.0
+        }
+
+# Instance utilisée par l'application
+password_hasher = PasswordHasher()
+
+async def hash_password_async(password: str) -> str:
+    """Hasher le mot de passe dans le pool bcrypt"""
+    return await password_hasher.run(pwd_context.hash, password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Vérifier le mot de passe dans le pool bcrypt
+    Retourne (valide, nouveau_hash) : nouveau_hash est renseigné quand le hash
+    stocké utilise d'anciens paramètres (coût bcrypt modifié) et doit être remplacé
+    """
+    return await password_hasher.run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+# 🗑 Invalider un utilisateur en cache (à appeler après modification ou suppression)
+def invalidate_user(user_id: str):
+    """
+    Retirer un utilisateur du cache d'authentification (appelé à la connexion)
+    Une modification faite hors de l'API reste visible au plus USER_CACHE_TTL_SECONDS
+    sur les autres workers
+    """
+    user_cache.invalidate(user_id)
+
+async def _load_user(user_id: str) -> Optional[dict]:
+    """Charger un utilisateur depuis MongoDB (sans le hash du mot de passe)"""
+    user = await db["users"].find_one({"_id": ObjectId(user_id)}, {"password": 0})
+    if user is not None:
+        # Convertir ObjectId en string pour les réponses JSON
+        user["id"] = str(user["_id"])
+    return user
+
+# 👤 Récupérer l'utilisateur depuis un token JWT
+async def get_user_from_token(token: str) -> dict:
+    """
+    Valider un token JWT et retourner l'utilisateur correspondant
+    Utilisée hors Depends() quand le token n'arrive pas en en-tête (WebSocket)
     """
+    try:
+        return await _user_from_token(token)
+    except HTTPException:
+        AUTH_FAILURES.labels("jwt").inc()
+        raise
+
+async def _user_from_token(token: str) -> dict:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -48,21 +171,46 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     
     try:
         # Décoder le token JWT
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     
-    # Récupérer l'utilisateur depuis MongoDB
+    # Récupérer l'utilisateur depuis le cache (MongoDB en cas d'absence)
     try:
-        user = await db["users"].find_one({"_id": ObjectId(user_id)})
-        if user is None:
-            raise credentials_exception
-        
-        # Convertir ObjectId en string pour les réponses JSON
-        user["id"] = str(user["_id"])
-        return user
+        user = await user_cache.get_or_load(user_id, lambda: _load_user(user_id))
     except Exception:
-        raise credentials_exception
\ No newline at end of file
+        raise credentials_exception
+    if user is None:
+        raise credentials_exception
+
+    # Copie pour que les routes ne modifient pas l'entrée en cache
+    return dict(user)
+
+# 👤 Récupérer l'utilisateur actuel depuis le token
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Récupérer l'utilisateur connecté depuis le token JWT
+    Cette fonction sera utilisée avec Depends() dans vos routes protégées
+    """
+    return await get_user_from_token(credentials.credentials)
+
+# 🛠 Accès aux routes d'exploitation
+async def require_ops_access(credentials: Optional[HTTPAuthorizationCredentials] = Depends(ops_security)):
+    """
+    Protéger les routes d'exploitation (métriques, statistiques internes)
+    OPS_PUBLIC=1 : ouvertes ; OPS_TOKEN défini : jeton Bearer exigé ; sinon désactivées (404)
+    """
+    if OPS_PUBLIC:
+        return
+    if not OPS_TOKEN:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if credentials is None or not hmac.compare_digest(credentials.credentials.encode(), OPS_TOKEN.encode()):
+        AUTH_FAILURES.labels("ops").inc()
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Jeton d'exploitation invalide",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
@@ -0,0 +1,35 @@
+import re
+from datetime import datetime, timedelta, timezone
+from typing import Tuple
+
+# ⏱ Conversion des timestamps ISO 8601 (chaînes reçues des capteurs)
+def parse_timestamp(value: str) -> datetime:
+    """
+    Convertir un timestamp ISO 8601 en datetime UTC
+    Un timestamp sans fuseau est considéré comme UTC ; lève ValueError si invalide
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+# 🪣 Taille des intervalles d'agrégation (1m, 15m, 1h, 1d...)
+BUCKET_UNITS = {
+    "s": ("second", timedelta(seconds=1)),
+    "m": ("minute", timedelta(minutes=1)),
+    "h": ("hour", timedelta(hours=1)),
+    "d": ("day", timedelta(days=1))
+}
+_BUCKET_RE = re.compile(r"^(\d+)([smhd])$")
+
+def parse_bucket(value: str) -> Tuple[str, int, timedelta]:
+    """
+    Convertir "15m" en (unité $dateTrunc, binSize, durée)
+    Lève ValueError si le format est invalide
+    """
+    match = _BUCKET_RE.match(value)
+    if not match or int(match.group(1)) == 0:
+        raise ValueError(f"Intervalle invalide: {value}")
+    size = int(match.group(1))
+    unit, duration = BUCKET_UNITS[match.group(2)]
+    return unit, size, duration * size